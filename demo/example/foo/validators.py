@@ -1,3 +1,5 @@
+from django.db.models import Q
+
 from plans.validators import ModelCountValidator
 
 from .models import Foo
@@ -6,9 +8,13 @@ from .models import Foo
 class MaxFoosValidator(ModelCountValidator):
     code = "MAX_FOO_COUNT"
     model = Foo
+    user_field = "user"
 
     def get_queryset(self, user):
         return super(MaxFoosValidator, self).get_queryset(user).filter(user=user)
 
+    def get_count_filter(self, user):
+        return Q(user=user)
+
 
 max_foos_validator = MaxFoosValidator()
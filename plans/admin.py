@@ -18,11 +18,13 @@ from plans.base.models import (
     AbstractQuota,
     AbstractRecurringUserPlan,
     AbstractUserPlan,
+    OutboxEmail,
     UserPlanCancellationReason,
 )
 
+from .paginator import EstimatedCountPaginator, get_estimated_count_threshold
 from .signals import account_automatic_renewal
-from django.db.models import Count, Q, Min
+from django.db.models import Count, Q
 from django.utils import timezone
 from django.conf import settings
 from .forms import PlanAdminForm, PricingAdminForm, QuotaAdminForm
@@ -49,6 +51,53 @@ class UserPlanCancellationReasonAdmin(admin.ModelAdmin):
     list_filter = ("hidden",)
 
 
+class OutboxEmailAdmin(admin.ModelAdmin):
+    search_fields = ("subject", "recipients")
+    list_display = (
+        "pk",
+        "subject",
+        "recipients",
+        "status",
+        "attempts",
+        "created",
+        "next_attempt",
+        "sent",
+    )
+    list_filter = ("status",)
+    readonly_fields = ("created", "sent", "attempts", "last_error")
+
+
+class ExplicitJoinsMixin(object):
+    """
+    Joins of changelist are made by ``get_queryset()``. Django would replace them by ``select_related()``
+    of non-null foreign keys if a foreign key is displayed and ``list_select_related`` is ``False``.
+    """
+
+    list_select_related = ()
+
+
+class EstimatedCountMixin(object):
+    """
+    Uses ``EstimatedCountPaginator`` for large tables if ``PLANS_ADMIN_ESTIMATED_COUNT_THRESHOLD``
+    is set, and doesn't count all rows of filtered changelist then.
+    """
+
+    @property
+    def show_full_result_count(self):
+        return get_estimated_count_threshold() is None
+
+    def get_paginator(
+        self, request, queryset, per_page, orphans=0, allow_empty_first_page=True
+    ):
+        if get_estimated_count_threshold() is None:
+            return super(EstimatedCountMixin, self).get_paginator(
+                request, queryset, per_page, orphans, allow_empty_first_page
+            )
+        return EstimatedCountPaginator(
+            queryset, per_page, orphans, allow_empty_first_page
+        )
+
+
 class UserLinkMixin(object):
     def user_link(self, obj):
         user_model = get_user_model()
@@ -91,7 +140,11 @@ class PlanPricingInline(admin.TabularInline):
     def get_readonly_fields(self, request, obj=None):
         if obj:  # Only make readonly on change form
             editable = {"price", "regular_price"}
-            return [field.name for field in PlanPricing._meta.fields if field.name not in editable]
+            return [
+                field.name
+                for field in PlanPricing._meta.fields
+                if field.name not in editable
+            ]
         return []
 
 
@@ -166,7 +219,7 @@ class PricingRangeFilter(admin.SimpleListFilter):
         return queryset
 
 
-class PlanAdmin(OrderedModelAdmin):
+class PlanAdmin(ExplicitJoinsMixin, OrderedModelAdmin):
     form = PlanAdminForm
     search_fields = (
         "name",
@@ -191,7 +244,6 @@ class PlanAdmin(OrderedModelAdmin):
     ]
     list_display_links = list_display
     inlines = (PlanPricingInline, PlanQuotaInline)
-    list_select_related = True
     raw_id_fields = ("customized",)
     readonly_fields = ("created", "updated_at")
     actions = [
@@ -203,9 +255,7 @@ class PlanAdmin(OrderedModelAdmin):
             super(PlanAdmin, self)
             .get_queryset(request)
             .select_related("customized")
-            .prefetch_related("planpricing_set")
             .annotate(
-                min_price=Min("planpricing__price"),
                 active_subscribers_count=Count(
                     "userplan",
                     filter=Q(userplan__active=True, userplan__expire__isnull=True)
@@ -229,15 +279,13 @@ class PlanAdmin(OrderedModelAdmin):
     #     return self.readonly_fields  # Use default readonly_fields for add form
 
     def get_price(self, obj):
-        pricing = obj.planpricing_set.first()
-        if pricing:
-            return f"{pricing.price} {settings.PLANS_CURRENCY}"
+        if obj.first_price is not None:
+            return f"{obj.first_price} {settings.PLANS_CURRENCY}"
         return "-"
 
     get_price.short_description = "Pricing"
     get_price.admin_order_field = "min_price"  # Enable sorting by price
 
-
     def get_active_subscribers(self, obj):
         return getattr(obj, "active_subscribers_count", 0)
 
@@ -261,7 +309,7 @@ class PlanAdmin(OrderedModelAdmin):
             Plan.objects.filter(pk=obj.pk).update(order=new_order)
 
 
-class BillingInfoAdmin(UserLinkMixin, admin.ModelAdmin):
+class BillingInfoAdmin(ExplicitJoinsMixin, UserLinkMixin, admin.ModelAdmin):
     search_fields = ("user__username", "user__email", "tax_number", "name")
     list_display = (
         "user",
@@ -273,10 +321,14 @@ class BillingInfoAdmin(UserLinkMixin, admin.ModelAdmin):
         "country",
     )
     list_display_links = list_display
-    list_select_related = True
     readonly_fields = ("user_link", "created", "updated_at")
     exclude = ("user",)
 
+    def get_queryset(self, request):
+        return (
+            super(BillingInfoAdmin, self).get_queryset(request).select_related("user")
+        )
+
 
 def make_order_completed(modeladmin, request, queryset):
     for order in queryset:
@@ -314,7 +366,7 @@ class InvoiceInline(admin.TabularInline):
     raw_id_fields = ("user",)
 
 
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(EstimatedCountMixin, ExplicitJoinsMixin, admin.ModelAdmin):
     list_filter = ("status", "created", "completed", "plan__name", "pricing")
     raw_id_fields = ("user",)
     search_fields = ("id", "user__username", "user__email", "invoice__full_number")
@@ -339,21 +391,23 @@ class OrderAdmin(admin.ModelAdmin):
     actions = [make_order_completed, make_order_returned, make_order_invoice]
     inlines = (InvoiceInline,)
 
-    def queryset(self, request):
+    def get_queryset(self, request):
         return (
             super(OrderAdmin, self)
-            .queryset(request)
+            .get_queryset(request)
             .select_related("plan", "pricing", "user")
         )
 
     def get_total_amount(self, obj):
-        return obj.total()
-    
+        if obj.total_gross is None:
+            return obj.total()
+        return obj.total_gross
+
     get_total_amount.short_description = "Total Amount"
-    get_total_amount.admin_order_field = "Total Amount"
+    get_total_amount.admin_order_field = "total_gross"
 
 
-class InvoiceAdmin(admin.ModelAdmin):
+class InvoiceAdmin(EstimatedCountMixin, ExplicitJoinsMixin, admin.ModelAdmin):
     search_fields = ("full_number", "buyer_tax_number", "user__username", "user__email")
     list_filter = (
         "type",
@@ -375,9 +429,11 @@ class InvoiceAdmin(admin.ModelAdmin):
     )
     readonly_fields = ("created", "updated_at")
     list_display_links = list_display
-    list_select_related = True
     raw_id_fields = ("user", "order")
 
+    def get_queryset(self, request):
+        return super(InvoiceAdmin, self).get_queryset(request).select_related("user")
+
 
 class RecurringPlanInline(admin.StackedInline):
     model = RecurringUserPlan
@@ -396,7 +452,9 @@ def autorenew_payment(modeladmin, request, queryset):
 autorenew_payment.short_description = _("Autorenew plan")
 
 
-class UserPlanAdmin(UserLinkMixin, admin.ModelAdmin):
+class UserPlanAdmin(
+    EstimatedCountMixin, ExplicitJoinsMixin, UserLinkMixin, admin.ModelAdmin
+):
     list_filter = (
         "active",
         "expire",
@@ -421,7 +479,6 @@ class UserPlanAdmin(UserLinkMixin, admin.ModelAdmin):
         "recurring__pricing",
     )
     list_display_links = list_display
-    list_select_related = True
     readonly_fields = ("user_link", "created", "updated_at")
     inlines = (RecurringPlanInline,)
     actions = [
@@ -449,6 +506,14 @@ class UserPlanAdmin(UserLinkMixin, admin.ModelAdmin):
         "plan",
     ]
 
+    def get_queryset(self, request):
+        # Reverse one-to-one ``recurring`` is not followed by ``list_select_related = True``
+        return (
+            super(UserPlanAdmin, self)
+            .get_queryset(request)
+            .select_related("user", "plan", "recurring", "recurring__pricing")
+        )
+
     def recurring__renewal_triggered_by(self, obj):
         return obj.recurring.renewal_triggered_by
 
@@ -490,3 +555,4 @@ admin.site.register(Order, OrderAdmin)
 admin.site.register(BillingInfo, BillingInfoAdmin)
 admin.site.register(Invoice, InvoiceAdmin)
 admin.site.register(UserPlanCancellationReason, UserPlanCancellationReasonAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
@@ -10,3 +10,6 @@ class PlansConfig(AppConfig):
     def ready(self):
         # noinspection PyUnresolvedReferences
         import plans.listeners  # noqa
+        from plans.validators import get_validators
+
+        get_validators()
@@ -1,5 +1,6 @@
 from __future__ import unicode_literals
 
+import copy
 import logging
 import re
 import warnings
@@ -9,7 +10,9 @@ from decimal import Decimal
 import stdnum.eu.vat
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core import mail
 from django.db import models, transaction
+from django.db.models.functions import Coalesce, NullIf
 from django.core.validators import MinValueValidator
 
 try:
@@ -17,8 +20,6 @@ try:
 except RuntimeError:
     Site = None
 from django.core.exceptions import ImproperlyConfigured, ValidationError
-from django.template import Context
-from django.template.base import Template
 from django.urls import reverse
 from django.utils import translation
 from django.utils.timezone import now
@@ -26,12 +27,18 @@ from django.utils.translation import gettext_lazy as _
 from django.utils.translation import pgettext_lazy
 from django_countries.fields import CountryField
 from ordered_model.models import OrderedModel
-from sequences import get_next_value
+from sequences import get_next_value, get_next_values
 from swapper import load_model
 
+from plans.cache import default_plan_cache, quota_cache
 from plans.contrib import get_user_language, send_template_email
 from plans.enumeration import Enumeration
 from plans.importer import import_name
+from plans.numbering import (
+    get_invoice_number_formatter,
+    mark_sequence_existing,
+    sequence_exists,
+)
 from plans.signals import (
     account_activated,
     account_change_plan,
@@ -55,6 +62,59 @@ class UserPlanCancellationReason(models.Model):
         return self.reason
 
 
+class OutboxEmail(models.Model):
+    """
+    Rendered e-mail waiting in the outbox.
+
+    With ``PLANS_EMAIL_OUTBOX`` enabled ``send_template_email`` only stores the message, so it is
+    committed (or rolled back) together with the surrounding transaction. Messages are sent
+    later by ``plans.tasks.flush_email_outbox``.
+    """
+
+    STATUS = Enumeration(
+        [
+            (1, "PENDING", pgettext_lazy("Outbox e-mail status", "pending")),
+            (2, "SENT", pgettext_lazy("Outbox e-mail status", "sent")),
+            (3, "FAILED", pgettext_lazy("Outbox e-mail status", "failed")),
+        ]
+    )
+
+    created = models.DateTimeField(_("created"), db_index=True, auto_now_add=True)
+    status = models.IntegerField(
+        _("status"), choices=STATUS, default=STATUS.PENDING, db_index=True
+    )
+    recipients = models.JSONField(_("recipients"))
+    from_email = models.CharField(_("from e-mail"), max_length=254)
+    subject = models.TextField(_("subject"))
+    body = models.TextField(_("body"))
+    html_body = models.TextField(_("HTML body"), blank=True, null=True)
+    language = models.CharField(_("language"), max_length=10, blank=True, null=True)
+    attempts = models.PositiveIntegerField(_("attempts"), default=0)
+    next_attempt = models.DateTimeField(_("next attempt"), default=now, db_index=True)
+    sent = models.DateTimeField(_("sent"), blank=True, null=True)
+    last_error = models.TextField(_("last error"), blank=True)
+
+    class Meta:
+        ordering = ("pk",)
+        verbose_name = _("Outbox e-mail")
+        verbose_name_plural = _("Outbox e-mails")
+
+    def __str__(self):
+        return self.subject
+
+    def get_message(self, connection=None):
+        message = mail.EmailMultiAlternatives(
+            self.subject,
+            self.body,
+            self.from_email,
+            self.recipients,
+            connection=connection,
+        )
+        if self.html_body:
+            message.attach_alternative(self.html_body, "text/html")
+        return message
+
+
 class BaseMixin(models.Model):
     created = models.DateTimeField(
         _("created"), db_index=True, auto_now_add=True, null=True
@@ -136,6 +196,43 @@ class AbstractPlan(BaseMixin, OrderedModel):
     free_trial_days = models.PositiveIntegerField(
         default=0, verbose_name=_("Free Trial Days")
     )
+    # Pricing summary maintained by PlanPricing signals, see update_pricing_summaries()
+    pricing_count = models.PositiveIntegerField(
+        _("pricing count"), default=0, editable=False
+    )
+    min_price = models.DecimalField(
+        _("lowest price"),
+        max_digits=7,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+    )
+    first_plan_pricing = models.ForeignKey(
+        "PlanPricing",
+        null=True,
+        blank=True,
+        related_name="+",
+        on_delete=models.SET_NULL,
+        editable=False,
+    )
+    first_price = models.DecimalField(
+        _("first price"),
+        max_digits=7,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    #: Fields maintained by ``update_pricing_summaries()``
+    PRICING_SUMMARY_FIELDS = (
+        "pricing_count",
+        "min_price",
+        "first_plan_pricing",
+        "first_price",
+    )
 
     class Meta:
         abstract = True
@@ -143,13 +240,104 @@ class AbstractPlan(BaseMixin, OrderedModel):
         verbose_name = _("Plan")
         verbose_name_plural = _("Plans")
 
+    def save(self, *args, **kwargs):
+        if (
+            self.pk is not None
+            and not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            # Pricing summary could be changed since the plan was loaded, it is never saved from instance
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.PRICING_SUMMARY_FIELDS
+            ]
+        return super(AbstractPlan, self).save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(AbstractPlan, cls).from_db(db, field_names, values)
+        # Persisted totals of orders are recomputed if price per student is changed
+        instance._loaded_price_per_student = instance.__dict__.get("price_per_student")
+        return instance
+
+    @classmethod
+    def update_pricing_summaries(cls, plan_ids=None, using=None, commit=True):
+        """
+        Recomputes pricing summary fields (``pricing_count``, ``min_price``, ``first_plan_pricing``
+        and ``first_price``) of plans with given ids, or of all plans.
+        Returns list of plans which summary was out of date; with ``commit=False`` they are not saved.
+        """
+        PlanPricing = AbstractPlanPricing.get_concrete_model()
+        pricings = (
+            PlanPricing.objects.using(using)
+            .order_by("plan_id", "order", "pricing__period", "pk")
+            .values_list("plan_id", "pk", "price")
+        )
+        plans = cls.objects.using(using).only("pk", *cls.PRICING_SUMMARY_FIELDS)
+        if plan_ids is not None:
+            plan_ids = list(plan_ids)
+            pricings = pricings.filter(plan_id__in=plan_ids)
+            plans = plans.filter(pk__in=plan_ids)
+
+        summaries = {}
+        for plan_id, pricing_id, price in pricings:
+            summary = summaries.get(plan_id)
+            if summary is None:
+                summaries[plan_id] = {
+                    "pricing_count": 1,
+                    "min_price": price,
+                    "first_plan_pricing_id": pricing_id,
+                    "first_price": price,
+                }
+            else:
+                summary["pricing_count"] += 1
+                summary["min_price"] = min(summary["min_price"], price)
+
+        empty = {
+            "pricing_count": 0,
+            "min_price": None,
+            "first_plan_pricing_id": None,
+            "first_price": None,
+        }
+        changed = []
+        for plan in plans:
+            summary = summaries.get(plan.pk, empty)
+            if any(getattr(plan, name) != value for name, value in summary.items()):
+                for name, value in summary.items():
+                    setattr(plan, name, value)
+                changed.append(plan)
+        if commit and changed:
+            cls.objects.using(using).bulk_update(changed, cls.PRICING_SUMMARY_FIELDS)
+        return changed
+
     @classmethod
     def get_default_plan(cls):
+        """
+        Returns the default plan or ``None``. With ``PLANS_DEFAULT_PLAN_CACHE`` the plan is cached
+        together with its quota dict, so ``is_free()`` and ``get_quota_dict()``
+        of the returned plan don't query the database.
+        """
+        cached = default_plan_cache.get("plan", cls._get_default_plan)
+        if cached is None:
+            return None
+        plan, quota_dict = cached
+        # Every caller gets its own instance, the cached one is never modified
+        plan = copy.copy(plan)
+        plan._cached_quota_dict = quota_dict
+        return plan
+
+    @classmethod
+    def _get_default_plan(cls):
         try:
-            return_value = cls.objects.get(default=True)
+            plan = cls.objects.get(default=True)
         except cls.DoesNotExist:
-            return_value = None
-        return return_value
+            return None
+        if not default_plan_cache.enabled:
+            return plan, None
+        return plan, plan._get_quota_dict()
 
     @classmethod
     def get_current_plan(cls, user):
@@ -170,6 +358,13 @@ class AbstractPlan(BaseMixin, OrderedModel):
         return self.name
 
     def get_quota_dict(self):
+        if getattr(self, "_cached_quota_dict", None) is not None:
+            return dict(self._cached_quota_dict)
+        if self.pk is None:
+            return self._get_quota_dict()
+        return dict(quota_cache.get(self.pk, self._get_quota_dict))
+
+    def _get_quota_dict(self):
         return dict(self.planquota_set.values_list("quota__codename", "value"))
 
     def get_quota(self):
@@ -188,18 +383,16 @@ class AbstractPlan(BaseMixin, OrderedModel):
         return quota_dict
 
     def is_free(self):
-        return self.planpricing_set.count() == 0
+        return self.pricing_count == 0
 
     def price(self):
-        pricing = self.planpricing_set.first()
-        if pricing:
-            return pricing.price
+        if self.first_price is not None:
+            return self.first_price
         return 0
 
     def pricing(self):
-        pricing = self.planpricing_set.first()
-        if pricing:
-            return pricing
+        if self.first_plan_pricing_id is not None:
+            return self.first_plan_pricing
         return None
 
     is_free.boolean = True
@@ -312,6 +505,9 @@ class AbstractUserPlan(BaseMixin, models.Model):
     trial_end_date = models.DateField(
         _("Trial End Date"), default=None, blank=True, null=True, db_index=True
     )
+    expiration_notification_pending = models.BooleanField(
+        default=False, db_index=True, editable=False
+    )  # set by bulk expiration until the expiration is notified
 
     class Meta:
         abstract = True
@@ -335,10 +531,10 @@ class AbstractUserPlan(BaseMixin, models.Model):
             return False
         # Check if today's date is within the trial period
         return self.trial_start_date <= date.today() <= self.trial_end_date
-    
+
     def is_canceled(self):
         return self.canceled_date != None
-    
+
     def days_left(self):
         if self.expire is None:
             return None
@@ -581,7 +777,13 @@ class AbstractUserPlan(BaseMixin, models.Model):
         """manages account expiration"""
 
         self.deactivate()
+        self.notify_expired()
 
+    def notify_expired(self):
+        """
+        Sends account expiration e-mail and ``account_expired`` signal.
+        Used directly by bulk expiration, where user plans are deactivated by one query.
+        """
         accounts_logger.info(
             "Account '%s' [id=%d] has expired" % (self.user, self.user.pk)
         )
@@ -916,6 +1118,13 @@ class AbstractPlanPricing(BaseMixin, models.Model):
     def __str__(self):
         return f"{self.plan.name} {self.pricing} {'recurring' if self.has_automatic_renewal else ''}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(AbstractPlanPricing, cls).from_db(db, field_names, values)
+        # Plan summary of the loaded plan is updated too if the pricing is moved to other plan
+        instance._loaded_plan_id = instance.__dict__.get("plan_id")
+        return instance
+
 
 class PlanQuotaManager(models.Manager):
     def get_queryset(self):
@@ -937,6 +1146,71 @@ class AbstractPlanQuota(BaseMixin, models.Model):
         verbose_name_plural = _("Plans quotas")
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotates ``net_amount``, ``tax_amount`` and ``gross_amount`` computed by database with the same
+        formula as ``Order.total()`` (``gross_amount``) and ``Order.tax_total()`` (``tax_amount``).
+        ``net_amount`` is the total before tax.
+        """
+        return self.annotate(**get_order_total_expressions())
+
+    def update_total_gross(self):
+        """
+        Recomputes persisted ``total_gross`` of orders by single query, returns number of orders.
+        """
+        Plan = AbstractPlan.get_concrete_model()
+        price_per_student = models.Subquery(
+            Plan.objects.filter(pk=models.OuterRef("plan_id")).values(
+                "price_per_student"
+            )[:1]
+        )
+        return self.update(
+            total_gross=get_order_total_expressions(price_per_student)["gross_amount"]
+        )
+
+
+def get_order_total_expressions(price_per_student=None):
+    """
+    Returns dict of ``net_amount``, ``tax_amount`` and ``gross_amount`` expressions of order totals.
+    Totals are rounded by database, so values ending exactly with half a cent could
+    differ from ``Order.total()`` by 0.01 on some backends.
+    """
+    decimal_field = models.DecimalField(max_digits=12, decimal_places=2)
+    if price_per_student is None:
+        price_per_student = models.F("plan__price_per_student")
+    net = models.ExpressionWrapper(
+        models.F("amount")
+        * Coalesce(NullIf("branches_number", models.Value(0)), models.Value(1))
+        + Coalesce(price_per_student * models.F("students_number"), models.Value(0))
+        + Coalesce("first_time_fees", models.Value(0)),
+        output_field=decimal_field,
+    )
+    net = models.Case(
+        models.When(pricing__isnull=True, then=models.F("amount")),
+        default=net,
+        output_field=decimal_field,
+    )
+    gross = models.Case(
+        models.When(tax__isnull=True, then=net),
+        # Round() with precision needs Django 4.0
+        default=models.Func(
+            # Multiplying instead of dividing by 100 avoids integer division on SQLite
+            net * (models.F("tax") + models.Value(100)) * models.Value(Decimal("0.01")),
+            models.Value(2),
+            function="ROUND",
+            output_field=decimal_field,
+        ),
+        output_field=decimal_field,
+    )
+    tax = models.Case(
+        models.When(tax__isnull=True, then=models.Value(Decimal("0.00"))),
+        default=gross - models.F("amount"),
+        output_field=decimal_field,
+    )
+    return {"net_amount": net, "tax_amount": tax, "gross_amount": gross}
+
+
 class AbstractOrder(BaseMixin, models.Model):
     """
     Order in this app supports only one item per order. This item is defined by
@@ -1017,10 +1291,42 @@ class AbstractOrder(BaseMixin, models.Model):
     currency = models.CharField(_("currency"), max_length=3, default="EUR")
     status = models.IntegerField(_("status"), choices=STATUS, default=STATUS.NEW)
     tap_id = models.CharField(_("Tap ID"), max_length=256, null=True, blank=True)
+    total_gross = models.DecimalField(
+        _("total gross"),
+        max_digits=12,
+        decimal_places=2,
+        db_index=True,
+        null=True,
+        blank=True,
+        editable=False,
+    )  # result of total() kept in sync on save
+
+    TOTAL_FIELDS = (
+        "plan",
+        "pricing",
+        "amount",
+        "tax",
+        "branches_number",
+        "students_number",
+        "first_time_fees",
+    )
+
+    objects = OrderQuerySet.as_manager()
 
     def __str__(self):
         return _("Order #%(id)d") % {"id": self.id}
 
+    def save(self, *args, **kwargs):
+        self.total_gross = self.total() if self.amount is not None else None
+        update_fields = kwargs.get("update_fields")
+        if (
+            update_fields is not None
+            and "total_gross" not in update_fields
+            and set(update_fields) & set(self.TOTAL_FIELDS)
+        ):
+            kwargs["update_fields"] = list(update_fields) + ["total_gross"]
+        return super(AbstractOrder, self).save(*args, **kwargs)
+
     @property
     def name(self):
         """
@@ -1050,7 +1356,7 @@ class AbstractOrder(BaseMixin, models.Model):
 
     def get_plan_extended_until(self):
         return self.user.userplan.get_plan_extended_until(self.plan, self.pricing)
-    
+
     def complete_trial_order(self):
         self.status = self.STATUS.COMPLETED
         self.save()
@@ -1088,7 +1394,7 @@ class AbstractOrder(BaseMixin, models.Model):
             return True
         else:
             return False
-        
+
     def return_order(self):
         if self.status != self.STATUS.RETURNED:
             if self.status == self.STATUS.COMPLETED:
@@ -1336,46 +1642,62 @@ class AbstractInvoice(BaseMixin, models.Model):
 
     def clean(self):
         if self.number is None:
-            Invoice = self.get_concrete_model()
-            invoice_counter_reset = getattr(
-                settings, "PLANS_INVOICE_COUNTER_RESET", Invoice.NUMBERING.MONTHLY
+            self.set_sequence()
+
+    def set_sequence(self, initial_numbers=None):
+        """
+        Sets ``sequence_name`` and ``initial_number`` of the sequence generating invoice number.
+
+        :param initial_numbers: optional dict caching initial numbers by sequence name
+            between calls for multiple invoices
+        """
+        Invoice = self.get_concrete_model()
+        invoice_counter_reset = getattr(
+            settings, "PLANS_INVOICE_COUNTER_RESET", Invoice.NUMBERING.MONTHLY
+        )
+        invoice_counter_reset_name = invoice_counter_reset
+
+        # To avoid duplicates as well as gaps in the sequence, we are using django-sequences
+        # to generate sequence number for each invoice
+        # We keep the old sequence generating mechanism to get lower initial value,
+        # so that the sequence will continue backward compatibly
+        older_invoices = Invoice.objects.filter(type=self.type)
+        initial_number = None
+        if invoice_counter_reset == Invoice.NUMBERING.DAILY:
+            invoice_counter_value = (
+                f"{self.issued.year}_{self.issued.month}_{self.issued.day}"
+            )
+            older_invoices = older_invoices.filter(issued=self.issued)
+        elif invoice_counter_reset == Invoice.NUMBERING.MONTHLY:
+            invoice_counter_value = f"{self.issued.year}_{self.issued.month}"
+            older_invoices = older_invoices.filter(
+                issued__year=self.issued.year,
+                issued__month=self.issued.month,
+            )
+        elif invoice_counter_reset == Invoice.NUMBERING.ANNUALLY:
+            invoice_counter_value = f"{self.issued.year}"
+            older_invoices = older_invoices.filter(issued__year=self.issued.year)
+        elif callable(invoice_counter_reset):
+            invoice_counter_value, initial_number = invoice_counter_reset(self)
+            invoice_counter_reset_name = "call"
+        else:
+            raise ImproperlyConfigured(
+                "PLANS_INVOICE_COUNTER_RESET can be set only to these values: daily, monthly, yearly."
             )
-            invoice_counter_reset_name = invoice_counter_reset
-
-            # To avoid duplicates as well as gaps in the sequence, we are using django-sequences
-            # to generate sequence number for each invoice
-            # We keep the old sequence generating mechanism to get lower initial value,
-            # so that the sequence will continue backward compatibly
-            older_invoices = Invoice.objects.filter(type=self.type)
-            initial_number = None
-            if invoice_counter_reset == Invoice.NUMBERING.DAILY:
-                invoice_counter_value = (
-                    f"{self.issued.year}_{self.issued.month}_{self.issued.day}"
-                )
-                older_invoices = older_invoices.filter(issued=self.issued)
-            elif invoice_counter_reset == Invoice.NUMBERING.MONTHLY:
-                invoice_counter_value = f"{self.issued.year}_{self.issued.month}"
-                older_invoices = older_invoices.filter(
-                    issued__year=self.issued.year,
-                    issued__month=self.issued.month,
-                )
-            elif invoice_counter_reset == Invoice.NUMBERING.ANNUALLY:
-                invoice_counter_value = f"{self.issued.year}"
-                older_invoices = older_invoices.filter(issued__year=self.issued.year)
-            elif callable(invoice_counter_reset):
-                invoice_counter_value, initial_number = invoice_counter_reset(self)
-                invoice_counter_reset_name = "call"
-            else:
-                raise ImproperlyConfigured(
-                    "PLANS_INVOICE_COUNTER_RESET can be set only to these values: daily, monthly, yearly."
-                )
 
-            # get initial value for backward compatibility
-            if initial_number:
-                self.initial_number = initial_number
-            else:
-                self.initial_number = get_initial_number(older_invoices)
-            self.sequence_name = f"invoice_numbers_{self.type}_{invoice_counter_reset_name}_{invoice_counter_value}"
+        self.sequence_name = f"invoice_numbers_{self.type}_{invoice_counter_reset_name}_{invoice_counter_value}"
+        # get initial value for backward compatibility
+        if initial_number:
+            self.initial_number = initial_number
+        elif initial_numbers is not None and self.sequence_name in initial_numbers:
+            self.initial_number = initial_numbers[self.sequence_name]
+        elif sequence_exists(self.sequence_name):
+            # Initial value is used only when the sequence is created, skip scanning older invoices
+            self.initial_number = 1
+        else:
+            self.initial_number = get_initial_number(older_invoices)
+        if initial_numbers is not None:
+            initial_numbers[self.sequence_name] = self.initial_number
 
     def save(self, *args, **kwargs):
         with transaction.atomic():
@@ -1383,13 +1705,33 @@ class AbstractInvoice(BaseMixin, models.Model):
                 self.number = get_next_value(
                     self.sequence_name, initial_value=self.initial_number
                 )
+                mark_sequence_existing(self.sequence_name)
+            if self.full_number == "" and not self.full_number_needs_pk():
+                self.set_full_number()
             super(AbstractInvoice, self).save(*args, **kwargs)
+            if self.full_number == "":
+                # Full number refers to primary key assigned by the INSERT
+                self.set_full_number()
+                super(AbstractInvoice, self).save(update_fields=["full_number"])
 
-        # We need to generate full number based on what invoice sequence number actually ended up in DB
-        self.refresh_from_db()
-        if self.full_number == "":
-            self.full_number = self.get_full_number()
-        super(AbstractInvoice, self).save(update_fields=["full_number"])
+    def full_number_needs_pk(self):
+        return self.pk is None and get_invoice_number_formatter().uses_primary_key
+
+    def set_full_number(self):
+        """
+        Fills ``full_number`` before the invoice is written, so it is stored by single query.
+        Date values are converted the same way they will be read back from DB first,
+        so the full number doesn't depend on whether e.g. ``issued`` was set to ``date`` or ``datetime``.
+        ``auto_now`` and ``auto_now_add`` fields (e.g. ``created``) are filled in first.
+        """
+        for field in self._meta.concrete_fields:
+            if isinstance(field, models.DateField):
+                if field.auto_now or (field.auto_now_add and self._state.adding):
+                    field.pre_save(self, self._state.adding)
+                value = getattr(self, field.attname)
+                if value is not None:
+                    setattr(self, field.attname, field.to_python(value))
+        self.full_number = self.get_full_number()
 
     #    def validate_unique(self, exclude=None):
     #        super(Invoice, self).validate_unique(exclude)
@@ -1412,14 +1754,7 @@ class AbstractInvoice(BaseMixin, models.Model):
 
         :return: string (generated full number)
         """
-        format = getattr(
-            settings,
-            "PLANS_INVOICE_NUMBER_FORMAT",
-            "{{ invoice.number }}/"
-            "{% if invoice.type == invoice.INVOICE_TYPES.PROFORMA %}PF{% else %}FV{% endif %}"
-            "/{{ invoice.issued|date:'m/Y' }}",
-        )
-        return Template(format).render(Context({"invoice": self}))
+        return get_invoice_number_formatter()(self)
 
     def set_issuer_invoice_data(self):
         """
@@ -1473,7 +1808,7 @@ class AbstractInvoice(BaseMixin, models.Model):
         self.unit_price_net = order.amount
         self.total_net = order.amount
         self.total = order.total()
-        self.tax_total = order.total() - order.amount
+        self.tax_total = self.total - order.amount
         self.tax = order.tax
         self.currency = order.currency
         self.students_number = order.students_number
@@ -1500,6 +1835,17 @@ class AbstractInvoice(BaseMixin, models.Model):
         except BillingInfo.DoesNotExist:
             return
 
+        invoice = cls.build(order, invoice_type, billing_info)
+        invoice.clean()
+        invoice.save()
+        if language_code is not None:
+            translation.deactivate()
+
+    @classmethod
+    def build(cls, order, invoice_type, billing_info):
+        """
+        Returns new unsaved invoice of ``invoice_type`` for the ``order``.
+        """
         day = date.today()
         pday = order.completed
         if invoice_type == cls.INVOICE_TYPES["PROFORMA"]:
@@ -1512,10 +1858,88 @@ class AbstractInvoice(BaseMixin, models.Model):
         invoice.copy_from_order(order)
         invoice.set_issuer_invoice_data()
         invoice.set_buyer_invoice_data(billing_info)
-        invoice.clean()
-        invoice.save()
-        if language_code is not None:
-            translation.deactivate()
+        return invoice
+
+    @classmethod
+    def bulk_create_invoices(cls, orders, invoice_type):
+        """
+        Creates invoices of ``invoice_type`` for many orders at once (e.g. month-end batch invoicing).
+
+        Orders of users without billing info are skipped, as in ``create()``. Invoice numbers are
+        reserved in blocks by one sequence query per numbering sequence, full numbers are generated
+        before the insert and all invoices are inserted by one ``bulk_create``. As ``post_save`` is not
+        sent for bulk created objects, invoice e-mails are sent explicitly afterwards. If
+        ``PLANS_INVOICE_NUMBER_FORMAT`` refers to ``invoice.id``, invoices are saved one by one instead.
+
+        :return: list of created invoices
+        """
+        if isinstance(orders, models.QuerySet):
+            orders = orders.select_related("user")
+        orders = list(orders)
+        BillingInfo = AbstractBillingInfo.get_concrete_model()
+        billing_infos = {
+            billing_info.user_id: billing_info
+            for billing_info in BillingInfo.objects.filter(
+                user_id__in={order.user_id for order in orders}
+            )
+        }
+
+        invoices = []
+        languages = []
+        initial_numbers = {}
+        for order in orders:
+            billing_info = billing_infos.get(order.user_id)
+            if billing_info is None:
+                continue
+            language_code = get_user_language(order.user)
+            if language_code is not None:
+                translation.activate(language_code)
+            invoice = cls.build(order, invoice_type, billing_info)
+            invoice.set_sequence(initial_numbers)
+            if language_code is not None:
+                translation.deactivate()
+            invoices.append(invoice)
+            languages.append(language_code)
+
+        with transaction.atomic():
+            sequences = {}
+            for invoice in invoices:
+                if invoice.number is None:
+                    sequences.setdefault(invoice.sequence_name, []).append(invoice)
+            for sequence_name, sequence_invoices in sequences.items():
+                numbers = get_next_values(
+                    len(sequence_invoices),
+                    sequence_name,
+                    initial_value=sequence_invoices[0].initial_number,
+                )
+                for invoice, number in zip(sequence_invoices, numbers):
+                    invoice.number = number
+                mark_sequence_existing(sequence_name)
+
+            save_one_by_one = bool(invoices) and invoices[0].full_number_needs_pk()
+            if save_one_by_one:
+                # Full numbers refer to primary keys, which bulk_create doesn't return on every database,
+                # e-mails are sent by post_save
+                for invoice, language_code in zip(invoices, languages):
+                    if language_code is not None:
+                        translation.activate(language_code)
+                    invoice.save()
+                    if language_code is not None:
+                        translation.deactivate()
+            else:
+                for invoice, language_code in zip(invoices, languages):
+                    if language_code is not None:
+                        translation.activate(language_code)
+                    if invoice.full_number == "":
+                        invoice.set_full_number()
+                    if language_code is not None:
+                        translation.deactivate()
+                cls.objects.bulk_create(invoices)
+
+        if not save_one_by_one:
+            for invoice in invoices:
+                invoice.send_invoice_by_email()
+        return invoices
 
     def send_invoice_by_email(self):
         if self.type in getattr(
@@ -0,0 +1,125 @@
+import threading
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def get_cache():
+    return caches[getattr(settings, "PLANS_CACHE_ALIAS", "default")]
+
+
+def get_cache_timeout():
+    return getattr(settings, "PLANS_CACHE_TIMEOUT", 3600)
+
+
+class VersionedCache(object):
+    """
+    Two level cache (process memory and Django cache backend) for data derived from the plans catalog.
+
+    Every namespace has a version token stored in the Django cache. Invalidating the namespace
+    replaces the token by a new unique one once the transaction is committed, so stale entries
+    (in the shared cache as well as in process memory of every worker) are never read again,
+    even when the token was evicted from the cache. A lookup costs one cache ``get`` when the value is
+    already held in process memory and does not touch the database on hit.
+
+    Caching is enabled by the ``enabled_setting`` Django setting, otherwise values are always
+    computed and nothing is stored.
+    """
+
+    def __init__(self, namespace, enabled_setting):
+        self.namespace = namespace
+        self.enabled_setting = enabled_setting
+        self.local = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return getattr(settings, self.enabled_setting, False)
+
+    @property
+    def version_key(self):
+        return "plans_%s_version" % self.namespace
+
+    def make_key(self, key, version):
+        return "plans_%s_%s_%s" % (self.namespace, version, key)
+
+    def get_version(self):
+        cache = get_cache()
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid4().hex
+            # Other process could store the token first
+            cache.add(self.version_key, version, None)
+            version = cache.get(self.version_key, version)
+        return version
+
+    def get(self, key, compute):
+        """
+        Returns value stored under ``key``, calling ``compute()`` and storing its result on miss.
+        """
+        if not self.enabled:
+            return compute()
+
+        version = self.get_version()
+        local_value = self.local.get(key)
+        if local_value is not None and local_value[0] == version:
+            self._count_hit()
+            return local_value[1]
+
+        cache = get_cache()
+        cache_key = self.make_key(key, version)
+        value = cache.get(cache_key, self)
+        if value is self:
+            self._count_miss()
+            value = compute()
+            cache.set(cache_key, value, get_cache_timeout())
+        else:
+            self._count_hit()
+        self.local[key] = (version, value)
+        return value
+
+    def invalidate(self, *args, **kwargs):
+        """
+        Invalidates whole namespace after the transaction is committed, so no other process can store
+        values computed from uncommitted data under the new version.
+        Accepts any arguments so it can be connected to signals directly.
+        """
+        transaction.on_commit(self.bump_version, using=kwargs.get("using"))
+
+    def bump_version(self):
+        get_cache().set(self.version_key, uuid4().hex, None)
+        self.local.clear()
+
+    def clear(self):
+        """
+        Drops local entries and resets hit/miss counters.
+        """
+        self.local.clear()
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "local_entries": len(self.local),
+        }
+
+    def _count_hit(self):
+        with self.lock:
+            self.hits += 1
+
+    def _count_miss(self):
+        with self.lock:
+            self.misses += 1
+
+
+quota_cache = VersionedCache("quota", "PLANS_QUOTA_CACHE")
+plan_table_cache = VersionedCache("plan_table", "PLANS_PLAN_TABLE_CACHE")
+catalog_cache = VersionedCache("catalog", "PLANS_CATALOG_CACHE")
+default_plan_cache = VersionedCache("default_plan", "PLANS_DEFAULT_PLAN_CACHE")
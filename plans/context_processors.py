@@ -1,8 +1,4 @@
-from django.urls import reverse
-
-from plans.base.models import AbstractUserPlan
-
-UserPlan = AbstractUserPlan.get_concrete_model()
+from plans.middleware import get_account_urls, get_userplan_snapshot
 
 
 def account_status(request):
@@ -16,20 +12,18 @@ def account_status(request):
      * ``EXTEND_URL = string``, URL to account extend page.
      * ``ACTIVATE_URL = string``, URL to account activation needed if  account is not active
 
+    User plan is read from ``request.userplan_snapshot`` (see ``UserPlanSnapshotMiddleware``).
     """
 
     if hasattr(request, "user") and request.user.is_authenticated:
-        try:
-            return {
-                "ACCOUNT_EXPIRED": request.user.userplan.is_expired(),
-                "ACCOUNT_NOT_ACTIVE": (
-                    not request.user.userplan.is_active()
-                    and not request.user.userplan.is_expired()
-                ),
-                "EXPIRE_IN_DAYS": request.user.userplan.days_left(),
-                "EXTEND_URL": reverse("current_plan"),
-                "ACTIVATE_URL": reverse("account_activation"),
+        snapshot = get_userplan_snapshot(request)
+        if snapshot.userplan is not None:
+            context = {
+                "ACCOUNT_EXPIRED": snapshot.is_expired,
+                "ACCOUNT_NOT_ACTIVE": not snapshot.is_active
+                and not snapshot.is_expired,
+                "EXPIRE_IN_DAYS": snapshot.days_left,
             }
-        except UserPlan.DoesNotExist:
-            pass
+            context.update(get_account_urls())
+            return context
     return {}
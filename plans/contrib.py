@@ -1,9 +1,13 @@
 import logging
+import threading
+import time
 
 from django.apps import apps
 from django.conf import settings
 from django.core import mail
 from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.template import loader
 from django.template.exceptions import TemplateDoesNotExist
 from django.utils import translation
@@ -13,6 +17,109 @@ from plans.signals import user_language
 email_logger = logging.getLogger("emails")
 
 
+class TemplateEmailRenderer(object):
+    """
+    Renders plans e-mails.
+
+    Title, text body and optional HTML body templates are resolved once per
+    (title template, body template, language) and kept compiled, so repeated sends don't
+    search template loaders again (nor probe for missing HTML variant). Site name and domain
+    are cached as well. Caches are dropped by ``clear()``, which is called when
+    ``TEMPLATES`` setting or any ``Site`` changes.
+    """
+
+    def __init__(self):
+        self.templates = {}
+        self.site_info = None
+        self.lock = threading.Lock()
+        self.renders = 0
+        self.render_time = 0.0
+
+    def get_templates(self, title_template, body_template, language=None):
+        key = (title_template, body_template, language)
+        templates = self.templates.get(key)
+        if templates is None:
+            try:
+                html_template = loader.get_template(
+                    body_template.replace(".txt", ".html")
+                )
+            except TemplateDoesNotExist:
+                html_template = None
+            templates = (
+                loader.get_template(title_template),
+                loader.get_template(body_template),
+                html_template,
+            )
+            if not settings.DEBUG:
+                # Templates can be edited during development
+                self.templates[key] = templates
+        return templates
+
+    def get_site_info(self):
+        """
+        Returns tuple of site name, domain and ``Site`` object (or ``None``).
+        """
+        if self.site_info is None:
+            site_name = getattr(
+                settings, "SITE_NAME", "Please define settings.SITE_NAME"
+            )
+            domain = getattr(settings, "SITE_URL", None)
+            current_site = None
+            if domain is None:
+                try:
+                    Site = apps.get_model("sites", "Site")
+                    current_site = Site.objects.get_current()
+                    site_name = current_site.name
+                    domain = current_site.domain
+                except LookupError:
+                    pass
+            self.site_info = (site_name, domain, current_site)
+        return self.site_info
+
+    def render(self, title_template, body_template, context, language=None):
+        """
+        Renders e-mail in the active language, returns tuple of title, body and HTML body (or ``None``).
+        """
+        started = time.perf_counter()
+        title_tpl, body_tpl, html_tpl = self.get_templates(
+            title_template, body_template, language
+        )
+        title = title_tpl.render(context).strip()
+        body = body_tpl.render(context)
+        html_body = html_tpl.render(context) if html_tpl is not None else None
+        with self.lock:
+            self.renders += 1
+            self.render_time += time.perf_counter() - started
+        return title, body, html_body
+
+    def clear(self, *args, **kwargs):
+        """
+        Drops cached templates and site info and resets render counters.
+        Accepts any arguments so it can be connected to signals.
+        """
+        self.templates = {}
+        self.site_info = None
+        with self.lock:
+            self.renders = 0
+            self.render_time = 0.0
+
+    def stats(self):
+        return {
+            "renders": self.renders,
+            "render_time": self.render_time,
+            "cached_templates": len(self.templates),
+        }
+
+
+email_renderer = TemplateEmailRenderer()
+
+
+@receiver(setting_changed)
+def reset_email_renderer(setting, **kwargs):
+    if setting in ("TEMPLATES", "SITE_NAME", "SITE_URL", "SITE_ID", "DEBUG"):
+        email_renderer.clear()
+
+
 def send_template_email(recipients, title_template, body_template, context, language):
     """Sends e-mail using templating system"""
 
@@ -20,18 +127,7 @@ def send_template_email(recipients, title_template, body_template, context, lang
     if not send_emails:
         return
 
-    site_name = getattr(settings, "SITE_NAME", "Please define settings.SITE_NAME")
-    domain = getattr(settings, "SITE_URL", None)
-
-    if domain is None:
-        try:
-            Site = apps.get_model("sites", "Site")
-            current_site = Site.objects.get_current()
-            site_name = current_site.name
-            domain = current_site.domain
-        except LookupError:
-            pass
-
+    site_name, domain, current_site = email_renderer.get_site_info()
     context.update(
         {"site_name": site_name, "site_domain": domain, "site": current_site}
     )
@@ -39,17 +135,9 @@ def send_template_email(recipients, title_template, body_template, context, lang
     if language is not None:
         translation.activate(language)
 
-    mail_title_template = loader.get_template(title_template)
-    mail_body_template = loader.get_template(body_template)
-    title = mail_title_template.render(context).strip()
-    body = mail_body_template.render(context)
-    try:
-        mail_body_template_html = loader.get_template(
-            body_template.replace(".txt", ".html")
-        )
-        html_body = mail_body_template_html.render(context)
-    except TemplateDoesNotExist:
-        html_body = None
+    title, body, html_body = email_renderer.render(
+        title_template, body_template, context, language
+    )
 
     try:
         email_from = getattr(settings, "DEFAULT_FROM_EMAIL")
@@ -58,13 +146,28 @@ def send_template_email(recipients, title_template, body_template, context, lang
             "DEFAULT_FROM_EMAIL setting needed for sending e-mails"
         )
 
-    mail.send_mail(title, body, email_from, recipients, html_message=html_body)
+    if getattr(settings, "PLANS_EMAIL_OUTBOX", False):
+        # Stored in the current transaction, sent later by plans.tasks.flush_email_outbox
+        OutboxEmail = apps.get_model("plans", "OutboxEmail")
+        OutboxEmail.objects.create(
+            recipients=list(recipients),
+            from_email=email_from,
+            subject=title,
+            body=body,
+            html_body=html_body,
+            language=language,
+        )
+        action = "queued"
+    else:
+        mail.send_mail(title, body, email_from, recipients, html_message=html_body)
+        action = "sent"
 
     if language is not None:
         translation.deactivate()
 
     email_logger.info(
-        "Email (%s) sent to %s\nTitle: %s\n%s\n\n" % (language, recipients, title, body)
+        "Email (%s) %s to %s\nTitle: %s\n%s\n\n"
+        % (language, action, recipients, title, body)
     )
 
 
@@ -81,44 +81,46 @@ class FakePaymentsForm(forms.Form):
         choices=Order.STATUS, required=True, label=gettext("Change order status to")
     )
 
+
 class PlanAdminForm(forms.ModelForm):
     order = forms.IntegerField(
         required=False,
         min_value=0,
-        help_text='Display order (lower = first)',
+        help_text="Display order (lower = first)",
     )
 
     class Meta:
         model = Plan
-        fields = '__all__'
-        exclude = ('order',)
+        fields = "__all__"
+        exclude = ("order",)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if self.instance.pk:
-            self.fields['order'].initial = self.instance.order
+            self.fields["order"].initial = self.instance.order
         if not self.instance.pk:
-            self.fields['name_ar'].required = True
-            self.fields['name_en'].required = True
-            self.fields['description_ar'].required = True
-            self.fields['description_en'].required = True
+            self.fields["name_ar"].required = True
+            self.fields["name_en"].required = True
+            self.fields["description_ar"].required = True
+            self.fields["description_en"].required = True
+
 
 class PricingAdminForm(forms.ModelForm):
     class Meta:
         model = Pricing
-        fields = '__all__'
+        fields = "__all__"
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['name_ar'].required = True
+        self.fields["name_ar"].required = True
 
 
 class QuotaAdminForm(forms.ModelForm):
     class Meta:
         model = Quota
-        fields = '__all__'
+        fields = "__all__"
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['name_ar'].required = True
-        self.fields['name_en'].required = True
+        self.fields["name_ar"].required = True
+        self.fields["name_en"].required = True
@@ -1,20 +1,39 @@
+from django.apps import apps
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch.dispatcher import receiver
 
 from plans.base.models import (
     AbstractInvoice,
     AbstractOrder,
     AbstractPlan,
+    AbstractPlanPricing,
+    AbstractPlanQuota,
+    AbstractPricing,
+    AbstractQuota,
+    AbstractRecurringUserPlan,
     AbstractUserPlan,
 )
+from plans.cache import (
+    catalog_cache,
+    default_plan_cache,
+    plan_table_cache,
+    quota_cache,
+)
+from plans.contrib import email_renderer
 from plans.signals import activate_user_plan, order_completed
+from plans.status import status_cache
 
 User = get_user_model()
 Order = AbstractOrder.get_concrete_model()
 Invoice = AbstractInvoice.get_concrete_model()
 UserPlan = AbstractUserPlan.get_concrete_model()
+RecurringUserPlan = AbstractRecurringUserPlan.get_concrete_model()
 Plan = AbstractPlan.get_concrete_model()
+PlanQuota = AbstractPlanQuota.get_concrete_model()
+PlanPricing = AbstractPlanPricing.get_concrete_model()
+Pricing = AbstractPricing.get_concrete_model()
+Quota = AbstractQuota.get_concrete_model()
 
 
 @receiver(post_save, sender=Order)
@@ -48,6 +67,106 @@ def set_default_user_plan(sender, instance, created, **kwargs):
         UserPlan.create_for_user(instance)
 
 
+@receiver(post_save, sender=Plan)
+def update_orders_total_gross(sender, instance, created, using=None, **kwargs):
+    """
+    Persisted ``Order.total_gross`` includes price per student of the plan
+    """
+    loaded = getattr(instance, "_loaded_price_per_student", None)
+    if not created and (loaded is None or loaded != instance.price_per_student):
+        Order.objects.using(using).filter(plan=instance).update_total_gross()
+    instance._loaded_price_per_student = instance.price_per_student
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+@receiver(post_save, sender=PlanQuota)
+@receiver(post_delete, sender=PlanQuota)
+@receiver(post_save, sender=Quota)
+@receiver(post_delete, sender=Quota)
+def invalidate_quota_cache(sender, **kwargs):
+    """
+    Quota dicts and plan tables are cached, every change of quotas invalidates them
+    """
+    quota_cache.invalidate()
+    plan_table_cache.invalidate()
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+@receiver(post_save, sender=PlanPricing)
+@receiver(post_delete, sender=PlanPricing)
+@receiver(post_save, sender=Pricing)
+@receiver(post_delete, sender=Pricing)
+@receiver(post_save, sender=PlanQuota)
+@receiver(post_delete, sender=PlanQuota)
+@receiver(post_save, sender=Quota)
+@receiver(post_delete, sender=Quota)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Plan lists, rendered plan tables and the default plan are cached,
+    every change of the catalog invalidates them
+    """
+    catalog_cache.invalidate()
+    default_plan_cache.invalidate()
+
+
+@receiver(post_save, sender=PlanPricing)
+@receiver(post_delete, sender=PlanPricing)
+def update_plan_pricing_summary(sender, instance, using=None, **kwargs):
+    """
+    Keeps pricing summary fields of the plan up to date
+    """
+    plan_ids = {instance.plan_id, getattr(instance, "_loaded_plan_id", None)}
+    plan_ids.discard(None)
+    instance._loaded_plan_id = instance.plan_id
+    for plan in Plan.update_pricing_summaries(plan_ids, using=using):
+        if plan.pk == instance.plan_id and PlanPricing.plan.is_cached(instance):
+            for name in Plan.PRICING_SUMMARY_FIELDS:
+                setattr(instance.plan, name, getattr(plan, name))
+
+
+@receiver(post_save, sender=Pricing)
+def update_pricing_plans_summary(sender, instance, created, using=None, **kwargs):
+    """
+    Period of the pricing determines the first pricing of every plan using it
+    """
+    if not created:
+        Plan.update_pricing_summaries(
+            PlanPricing.objects.using(using)
+            .filter(pricing=instance)
+            .values_list("plan_id", flat=True),
+            using=using,
+        )
+
+
+@receiver(post_save, sender=UserPlan)
+@receiver(post_delete, sender=UserPlan)
+def delete_userplan_status(sender, instance, using=None, **kwargs):
+    """
+    Removes status of user plan from the shared status cache, it is loaded again on next read
+    """
+    status_cache.delete(instance.user_id, using=using)
+
+
+@receiver(post_save, sender=RecurringUserPlan)
+@receiver(post_delete, sender=RecurringUserPlan)
+def delete_recurring_userplan_status(sender, instance, using=None, **kwargs):
+    if status_cache.enabled:
+        status_cache.delete_many(
+            UserPlan.objects.using(using)
+            .filter(pk=instance.user_plan_id)
+            .values_list("user_id", flat=True),
+            using=using,
+        )
+
+
+if apps.is_installed("django.contrib.sites"):
+    # Site name and domain used in e-mails are cached
+    post_save.connect(email_renderer.clear, sender="sites.Site")
+    post_delete.connect(email_renderer.clear, sender="sites.Site")
+
+
 # Hook to django-registration to initialize plan automatically after user has confirm account
 
 
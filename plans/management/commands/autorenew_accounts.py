@@ -13,16 +13,53 @@ class Command(BaseCommand):
             dest="providers",
             help="Renew only accounts with this providers",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            dest="batch_size",
+            help="Number of accounts fetched from database at once",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            dest="limit",
+            help="Renew at most this number of accounts",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            dest="concurrency",
+            help="Number of concurrent renewals per payment provider",
+        )
 
     def handle(self, *args, **options):  # pragma: no cover
         providers = options.get("providers")
         self.stdout.write("Starting renewal")
-        renewed_accounts = tasks.autorenew_account(providers)
-        if renewed_accounts:
-            self.stdout.write("Accounts submitted to renewal:")
-            for a in renewed_accounts:
-                self.stdout.write(
-                    f"\t{a.userplan.recurring.payment_provider}\t{a.email}\t{a}"
-                )
-        else:
+
+        header_printed = False
+
+        def print_account(account):
+            nonlocal header_printed
+            if not header_printed:
+                self.stdout.write("Accounts submitted to renewal:")
+                header_printed = True
+            self.stdout.write(
+                f"\t{account.userplan.recurring.payment_provider}\t{account.email}\t{account}"
+            )
+
+        renewed_accounts = tasks.autorenew_account(
+            providers,
+            batch_size=options["batch_size"],
+            limit=options["limit"],
+            callback=print_account,
+            concurrency=options["concurrency"],
+        )
+        if not renewed_accounts:
             self.stdout.write("No accounts autorenewed")
+        for result in renewed_accounts.failed:
+            self.stdout.write(
+                f"Renewal failed:\t{result.provider}\t{result.user}\t{result.error!r}"
+            )
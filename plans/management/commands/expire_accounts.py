@@ -6,6 +6,21 @@ from plans import tasks
 class Command(BaseCommand):
     help = "Expire accounts and send messages"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            dest="bulk",
+            help="Deactivate expired accounts in chunks by single query",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            dest="batch_size",
+            help="Number of accounts expired at once in bulk mode",
+        )
+
     def handle(self, *args, **options):  # pragma: no cover
-        tasks.expire_account()
+        tasks.expire_account(bulk=options["bulk"], batch_size=options["batch_size"])
         self.stdout.write("accounts was expired")
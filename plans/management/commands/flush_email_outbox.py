@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand
+
+from plans import tasks
+
+
+class Command(BaseCommand):
+    help = "Send e-mails waiting in the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            dest="batch_size",
+            help="Number of e-mails sent over one connection",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=None,
+            dest="max_attempts",
+            help="Mark e-mail as failed after this number of attempts",
+        )
+
+    def handle(self, *args, **options):
+        sent, failed = tasks.flush_email_outbox(
+            batch_size=options["batch_size"], max_attempts=options["max_attempts"]
+        )
+        self.stdout.write(f"{sent} e-mails sent, {failed} e-mails failed")
@@ -0,0 +1,56 @@
+import json
+import os
+
+from django.core.management import BaseCommand
+
+from plans import tasks
+
+
+class Command(BaseCommand):
+    help = "Check VAT IDs of all billing infos in VIES and store results in VIES cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            dest="chunk_size",
+            help="Number of billing infos processed at once",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=2,
+            dest="concurrency",
+            help="Maximal number of concurrent VIES calls per member state",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            dest="checkpoint",
+            help="File storing progress, revalidation is resumed from it if it exists",
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = options["checkpoint"]
+        start_after = None
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                start_after = json.load(f)["last_pk"]
+            self.stdout.write(f"Resuming after billing info {start_after}")
+
+        def progress(stats):
+            if checkpoint:
+                with open(checkpoint + ".tmp", "w") as f:
+                    json.dump({"last_pk": stats.last_pk}, f)
+                os.replace(checkpoint + ".tmp", checkpoint)
+            self.stdout.write(str(stats))
+
+        stats = tasks.revalidate_tax_numbers(
+            chunk_size=options["chunk_size"],
+            concurrency=options["concurrency"],
+            start_after=start_after,
+            progress=progress,
+        )
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(f"Finished: {stats}")
@@ -0,0 +1,58 @@
+from django.core.management import BaseCommand, CommandError
+
+from plans.simulation import PriceChangeSimulation, iter_simulation_csv
+
+
+def parse_prices(values, option):
+    prices = {}
+    for value in values or []:
+        try:
+            pk, price = value.split("=")
+            prices[int(pk)] = price
+        except ValueError:
+            raise CommandError(f"Invalid {option} value {value!r}, use ID=PRICE")
+    return prices
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes CSV summary of impact of price changes on active subscriptions by plan"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pricing",
+            nargs="+",
+            dest="pricing",
+            metavar="PLANPRICING_ID=PRICE",
+            help="New price of plan pricing",
+        )
+        parser.add_argument(
+            "--price-per-student",
+            nargs="+",
+            dest="price_per_student",
+            metavar="PLAN_ID=PRICE",
+            help="New price per student of plan",
+        )
+        parser.add_argument(
+            "--output",
+            dest="output",
+            help="Write CSV to this file instead of standard output",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            simulation = PriceChangeSimulation(
+                parse_prices(options["pricing"], "--pricing"),
+                parse_prices(options["price_per_student"], "--price-per-student"),
+            )
+        except ArithmeticError as e:
+            raise CommandError(f"Invalid price: {e!r}")
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as f:
+                for line in iter_simulation_csv(simulation):
+                    f.write(line)
+        else:
+            for line in iter_simulation_csv(simulation):
+                self.stdout.write(line, ending="")
@@ -0,0 +1,39 @@
+from django.core.management import BaseCommand, CommandError
+
+from plans.base.models import AbstractPlan
+
+Plan = AbstractPlan.get_concrete_model()
+
+
+class Command(BaseCommand):
+    help = "Recomputes pricing summary (pricing count, lowest and first price) of plans"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--plans",
+            nargs="+",
+            type=int,
+            dest="plans",
+            help="Update only this plans (ids)",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            dest="check",
+            help="Only report plans with outdated summary and fail if there are any",
+        )
+
+    def handle(self, *args, **options):
+        plans = Plan.update_pricing_summaries(
+            options["plans"], commit=not options["check"]
+        )
+        for plan in plans:
+            self.stdout.write(
+                f"\t{plan.pk}\t{plan.pricing_count}\t{plan.min_price}\t{plan.first_price}"
+            )
+        if options["check"]:
+            if plans:
+                raise CommandError(f"{len(plans)} plans have outdated pricing summary")
+            self.stdout.write("Pricing summaries of all plans are up to date")
+        else:
+            self.stdout.write(f"{len(plans)} plans updated")
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+
+from plans.validators import plan_validation_bulk
+
+
+class Command(BaseCommand):
+    help = "Validates quotas of all active user plans"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--plans",
+            nargs="+",
+            type=int,
+            dest="plans",
+            help="Validate only accounts with this plans (ids)",
+        )
+        parser.add_argument(
+            "--include-inactive",
+            action="store_true",
+            dest="include_inactive",
+            help="Validate also inactive accounts",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            dest="chunk_size",
+            help="Number of accounts validated at once",
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(userplan__isnull=False)
+        if not options["include_inactive"]:
+            users = users.filter(userplan__active=True)
+        if options["plans"]:
+            users = users.filter(userplan__plan__in=options["plans"])
+
+        validated = 0
+        invalid = 0
+        for user, errors in plan_validation_bulk(users, options["chunk_size"]):
+            validated += 1
+            messages = errors["required_to_activate"] + errors["other"]
+            if messages:
+                invalid += 1
+                self.stdout.write(f"\t{user.pk}\t{user}\t{'; '.join(messages)}")
+        self.stdout.write(f"{validated} accounts validated, {invalid} exceeding quotas")
@@ -0,0 +1,37 @@
+from django.core.management import BaseCommand, CommandError
+
+from plans.status import status_cache
+
+
+class Command(BaseCommand):
+    help = "Writes statuses of all user plans to the shared status cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            dest="batch_size",
+            help="Number of user plans loaded at once",
+        )
+        parser.add_argument(
+            "--audit",
+            action="store_true",
+            dest="audit",
+            help="Only compare cached statuses with the database and fail if they differ",
+        )
+
+    def handle(self, *args, **options):
+        if not status_cache.enabled:
+            raise CommandError("Status cache is not enabled (PLANS_STATUS_CACHE)")
+
+        if options["audit"]:
+            mismatches = status_cache.audit(options["batch_size"])
+            for status, cached_status in mismatches:
+                self.stdout.write(f"\t{status.user_id}\t{status}\t{cached_status}")
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} cached statuses are out of date")
+            self.stdout.write("All cached statuses are up to date")
+        else:
+            count = status_cache.warm(options["batch_size"])
+            self.stdout.write(f"{count} statuses cached")
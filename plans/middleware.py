@@ -0,0 +1,102 @@
+from collections import namedtuple
+from datetime import date
+from functools import lru_cache
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import get_script_prefix, get_urlconf, reverse
+from django.utils.functional import SimpleLazyObject
+
+from plans.base.models import AbstractUserPlan
+
+UserPlan = AbstractUserPlan.get_concrete_model()
+
+
+class UserPlanSnapshot(
+    namedtuple(
+        "UserPlanSnapshot",
+        ["userplan", "plan", "today", "is_expired", "is_active", "days_left"],
+    )
+):
+    """
+    Immutable state of user plan taken once per request.
+    ``userplan`` is ``None`` for anonymous users and users without plan.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def load(cls, user, today=None):
+        if today is None:
+            today = date.today()
+        if user is None or not user.is_authenticated:
+            return cls(None, None, today, False, False, None)
+        try:
+            userplan = UserPlan.objects.select_related("plan", "recurring").get(
+                user=user
+            )
+        except UserPlan.DoesNotExist:
+            return cls(None, None, today, False, False, None)
+        # Reuse loaded user plan by request.user.userplan
+        userplan.user = user
+        return cls.from_userplan(userplan, today)
+
+    @classmethod
+    def from_userplan(cls, userplan, today):
+        if userplan.expire is None:
+            is_expired = False
+            days_left = None
+        else:
+            is_expired = userplan.expire < today
+            days_left = (userplan.expire - today).days
+        return cls(
+            userplan, userplan.plan, today, is_expired, userplan.is_active(), days_left
+        )
+
+
+def get_userplan_snapshot(request):
+    """
+    Returns ``UserPlanSnapshot`` of the request user, loaded at most once per request.
+    """
+    snapshot = getattr(request, "userplan_snapshot", None)
+    if snapshot is None:
+        snapshot = UserPlanSnapshot.load(getattr(request, "user", None))
+        request.userplan_snapshot = snapshot
+    return snapshot
+
+
+class UserPlanSnapshotMiddleware(object):
+    """
+    Sets lazy ``request.userplan_snapshot``, the user plan is loaded by single query on the first use
+    and shared by ``account_status`` context processor, plans views and ``request.user.userplan``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.userplan_snapshot = SimpleLazyObject(
+            lambda: UserPlanSnapshot.load(getattr(request, "user", None))
+        )
+        return self.get_response(request)
+
+
+@lru_cache(maxsize=None)
+def _get_account_urls(script_prefix, urlconf):
+    return {
+        "EXTEND_URL": reverse("current_plan", urlconf=urlconf),
+        "ACTIVATE_URL": reverse("account_activation", urlconf=urlconf),
+    }
+
+
+def get_account_urls():
+    """
+    Returns URLs of account extend and activation pages, resolved once per URLconf.
+    """
+    return _get_account_urls(get_script_prefix(), get_urlconf())
+
+
+@receiver(setting_changed)
+def reset_account_urls(setting, **kwargs):
+    if setting == "ROOT_URLCONF":
+        _get_account_urls.cache_clear()
@@ -6,13 +6,15 @@ from django.db import migrations, models
 class Migration(migrations.Migration):
 
     dependencies = [
-        ('plans', '0004_plan_free_trial_days_userplan_activated_date_and_more'),
+        ("plans", "0004_plan_free_trial_days_userplan_activated_date_and_more"),
     ]
 
     operations = [
         migrations.AddField(
-            model_name='order',
-            name='tap_id',
-            field=models.CharField(blank=True, max_length=256, null=True, verbose_name='Tap ID'),
+            model_name="order",
+            name="tap_id",
+            field=models.CharField(
+                blank=True, max_length=256, null=True, verbose_name="Tap ID"
+            ),
         ),
     ]
@@ -6,18 +6,22 @@ from django.db import migrations, models
 class Migration(migrations.Migration):
 
     dependencies = [
-        ('plans', '0006_userplancancelationreasons_and_more'),
+        ("plans", "0006_userplancancelationreasons_and_more"),
     ]
 
     operations = [
         migrations.AddField(
-            model_name='userplancancelationreasons',
-            name='reason_ar',
-            field=models.CharField(db_index=True, max_length=256, null=True, verbose_name='Reason'),
+            model_name="userplancancelationreasons",
+            name="reason_ar",
+            field=models.CharField(
+                db_index=True, max_length=256, null=True, verbose_name="Reason"
+            ),
         ),
         migrations.AddField(
-            model_name='userplancancelationreasons',
-            name='reason_en',
-            field=models.CharField(db_index=True, max_length=256, null=True, verbose_name='Reason'),
+            model_name="userplancancelationreasons",
+            name="reason_en",
+            field=models.CharField(
+                db_index=True, max_length=256, null=True, verbose_name="Reason"
+            ),
         ),
     ]
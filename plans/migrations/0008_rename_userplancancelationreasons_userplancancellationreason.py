@@ -6,12 +6,12 @@ from django.db import migrations
 class Migration(migrations.Migration):
 
     dependencies = [
-        ('plans', '0007_userplancancelationreasons_reason_ar_and_more'),
+        ("plans", "0007_userplancancelationreasons_reason_ar_and_more"),
     ]
 
     operations = [
         migrations.RenameModel(
-            old_name='UserPlanCancelationReasons',
-            new_name='UserPlanCancellationReason',
+            old_name="UserPlanCancelationReasons",
+            new_name="UserPlanCancellationReason",
         ),
     ]
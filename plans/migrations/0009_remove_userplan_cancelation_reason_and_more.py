@@ -7,17 +7,23 @@ from django.db import migrations, models
 class Migration(migrations.Migration):
 
     dependencies = [
-        ('plans', '0008_rename_userplancancelationreasons_userplancancellationreason'),
+        ("plans", "0008_rename_userplancancelationreasons_userplancancellationreason"),
     ]
 
     operations = [
         migrations.RemoveField(
-            model_name='userplan',
-            name='cancelation_reason',
+            model_name="userplan",
+            name="cancelation_reason",
         ),
         migrations.AddField(
-            model_name='userplan',
-            name='cancellation_reason',
-            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='plans.userplancancellationreason', verbose_name='Cancellation Reason'),
+            model_name="userplan",
+            name="cancellation_reason",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                to="plans.userplancancellationreason",
+                verbose_name="Cancellation Reason",
+            ),
         ),
     ]
@@ -6,13 +6,15 @@ from django.db import migrations, models
 class Migration(migrations.Migration):
 
     dependencies = [
-        ('plans', '0009_remove_userplan_cancelation_reason_and_more'),
+        ("plans", "0009_remove_userplan_cancelation_reason_and_more"),
     ]
 
     operations = [
         migrations.AddField(
-            model_name='userplan',
-            name='paid',
-            field=models.BooleanField(db_index=True, default=False, verbose_name='Paid'),
+            model_name="userplan",
+            name="paid",
+            field=models.BooleanField(
+                db_index=True, default=False, verbose_name="Paid"
+            ),
         ),
     ]
@@ -0,0 +1,80 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plans", "0012_alter_order_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEmail",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True, db_index=True, verbose_name="created"
+                    ),
+                ),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[(1, "pending"), (2, "sent"), (3, "failed")],
+                        db_index=True,
+                        default=1,
+                        verbose_name="status",
+                    ),
+                ),
+                ("recipients", models.JSONField(verbose_name="recipients")),
+                (
+                    "from_email",
+                    models.CharField(max_length=254, verbose_name="from e-mail"),
+                ),
+                ("subject", models.TextField(verbose_name="subject")),
+                ("body", models.TextField(verbose_name="body")),
+                (
+                    "html_body",
+                    models.TextField(blank=True, null=True, verbose_name="HTML body"),
+                ),
+                (
+                    "language",
+                    models.CharField(
+                        blank=True, max_length=10, null=True, verbose_name="language"
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(default=0, verbose_name="attempts"),
+                ),
+                (
+                    "next_attempt",
+                    models.DateTimeField(
+                        db_index=True,
+                        default=django.utils.timezone.now,
+                        verbose_name="next attempt",
+                    ),
+                ),
+                (
+                    "sent",
+                    models.DateTimeField(blank=True, null=True, verbose_name="sent"),
+                ),
+                ("last_error", models.TextField(blank=True, verbose_name="last error")),
+            ],
+            options={
+                "verbose_name": "Outbox e-mail",
+                "verbose_name_plural": "Outbox e-mails",
+                "ordering": ("pk",),
+            },
+        ),
+    ]
@@ -0,0 +1,88 @@
+import django.db.models.deletion
+import swapper
+from django.conf import settings
+from django.db import migrations, models
+
+
+def update_pricing_summaries(apps, schema_editor):
+    if swapper.is_swapped("plans", "Plan"):
+        return
+    Plan = apps.get_model("plans", "Plan")
+    PlanPricing = apps.get_model("plans", "PlanPricing")
+    plans = {}
+    pricings = PlanPricing.objects.order_by(
+        "plan_id", "order", "pricing__period", "pk"
+    ).values_list("plan_id", "pk", "price")
+    for plan_id, pricing_id, price in pricings:
+        plan = plans.get(plan_id)
+        if plan is None:
+            plans[plan_id] = Plan(
+                pk=plan_id,
+                pricing_count=1,
+                min_price=price,
+                first_plan_pricing_id=pricing_id,
+                first_price=price,
+            )
+        else:
+            plan.pricing_count += 1
+            plan.min_price = min(plan.min_price, price)
+    Plan.objects.bulk_update(
+        plans.values(),
+        ["pricing_count", "min_price", "first_plan_pricing", "first_price"],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plans", "0013_outboxemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plan",
+            name="pricing_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="pricing count"
+            ),
+        ),
+        migrations.AddField(
+            model_name="plan",
+            name="min_price",
+            field=models.DecimalField(
+                blank=True,
+                db_index=True,
+                decimal_places=2,
+                editable=False,
+                max_digits=7,
+                null=True,
+                verbose_name="lowest price",
+            ),
+        ),
+        migrations.AddField(
+            model_name="plan",
+            name="first_plan_pricing",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to=settings.PLANS_PLANPRICING_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="plan",
+            name="first_price",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                editable=False,
+                max_digits=7,
+                null=True,
+                verbose_name="first price",
+            ),
+        ),
+        migrations.RunPython(update_pricing_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+from decimal import Decimal
+
+import swapper
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, NullIf
+
+
+def update_total_gross(apps, schema_editor):
+    if swapper.is_swapped("plans", "Order"):
+        return
+
+    Order = apps.get_model("plans", "Order")
+    Plan = apps.get_model("plans", "Plan")
+    # Frozen copy of gross amount of plans.base.models.get_order_total_expressions()
+    decimal_field = models.DecimalField(max_digits=12, decimal_places=2)
+    price_per_student = models.Subquery(
+        Plan.objects.filter(pk=models.OuterRef("plan_id")).values("price_per_student")[
+            :1
+        ]
+    )
+    net = models.ExpressionWrapper(
+        models.F("amount")
+        * Coalesce(NullIf("branches_number", models.Value(0)), models.Value(1))
+        + Coalesce(price_per_student * models.F("students_number"), models.Value(0))
+        + Coalesce("first_time_fees", models.Value(0)),
+        output_field=decimal_field,
+    )
+    net = models.Case(
+        models.When(pricing__isnull=True, then=models.F("amount")),
+        default=net,
+        output_field=decimal_field,
+    )
+    gross = models.Case(
+        models.When(tax__isnull=True, then=net),
+        default=models.Func(
+            net * (models.F("tax") + models.Value(100)) * models.Value(Decimal("0.01")),
+            models.Value(2),
+            function="ROUND",
+            output_field=decimal_field,
+        ),
+        output_field=decimal_field,
+    )
+    Order.objects.update(total_gross=gross)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plans", "0014_plan_pricing_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="total_gross",
+            field=models.DecimalField(
+                blank=True,
+                db_index=True,
+                decimal_places=2,
+                editable=False,
+                max_digits=12,
+                null=True,
+                verbose_name="total gross",
+            ),
+        ),
+        migrations.RunPython(update_total_gross, migrations.RunPython.noop),
+    ]
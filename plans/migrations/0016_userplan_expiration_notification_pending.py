@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plans", "0015_order_total_gross"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userplan",
+            name="expiration_notification_pending",
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,194 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import router, transaction
+from django.template import Context, Template
+from django.template.base import render_value_in_context, tag_re
+from django.template.defaultfilters import date as date_filter
+from django.utils.timezone import template_localtime
+from sequences import get_last_value
+
+DEFAULT_INVOICE_NUMBER_FORMAT = (
+    "{{ invoice.number }}/"
+    "{% if invoice.type == invoice.INVOICE_TYPES.PROFORMA %}PF{% else %}FV{% endif %}"
+    "/{{ invoice.issued|date:'m/Y' }}"
+)
+
+variable_re = re.compile(
+    r"^invoice\.(?P<attr>[a-z_][a-z0-9_]*)"
+    r"""(?:\|date:(?:'(?P<fmt1>[^']*)'|"(?P<fmt2>[^"]*)"))?$"""
+)
+# Primary key is assigned by the database on INSERT
+primary_key_re = re.compile(r"\binvoice\.(?:id|pk)\b")
+proforma_re = re.compile(
+    r"^if\s+invoice\.type\s*==\s*invoice\.INVOICE_TYPES\.PROFORMA$"
+)
+
+
+def get_invoice_number_format():
+    return getattr(
+        settings, "PLANS_INVOICE_NUMBER_FORMAT", DEFAULT_INVOICE_NUMBER_FORMAT
+    )
+
+
+class InvoiceNumberFormatter(object):
+    """
+    Renders invoice full number from ``PLANS_INVOICE_NUMBER_FORMAT``.
+
+    The format is compiled once. Formats made only of plain text, ``{{ invoice.<attribute> }}``
+    and ``{{ invoice.<attribute>|date:'<format>' }}`` variables and the proforma condition of
+    the default format are rendered by plain Python code with the same result as the template
+    engine. Any other format is rendered as a Django template.
+
+    ``uses_primary_key`` is set if the format refers to ``invoice.id`` or ``invoice.pk``, such
+    invoices get their full number after they are inserted.
+    """
+
+    def __init__(self, format, fast=True):
+        self.format = format
+        self.context = Context(autoescape=True)
+        self.parts = self.compile(format) if fast else None
+        self.template = Template(format) if self.parts is None else None
+        self.uses_primary_key = bool(primary_key_re.search(format))
+
+    @property
+    def is_fast(self):
+        return self.parts is not None
+
+    def __call__(self, invoice):
+        if self.parts is None:
+            return self.template.render(Context({"invoice": invoice}))
+        return "".join(
+            part if isinstance(part, str) else part(invoice) for part in self.parts
+        )
+
+    def compile(self, format):
+        """
+        Returns list of text parts and callables rendering the format,
+        or ``None`` if the format is not supported by fast path.
+        """
+        parts = []
+        tokens = [token for token in tag_re.split(format) if token]
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token.startswith("{{"):
+                part = self.compile_variable(token[2:-2].strip())
+            elif token.startswith("{%"):
+                # Only "{% if proforma %}A{% else %}B{% endif %}" with plain text branches
+                branches = tokens[i : i + 5]
+                if (
+                    len(branches) == 5
+                    and proforma_re.match(token[2:-2].strip())
+                    and self.is_text(branches[1])
+                    and branches[2].replace(" ", "") == "{%else%}"
+                    and self.is_text(branches[3])
+                    and branches[4].replace(" ", "") == "{%endif%}"
+                ):
+                    part = self.proforma_part(branches[1], branches[3])
+                    i += 4
+                else:
+                    part = None
+            elif self.is_text(token):
+                part = token
+            else:
+                part = None
+            if part is None:
+                return None
+            parts.append(part)
+            i += 1
+        return parts
+
+    @staticmethod
+    def is_text(token):
+        return not tag_re.match(token) and "{" not in token and "}" not in token
+
+    def compile_variable(self, expression):
+        match = variable_re.match(expression)
+        if match is None:
+            return None
+        attr = match.group("attr")
+        date_format = match.group("fmt1")
+        if date_format is None:
+            date_format = match.group("fmt2")
+        context = self.context
+
+        def render(invoice):
+            value = getattr(invoice, attr, "")
+            if callable(value):
+                # Same rules as template variable resolution
+                if getattr(value, "alters_data", False):
+                    value = ""
+                elif not getattr(value, "do_not_call_in_templates", False):
+                    value = value()
+            if date_format is not None:
+                # Template engine passes datetimes to date filter in current time zone
+                value = date_filter(template_localtime(value), date_format)
+            return render_value_in_context(value, context)
+
+        return render
+
+    @staticmethod
+    def proforma_part(proforma_text, other_text):
+        def render(invoice):
+            if invoice.type == invoice.INVOICE_TYPES.PROFORMA:
+                return proforma_text
+            return other_text
+
+        return render
+
+
+@lru_cache(maxsize=16)
+def _get_formatter(format, fast):
+    return InvoiceNumberFormatter(format, fast)
+
+
+def get_invoice_number_formatter():
+    """
+    Returns formatter for current ``PLANS_INVOICE_NUMBER_FORMAT``, compiled formatters are cached per format.
+    Fast path can be disabled by ``PLANS_INVOICE_NUMBER_FAST_FORMAT = False``.
+    """
+    return _get_formatter(
+        get_invoice_number_format(),
+        getattr(settings, "PLANS_INVOICE_NUMBER_FAST_FORMAT", True),
+    )
+
+
+# Names of invoice numbering sequences known to exist in DB.
+# Sequence name contains invoice type and counter reset period, e.g. "invoice_numbers_1_2_2024_5".
+_existing_sequences = set()
+
+
+def sequence_exists(sequence_name):
+    """
+    Returns ``True`` if invoice numbering sequence already exists, so its initial value
+    doesn't need to be computed. Known sequences are cached in process memory and
+    the check costs at most one primary key lookup.
+    """
+    if sequence_name in _existing_sequences:
+        return True
+    if get_last_value(sequence_name) is None:
+        return False
+    mark_sequence_existing(sequence_name)
+    return True
+
+
+def mark_sequence_existing(sequence_name):
+    """
+    Caches that the sequence exists once the current transaction is committed,
+    sequences created by rolled back transactions are never cached.
+    """
+    from sequences.models import Sequence
+
+    transaction.on_commit(
+        lambda: _existing_sequences.add(sequence_name),
+        using=router.db_for_write(Sequence),
+    )
+
+
+def clear_sequence_cache():
+    """
+    Forgets cached sequences, call it after deleting sequences from DB.
+    """
+    _existing_sequences.clear()
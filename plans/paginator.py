@@ -0,0 +1,82 @@
+import json
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def get_estimated_count_threshold():
+    """
+    Returns number of rows above which estimated count is used, ``None`` if it is disabled.
+    """
+    return getattr(settings, "PLANS_ADMIN_ESTIMATED_COUNT_THRESHOLD", None)
+
+
+def get_estimated_count(queryset):
+    """
+    Returns number of rows of the queryset estimated without counting them,
+    or ``None`` if the database can't estimate it.
+
+    PostgreSQL returns the row estimate of the query planner. SQLite has no planner estimate,
+    so the highest row id of the table is used for queryset without filters; it is higher than
+    the real count once rows were deleted.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    if connection.vendor == "sqlite" and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT MAX(_rowid_) FROM %s"
+                % connection.ops.quote_name(queryset.model._meta.db_table)
+            )
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator which doesn't count rows of large querysets.
+    If the estimated count is above ``threshold``, it is used as ``count`` and ``estimated`` is set,
+    otherwise rows are counted as usual.
+
+    Estimate can be higher than the real count, last pages are then empty instead of raising ``EmptyPage``.
+    It can also be lower (e.g. outdated table statistics), so a page past the estimated number of pages
+    makes the paginator count rows exactly instead of raising ``EmptyPage``.
+    """
+
+    def __init__(self, *args, threshold=None, **kwargs):
+        super(EstimatedCountPaginator, self).__init__(*args, **kwargs)
+        if threshold is None:
+            threshold = get_estimated_count_threshold()
+        self.threshold = threshold
+        self.estimated = False
+
+    @cached_property
+    def count(self):
+        if self.threshold is not None and hasattr(self.object_list, "query"):
+            estimate = get_estimated_count(self.object_list)
+            if estimate is not None and estimate > self.threshold:
+                self.estimated = True
+                return estimate
+        return super(EstimatedCountPaginator, self).count
+
+    def validate_number(self, number):
+        try:
+            return super(EstimatedCountPaginator, self).validate_number(number)
+        except EmptyPage:
+            if not self.estimated:
+                raise
+        # Real count can be higher than the estimate
+        self.threshold = None
+        self.estimated = False
+        for name in ("count", "num_pages"):
+            self.__dict__.pop(name, None)
+        return super(EstimatedCountPaginator, self).validate_number(number)
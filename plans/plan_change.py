@@ -1,33 +1,38 @@
 # coding=utf-8
 from decimal import Decimal
 from django.conf import settings
+from plans.base.models import AbstractPlanPricing
 from plans.importer import import_name
 
+PlanPricing = AbstractPlanPricing.get_concrete_model()
+
 
 class PlanChangePolicy(object):
-    def _calculate_day_cost(self, userplan, plan, period):
+    def _calculate_day_cost(self, userplan, plan, period, plan_pricings=None):
         """
-        Finds most fitted plan pricing for a given period, and calculate day cost
+        Finds most fitted plan pricing for a given period, and calculate day cost.
+        Price is multiplied by branches and students of ``userplan`` unless it is ``None``.
+        ``plan_pricings`` are pricings of the plan ordered by descending period, they are queried if not given.
         """
         if plan.is_free():
             # If plan is free then cost is always 0
             return 0
 
-        plan_pricings = plan.planpricing_set.order_by(
-            "-pricing__period"
-        ).select_related("pricing")
+        if plan_pricings is None:
+            plan_pricings = plan.planpricing_set.order_by(
+                "-pricing__period"
+            ).select_related("pricing")
         selected_pricing = None
         for plan_pricing in plan_pricings:
             selected_pricing = plan_pricing
             if plan_pricing.pricing.period <= period:
                 break
         if selected_pricing:
-            price = selected_pricing.price * userplan.branches
-            if plan.plan_for == "schools":
+            branches = userplan.branches if userplan is not None else 1
+            price = selected_pricing.price * branches
+            if plan.plan_for == "schools" and userplan is not None:
                 price = price + plan.price_per_student * userplan.students
-            return (price / selected_pricing.pricing.period).quantize(
-                Decimal("1.00")
-            )
+            return (price / selected_pricing.pricing.period).quantize(Decimal("1.00"))
         raise ValueError("Plan %s has no pricings." % plan)
 
     def _calculate_final_price(self, period, day_cost_diff):
@@ -36,22 +41,70 @@ class PlanChangePolicy(object):
         else:
             return period * day_cost_diff
 
+    def _calculate_change_price(self, plan_old_day_cost, plan_new_day_cost, period):
+        if plan_new_day_cost <= plan_old_day_cost:
+            return self._calculate_final_price(period, None)
+        else:
+            return self._calculate_final_price(
+                period, plan_new_day_cost - plan_old_day_cost
+            )
+
     def get_change_price(self, userplan, plan_old, plan_new, period):
         """
         Calculates total price of plan change. Returns None if no payment is required.
+        ``userplan`` can be ``None`` to get the price for a single branch.
         """
         if period is None or period < 1:
             return None
 
         plan_old_day_cost = self._calculate_day_cost(userplan, plan_old, period)
         plan_new_day_cost = self._calculate_day_cost(userplan, plan_new, period)
+        return self._calculate_change_price(
+            plan_old_day_cost, plan_new_day_cost, period
+        )
 
-        if plan_new_day_cost <= plan_old_day_cost:
-            return self._calculate_final_price(period, None)
-        else:
-            return self._calculate_final_price(
-                period, plan_new_day_cost - plan_old_day_cost
+    def get_change_prices(self, userplan, plans, period):
+        """
+        Calculates prices of changing ``userplan`` to each of ``plans``, returns dict
+        ``{plan.pk: price}`` with the same values as ``get_change_price()``. Pricings of all plans
+        are loaded by single query.
+
+        If a subclass overrides only ``get_change_price()``, it is called for every plan instead.
+        """
+        plans = list(plans)
+        if period is None or period < 1:
+            return {plan.pk: None for plan in plans}
+        if type(self).get_change_price is not PlanChangePolicy.get_change_price:
+            return {
+                plan.pk: self.get_change_price(userplan, userplan.plan, plan, period)
+                for plan in plans
+            }
+
+        plan_old = userplan.plan
+        plan_ids = {plan.pk for plan in plans if not plan.is_free()}
+        if not plan_old.is_free():
+            plan_ids.add(plan_old.pk)
+        pricings = {plan_id: [] for plan_id in plan_ids}
+        if plan_ids:
+            for plan_pricing in (
+                PlanPricing.objects.filter(plan_id__in=plan_ids)
+                .select_related(None)
+                .select_related("pricing")
+                .order_by("-pricing__period")
+            ):
+                pricings[plan_pricing.plan_id].append(plan_pricing)
+
+        plan_old_day_cost = self._calculate_day_cost(
+            userplan, plan_old, period, pricings.get(plan_old.pk)
+        )
+        return {
+            plan.pk: self._calculate_change_price(
+                plan_old_day_cost,
+                self._calculate_day_cost(userplan, plan, period, pricings.get(plan.pk)),
+                period,
             )
+            for plan in plans
+        }
 
 
 class StandardPlanChangePolicy(PlanChangePolicy):
@@ -91,9 +144,7 @@ class StandardPlanChangePolicy(PlanChangePolicy):
     def _calculate_final_price(self, period, day_cost_diff):
         if day_cost_diff is None:
             return self.DOWNGRADE_CHARGE
-        cost = (
-            period * day_cost_diff 
-        ).quantize(Decimal("1.00"))
+        cost = (period * day_cost_diff).quantize(Decimal("1.00"))
         if cost is None or cost < self.FREE_UPGRADE:
             return None
         else:
@@ -109,13 +160,20 @@ def get_policy():
     return import_name(policy_class)()
 
 
+def get_change_period(userplan):
+    if userplan.expire is not None:
+        return userplan.days_left()
+    # Use the default period of the new plan
+    return 30
+
+
 def get_change_price(userplan, plan):
-    policy = get_policy()
+    return get_change_prices(userplan, [plan])[plan.pk]
 
-    if userplan.expire is not None:
-        period = userplan.days_left()
-    else:
-        # Use the default period of the new plan
-        period = 30
 
-    return policy.get_change_price(userplan.plan, plan, period)
+def get_change_prices(userplan, plans):
+    """
+    Returns dict ``{plan.pk: price}`` of changing ``userplan`` to each of ``plans``
+    by the current plan change policy.
+    """
+    return get_policy().get_change_prices(userplan, plans, get_change_period(userplan))
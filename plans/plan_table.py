@@ -0,0 +1,49 @@
+from django.utils.translation import get_language
+
+from plans.base.models import AbstractPlanQuota
+from plans.cache import plan_table_cache
+
+PlanQuota = AbstractPlanQuota.get_concrete_model()
+
+
+def build_plan_table(plan_list):
+    """
+    Returns quota by plan matrix of ``plan_list``::
+
+        [
+            [Quota1, [Plan1Quota1, Plan2Quota1, ... , PlanNQuota1]],
+            ...
+            [QuotaM, [Plan1QuotaM, Plan2QuotaM, ... , PlanNQuotaM]],
+        ]
+
+    Rows are all quotas used by any of the plans in quota order, ``None`` is used when the plan
+    doesn't have the quota. The matrix is built from a single ``PlanQuota`` query.
+    """
+    plan_ids = [plan.pk for plan in plan_list]
+    columns = {plan_id: i for i, plan_id in enumerate(plan_ids)}
+    rows = {}
+    table = []
+    plan_quotas = (
+        PlanQuota.objects.filter(plan_id__in=plan_ids)
+        .select_related(None)
+        .select_related("quota")
+        .order_by("quota__order", "quota_id")
+    )
+    for plan_quota in plan_quotas:
+        row = rows.get(plan_quota.quota_id)
+        if row is None:
+            row = [plan_quota.quota, [None] * len(plan_ids)]
+            rows[plan_quota.quota_id] = row
+            table.append(row)
+        row[1][columns[plan_quota.plan_id]] = plan_quota
+    return table
+
+
+def get_plan_table(plan_list):
+    """
+    Returns ``build_plan_table(plan_list)``, cached per set of plans and language
+    when ``PLANS_PLAN_TABLE_CACHE`` is enabled.
+    """
+    plan_list = list(plan_list)
+    key = "%s_%s" % (get_language(), "-".join(str(plan.pk) for plan in plan_list))
+    return plan_table_cache.get(key, lambda: build_plan_table(plan_list))
@@ -0,0 +1,216 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connections
+
+from plans.signals import account_automatic_renewal
+
+logger = logging.getLogger("plans.renewal")
+
+
+def get_provider_value(value, provider, default):
+    """
+    Resolves per provider option. The option can be a single value used for all providers
+    or a dict mapping provider names to values, with optional ``"default"`` key.
+    """
+    if isinstance(value, dict):
+        return value.get(provider, value.get("default", default))
+    return value
+
+
+class RenewalResult(object):
+    """
+    Outcome of renewal of one account.
+    """
+
+    def __init__(self, user, provider, error=None):
+        self.user = user
+        self.provider = provider
+        self.error = error
+
+    @property
+    def success(self):
+        return self.error is None
+
+    def __repr__(self):
+        state = "ok" if self.success else f"failed: {self.error!r}"
+        return f"<RenewalResult {self.provider} user={self.user.pk} {state}>"
+
+
+class RateLimiter(object):
+    """
+    Spaces calls evenly so at most ``rate`` calls are started per second.
+    ``rate`` of ``None`` or ``0`` means no limit.
+    """
+
+    def __init__(self, rate=None, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / rate if rate else 0
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.next_slot = None
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            current = self.clock()
+            slot = current if self.next_slot is None else max(current, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > current:
+            self.sleep(slot - current)
+
+
+def is_concurrent(concurrency):
+    """
+    Returns whether ``concurrency`` option (single value or dict by provider) asks for concurrent renewal.
+    ``0`` (or a dict with all values ``0``) means accounts are renewed one after another.
+    """
+    if isinstance(concurrency, dict):
+        return any(concurrency.values())
+    return bool(concurrency)
+
+
+class ProviderPool(object):
+    """
+    Worker threads renewing accounts of one payment provider.
+    At most ``concurrency`` renewals run at once. Accounts wait in the provider's own queue, so a slow
+    provider doesn't hold renewals of the others. With ``max_pending`` at most that many submitted
+    accounts wait for renewal by this provider, ``submit()`` blocks when the limit is reached.
+    Every worker thread closes its database connections once it is stopped.
+    """
+
+    def __init__(self, provider, concurrency, rate=None, max_pending=None):
+        self.provider = provider
+        self.concurrency = concurrency
+        self.queue = queue.SimpleQueue()
+        self.rate_limiter = RateLimiter(rate)
+        self.pending = threading.BoundedSemaphore(max_pending) if max_pending else None
+        self.threads = [
+            threading.Thread(
+                target=self.work, name=f"plans-renewal-{provider}-{i}", daemon=True
+            )
+            for i in range(concurrency)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, user):
+        if self.pending is not None:
+            self.pending.acquire()
+        future = Future()
+        self.queue.put((user, future))
+        return future
+
+    def work(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                user, future = item
+                try:
+                    future.set_result(self.renew(user))
+                except BaseException as e:
+                    future.set_exception(e)
+                finally:
+                    if self.pending is not None:
+                        self.pending.release()
+        finally:
+            # Worker threads open their own database connections
+            connections.close_all()
+
+    def renew(self, user):
+        self.rate_limiter.wait()
+        error = None
+        for receiver, response in account_automatic_renewal.send_robust(
+            sender=None, user=user
+        ):
+            if isinstance(response, Exception):
+                logger.warning(
+                    f"Renewal of account {user.pk} ({self.provider}) failed: {response!r}"
+                )
+                error = error or response
+        return RenewalResult(user, self.provider, error)
+
+    def shutdown(self):
+        for thread in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class RenewalDispatcher(object):
+    """
+    Sends ``account_automatic_renewal`` signal concurrently.
+
+    Accounts are partitioned by ``recurring.payment_provider`` and every provider gets its own
+    queue and worker threads, so a slow provider doesn't hold renewals of the others. ``concurrency``
+    (number of worker threads, at least one) and ``rate_limit`` (renewals started per second) are either
+    single values used for all providers or dicts keyed by provider name; they default to
+    ``PLANS_AUTORENEW_CONCURRENCY`` and ``PLANS_AUTORENEW_RATE_LIMIT`` settings.
+    At most ``max_pending`` (single value or dict keyed by provider name) submitted accounts wait for
+    renewal by each provider, so all accounts are not buffered in memory. ``submit()`` blocks only
+    when the provider of the submitted account reaches the limit; accounts already queued for the
+    other providers are renewed meanwhile.
+
+    Signal is sent by ``send_robust``, exception raised by a receiver marks the renewal as failed
+    and doesn't stop renewal of other accounts.
+
+    Usage::
+
+        with RenewalDispatcher() as dispatcher:
+            for user in users:
+                dispatcher.submit(user)
+        results = dispatcher.results
+    """
+
+    def __init__(self, concurrency=None, rate_limit=None, max_pending=1000):
+        if concurrency is None:
+            concurrency = getattr(settings, "PLANS_AUTORENEW_CONCURRENCY", 0)
+        if rate_limit is None:
+            rate_limit = getattr(settings, "PLANS_AUTORENEW_RATE_LIMIT", None)
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.max_pending = max_pending
+        self.pools = {}
+        self.futures = []
+        self.results = []
+
+    def get_pool(self, provider):
+        pool = self.pools.get(provider)
+        if pool is None:
+            concurrency = get_provider_value(self.concurrency, provider, 0)
+            rate = get_provider_value(self.rate_limit, provider, None)
+            max_pending = get_provider_value(self.max_pending, provider, 1000)
+            pool = ProviderPool(
+                provider, max(concurrency or 1, 1), rate, max_pending=max_pending
+            )
+            self.pools[provider] = pool
+        return pool
+
+    def submit(self, user):
+        provider = user.userplan.recurring.payment_provider
+        pool = self.get_pool(provider)
+        self.futures.append(pool.submit(user))
+
+    def wait(self):
+        """
+        Waits for all submitted renewals and returns list of ``RenewalResult`` in submission order.
+        """
+        for pool in self.pools.values():
+            pool.shutdown()
+        self.pools = {}
+        self.results.extend(future.result() for future in self.futures)
+        self.futures = []
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wait()
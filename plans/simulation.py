@@ -0,0 +1,248 @@
+import csv
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Count, Q
+
+from plans.base.models import AbstractPlan, AbstractPlanPricing, AbstractUserPlan
+
+Plan = AbstractPlan.get_concrete_model()
+PlanPricing = AbstractPlanPricing.get_concrete_model()
+UserPlan = AbstractUserPlan.get_concrete_model()
+
+CSV_HEADER = [
+    "plan_id",
+    "plan",
+    "subscriptions",
+    "expiring_subscriptions",
+    "recurring_subscriptions",
+    "renewal_old",
+    "renewal_new",
+    "renewal_diff",
+    "remaining_old",
+    "remaining_new",
+    "remaining_diff",
+]
+
+
+class PlanImpact(object):
+    """
+    Impact of price change on active subscriptions of one plan.
+
+    ``renewal_*`` are sums of gross totals of the next renewal orders, ``remaining_*`` are sums of values
+    of remaining days of subscriptions with expiration (the same day cost as used for plan change price).
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.subscriptions = 0
+        self.expiring_subscriptions = 0
+        self.recurring_subscriptions = 0
+        self.renewal_old = Decimal(0)
+        self.renewal_new = Decimal(0)
+        self.remaining_old = Decimal(0)
+        self.remaining_new = Decimal(0)
+
+    @property
+    def renewal_diff(self):
+        return self.renewal_new - self.renewal_old
+
+    @property
+    def remaining_diff(self):
+        return self.remaining_new - self.remaining_old
+
+    def as_row(self):
+        return [
+            self.plan.pk,
+            self.plan.name,
+            self.subscriptions,
+            self.expiring_subscriptions,
+            self.recurring_subscriptions,
+            self.renewal_old,
+            self.renewal_new,
+            self.renewal_diff,
+            self.remaining_old,
+            self.remaining_new,
+            self.remaining_diff,
+        ]
+
+
+class PriceChangeSimulation(object):
+    """
+    Simulates impact of changes of ``PlanPricing.price`` and ``Plan.price_per_student`` on all
+    active subscriptions, nothing is saved.
+
+    :param pricing_prices: dict of new prices by ``PlanPricing`` id
+    :param prices_per_student: dict of new ``price_per_student`` by ``Plan`` id
+
+    Subscriptions are not processed one by one: they are grouped by database into groups with the same
+    plan, expiration, branches, students and recurring pricing, so every amount is computed once per group
+    with the same rounding as ``PlanChangePolicy._calculate_day_cost()`` and multiplied by group size.
+    """
+
+    def __init__(
+        self, pricing_prices=None, prices_per_student=None, today=None, userplans=None
+    ):
+        self.pricing_prices = {
+            int(pk): Decimal(price) for pk, price in (pricing_prices or {}).items()
+        }
+        self.prices_per_student = {
+            int(pk): Decimal(price) for pk, price in (prices_per_student or {}).items()
+        }
+        self.today = today or date.today()
+        if userplans is None:
+            userplans = UserPlan.objects.all()
+        self.userplans = userplans
+
+    def get_groups(self):
+        """
+        Returns groups of active subscriptions ordered by plan.
+        """
+        return (
+            self.userplans.filter(
+                Q(expire__isnull=True) | Q(expire__gte=self.today), active=True
+            )
+            .values(
+                "plan_id",
+                "expire",
+                "branches",
+                "students",
+                "recurring__pricing_id",
+                "recurring__amount",
+                "recurring__tax",
+                "recurring__branches_number",
+                "recurring__students_number",
+            )
+            .annotate(count=Count("pk"))
+            .order_by("plan_id", "expire", "branches", "students")
+        )
+
+    def load_catalog(self, plan_ids):
+        plans = {plan.pk: plan for plan in Plan.objects.filter(pk__in=plan_ids)}
+        pricings = {plan_id: [] for plan_id in plans}
+        for pk, plan_id, pricing_id, period, price in (
+            PlanPricing.objects.filter(plan_id__in=plan_ids)
+            .order_by("-pricing__period")
+            .values_list("pk", "plan_id", "pricing_id", "pricing__period", "price")
+        ):
+            pricings[plan_id].append(
+                (pricing_id, period, price, self.pricing_prices.get(pk, price))
+            )
+        return plans, pricings
+
+    @staticmethod
+    def get_amount(plan, price, price_per_student, branches, students):
+        amount = price * branches
+        if plan.plan_for == "schools":
+            amount = amount + price_per_student * students
+        return amount
+
+    @staticmethod
+    def get_renewal_amount(amount, price_per_student, branches, students, tax):
+        """
+        Returns gross total of renewal order like ``Order.total()`` of order created by
+        ``RecurringUserPlan.create_renew_order()``.
+        """
+        if branches:
+            amount = amount * branches
+        if students:
+            amount = amount + price_per_student * students
+        if tax is not None:
+            amount = (amount * (tax + 100) / 100).quantize(Decimal("1.00"))
+        return amount
+
+    def get_day_costs(self, plan, pricings, days, branches, students):
+        """
+        Returns old and new day cost like ``PlanChangePolicy._calculate_day_cost()``.
+        """
+        if not pricings:
+            return Decimal(0), Decimal(0)
+        selected = pricings[-1]
+        for pricing in pricings:
+            if pricing[1] <= days:
+                selected = pricing
+                break
+        pricing_id, period, old_price, new_price = selected
+        pps_old = plan.price_per_student
+        pps_new = self.prices_per_student.get(plan.pk, pps_old)
+        return tuple(
+            (self.get_amount(plan, price, pps, branches, students) / period).quantize(
+                Decimal("1.00")
+            )
+            for price, pps in ((old_price, pps_old), (new_price, pps_new))
+        )
+
+    def __iter__(self):
+        """
+        Yields ``PlanImpact`` of every plan with active subscriptions, ordered by plan id.
+        """
+        groups = list(self.get_groups())
+        plans, pricings = self.load_catalog({group["plan_id"] for group in groups})
+        impact = None
+        for group in groups:
+            plan = plans[group["plan_id"]]
+            if impact is None or impact.plan.pk != plan.pk:
+                if impact is not None:
+                    yield impact
+                impact = PlanImpact(plan)
+            self.add_group(impact, pricings[plan.pk], group)
+        if impact is not None:
+            yield impact
+
+    def add_group(self, impact, pricings, group):
+        plan = impact.plan
+        count = group["count"]
+        branches = group["branches"]
+        students = group["students"]
+        impact.subscriptions += count
+
+        recurring_amount = group["recurring__amount"]
+        if recurring_amount is not None:
+            # Renewal charges amount and quantities of the recurring payment,
+            # new catalog price replaces the amount only if the price is changed
+            amount_new = recurring_amount
+            for pricing_id, period, old_price, new_price in pricings:
+                if pricing_id == group["recurring__pricing_id"]:
+                    if new_price != old_price:
+                        amount_new = new_price
+                    break
+            pps_old = plan.price_per_student
+            pps_new = self.prices_per_student.get(plan.pk, pps_old)
+            renewal = (
+                group["recurring__branches_number"],
+                group["recurring__students_number"],
+                group["recurring__tax"],
+            )
+            impact.recurring_subscriptions += count
+            impact.renewal_old += count * self.get_renewal_amount(
+                recurring_amount, pps_old, *renewal
+            )
+            impact.renewal_new += count * self.get_renewal_amount(
+                amount_new, pps_new, *renewal
+            )
+
+        if group["expire"] is not None:
+            days = (group["expire"] - self.today).days
+            impact.expiring_subscriptions += count
+            if days > 0:
+                day_cost_old, day_cost_new = self.get_day_costs(
+                    plan, pricings, days, branches, students
+                )
+                impact.remaining_old += count * days * day_cost_old
+                impact.remaining_new += count * days * day_cost_new
+
+
+class Echo(object):
+    def write(self, value):
+        return value
+
+
+def iter_simulation_csv(simulation):
+    """
+    Yields CSV lines of the simulation summary, header first.
+    Can be passed to ``StreamingHttpResponse``.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for impact in simulation:
+        yield writer.writerow(impact.as_row())
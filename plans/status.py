@@ -0,0 +1,269 @@
+import datetime
+from collections import namedtuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import router, transaction
+
+from plans.base.models import AbstractRecurringUserPlan, AbstractUserPlan
+from plans.cache import get_cache, get_cache_timeout
+
+UserPlan = AbstractUserPlan.get_concrete_model()
+RecurringUserPlan = AbstractRecurringUserPlan.get_concrete_model()
+
+
+def _to_date(value):
+    # Some code paths assign datetimes to date fields before saving
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+class UserPlanStatus(
+    namedtuple(
+        "UserPlanStatus",
+        [
+            "user_id",
+            "plan_id",
+            "expire",
+            "active",
+            "trial_start_date",
+            "trial_end_date",
+            "payment_provider",
+            "renewal_triggered_by",
+            "token_verified",
+        ],
+    )
+):
+    """
+    Status of user plan stored in the shared cache.
+    Recurring fields are ``None`` when the plan has no recurring payment.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_userplan(cls, userplan, recurring=None):
+        return cls(
+            userplan.user_id,
+            userplan.plan_id,
+            _to_date(userplan.expire),
+            userplan.active,
+            _to_date(userplan.trial_start_date),
+            _to_date(userplan.trial_end_date),
+            recurring.payment_provider if recurring else None,
+            recurring.renewal_triggered_by if recurring else None,
+            recurring.token_verified if recurring else None,
+        )
+
+    def is_expired(self, today=None):
+        if self.expire is None:
+            return False
+        return self.expire < (today or datetime.date.today())
+
+    def is_active(self):
+        return self.active
+
+    def is_trial(self, today=None):
+        if self.trial_start_date is None or self.trial_end_date is None:
+            return False
+        return (
+            self.trial_start_date
+            <= (today or datetime.date.today())
+            <= self.trial_end_date
+        )
+
+    def days_left(self, today=None):
+        if self.expire is None:
+            return None
+        return (self.expire - (today or datetime.date.today())).days
+
+    def has_automatic_renewal(self):
+        return (
+            self.renewal_triggered_by is not None
+            and self.renewal_triggered_by != RecurringUserPlan.RENEWAL_TRIGGERED_BY.USER
+            and bool(self.token_verified)
+        )
+
+
+class UserPlanStatusCache(object):
+    """
+    Status of user plans (plan, expiration, active flag, trial window and recurring payment flags)
+    shared by all processes in the Django cache and keyed by user id.
+
+    Every user has a version token in cache, statuses are cached together with the version read
+    before the status was loaded from the database and only statuses with the current version are
+    used. The version is replaced on every save of ``UserPlan`` or ``RecurringUserPlan`` (including
+    ``activate()``, ``deactivate()``, ``extend_account()`` and ``expire_account()``) and by bulk
+    account expiration once the transaction is committed. A status loaded before the commit is thus
+    never used afterwards, even if it is written to cache after the commit. Reading a cached status
+    doesn't touch the database.
+
+    Caching is enabled by ``PLANS_STATUS_CACHE`` setting.
+    """
+
+    @property
+    def enabled(self):
+        return getattr(settings, "PLANS_STATUS_CACHE", False)
+
+    def get_timeout(self):
+        return getattr(settings, "PLANS_STATUS_CACHE_TIMEOUT", get_cache_timeout())
+
+    def make_key(self, user_id):
+        return "plans_status_%s" % user_id
+
+    def make_version_key(self, user_id):
+        return "plans_status_version_%s" % user_id
+
+    def get_versions(self, user_ids, cached=None):
+        """
+        Returns dict of current version tokens by user id, missing versions are created.
+        ``cached`` are values already read from cache.
+        """
+        cache = get_cache()
+        if cached is None:
+            cached = cache.get_many([self.make_version_key(pk) for pk in user_ids])
+        versions = {}
+        for user_id in user_ids:
+            key = self.make_version_key(user_id)
+            version = cached.get(key)
+            if version is None:
+                # Other process could store the token first
+                cache.add(key, uuid4().hex, self.get_timeout())
+                version = cache.get(key)
+            versions[user_id] = version
+        return versions
+
+    def get(self, user_id):
+        """
+        Returns ``UserPlanStatus`` of the user, loading it from the database on miss.
+        Returns ``None`` if the user has no user plan.
+        """
+        if not self.enabled:
+            return self.load([user_id]).get(user_id)
+        key = self.make_key(user_id)
+        cached = get_cache().get_many([self.make_version_key(user_id), key])
+        version = self.get_versions([user_id], cached)[user_id]
+        entry = cached.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        status = self.load([user_id]).get(user_id)
+        if status is not None:
+            self.set_many([status], {user_id: version})
+        return status
+
+    def load(self, user_ids=None, userplans=None):
+        """
+        Returns dict of statuses by user id loaded by single query.
+        """
+        if userplans is None:
+            userplans = UserPlan.objects.filter(user_id__in=user_ids)
+        return {
+            userplan.user_id: self.get_status(userplan)
+            for userplan in userplans.select_related("recurring")
+        }
+
+    @staticmethod
+    def get_status(userplan):
+        try:
+            recurring = userplan.recurring
+        except RecurringUserPlan.DoesNotExist:
+            recurring = None
+        return UserPlanStatus.from_userplan(userplan, recurring)
+
+    def set_many(self, statuses, versions):
+        """
+        Writes statuses with versions read before they were loaded.
+        """
+        get_cache().set_many(
+            {
+                self.make_key(status.user_id): (versions[status.user_id], status)
+                for status in statuses
+            },
+            self.get_timeout(),
+        )
+
+    def delete(self, user_id, using=None):
+        """
+        Replaces version of the user status after the transaction is committed.
+        """
+        self.delete_many([user_id], using=using)
+
+    def delete_many(self, user_ids, using=None):
+        if not self.enabled:
+            return
+        user_ids = list(user_ids)
+
+        def invalidate():
+            cache = get_cache()
+            cache.set_many(
+                {self.make_version_key(pk): uuid4().hex for pk in user_ids},
+                self.get_timeout(),
+            )
+            cache.delete_many([self.make_key(pk) for pk in user_ids])
+
+        transaction.on_commit(invalidate, using=using or router.db_for_write(UserPlan))
+
+    def iterate_user_ids(self, batch_size=1000):
+        """
+        Yields lists of user ids of all user plans in chunks of ``batch_size``.
+        """
+        last_pk = 0
+        while True:
+            rows = list(
+                UserPlan.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", "user_id")[:batch_size]
+            )
+            if not rows:
+                return
+            last_pk = rows[-1][0]
+            yield [user_id for pk, user_id in rows]
+
+    def warm(self, batch_size=1000):
+        """
+        Writes statuses of all user plans to cache, returns number of statuses.
+        """
+        count = 0
+        for user_ids in self.iterate_user_ids(batch_size):
+            # Versions are read first, statuses changed meanwhile are not used
+            versions = self.get_versions(user_ids)
+            statuses = self.load(user_ids).values()
+            self.set_many(statuses, versions)
+            count += len(statuses)
+        return count
+
+    def audit(self, batch_size=1000):
+        """
+        Compares cached statuses with the database.
+        Returns list of ``(database status, cached status)`` of cached statuses that differ.
+        Statuses not present in cache or with outdated version are not reported.
+        """
+        mismatches = []
+        cache = get_cache()
+        for user_ids in self.iterate_user_ids(batch_size):
+            cached = cache.get_many(
+                [self.make_key(pk) for pk in user_ids]
+                + [self.make_version_key(pk) for pk in user_ids]
+            )
+            statuses = self.load(user_ids)
+            for user_id in user_ids:
+                entry = cached.get(self.make_key(user_id))
+                status = statuses.get(user_id)
+                if (
+                    entry is not None
+                    and entry[0] == cached.get(self.make_version_key(user_id))
+                    and entry[1] != status
+                ):
+                    mismatches.append((status, entry[1]))
+        return mismatches
+
+
+status_cache = UserPlanStatusCache()
+
+
+def get_user_plan_status(user):
+    """
+    Returns ``UserPlanStatus`` of the user (or user id) or ``None`` if the user has no plan.
+    """
+    return status_cache.get(getattr(user, "pk", user))
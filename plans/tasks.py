@@ -1,13 +1,29 @@
 import datetime
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.mail import get_connection
+from django.db import connections, router, transaction
+from django.utils.timezone import now
 
-from .base.models import AbstractRecurringUserPlan
-from .signals import account_automatic_renewal
+from .base.models import (
+    AbstractBillingInfo,
+    AbstractRecurringUserPlan,
+    AbstractUserPlan,
+    OutboxEmail,
+)
+from .renewal import RenewalDispatcher, is_concurrent
+from .signals import account_automatic_renewal, account_deactivated
+from .status import status_cache
+from .taxation.eu import EUTaxationPolicy
+from .taxation.vies import VIES_ERRORS, normalize_tax_id, vies_cache
 
 User = get_user_model()
+UserPlan = AbstractUserPlan.get_concrete_model()
+BillingInfo = AbstractBillingInfo.get_concrete_model()
 logger = logging.getLogger("plans.tasks")
 
 
@@ -19,8 +35,39 @@ def get_active_plans():
     )
 
 
-def autorenew_account(providers=None):
-    logger.info("Started automatic account renewal")
+class RenewalSummary(object):
+    """
+    Lightweight result of ``autorenew_account``.
+    It is truthy when at least one account was submitted to renewal.
+    """
+
+    def __init__(self, count=0):
+        #: number of accounts matching renewal criteria (computed by separate ``COUNT`` query)
+        self.count = count
+        #: number of accounts ``account_automatic_renewal`` signal was sent for
+        self.submitted = 0
+        #: list of ``RenewalResult``, filled only by concurrent renewal
+        self.results = []
+
+    @property
+    def succeeded(self):
+        return [result for result in self.results if result.success]
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.success]
+
+    def __bool__(self):
+        return self.submitted > 0
+
+    def __len__(self):
+        return self.submitted
+
+    def __repr__(self):
+        return f"<RenewalSummary count={self.count} submitted={self.submitted}>"
+
+
+def get_accounts_for_renewal(providers=None):
     PLANS_AUTORENEW_BEFORE_DAYS = getattr(settings, "PLANS_AUTORENEW_BEFORE_DAYS", 0)
     PLANS_AUTORENEW_BEFORE_HOURS = getattr(settings, "PLANS_AUTORENEW_BEFORE_HOURS", 0)
 
@@ -37,23 +84,103 @@ def autorenew_account(providers=None):
         accounts_for_renewal = accounts_for_renewal.filter(
             userplan__recurring__payment_provider__in=providers
         )
+    return accounts_for_renewal
 
-    logger.info(f"{len(accounts_for_renewal)} accounts to be renewed.")
 
-    for user in accounts_for_renewal.all():
-        account_automatic_renewal.send(sender=None, user=user)
-    return accounts_for_renewal
+def iter_accounts_for_renewal(providers=None, batch_size=1000, limit=None):
+    """
+    Streams accounts for renewal using keyset pagination on user id.
+    Every page is a separate query, so accounts changed by renewal receivers meanwhile
+    are neither skipped nor repeated.
+    """
+    accounts = (
+        get_accounts_for_renewal(providers)
+        .select_related("userplan__recurring")
+        .order_by("pk")
+    )
+    last_pk = None
+    yielded = 0
+    while limit is None or yielded < limit:
+        page_size = batch_size if limit is None else min(batch_size, limit - yielded)
+        page = accounts if last_pk is None else accounts.filter(pk__gt=last_pk)
+        fetched = 0
+        for user in page[:page_size].iterator(chunk_size=page_size):
+            fetched += 1
+            last_pk = user.pk
+            yield user
+        yielded += fetched
+        if fetched < page_size:
+            break
 
 
-def expire_account():
-    logger.info("Started account expiration")
+def autorenew_account(
+    providers=None, batch_size=1000, limit=None, callback=None, concurrency=None
+):
+    """
+    Sends ``account_automatic_renewal`` signal for every account that should be renewed.
 
-    expired_accounts = get_active_plans().filter(
-        userplan__expire__lt=datetime.date.today()
+    :param providers: renew only accounts with these payment providers
+    :param batch_size: number of accounts fetched by one query
+    :param limit: maximal number of accounts to renew
+    :param callback: called with every user submitted to renewal
+    :param concurrency: number of concurrent renewals per payment provider,
+        defaults to ``settings.PLANS_AUTORENEW_CONCURRENCY``; ``0`` renews accounts one after another
+    :return: RenewalSummary
+    """
+    logger.info("Started automatic account renewal")
+
+    count = get_accounts_for_renewal(providers).count()
+    if limit is not None:
+        count = min(count, limit)
+    logger.info(f"{count} accounts to be renewed.")
+
+    summary = RenewalSummary(count)
+    if not count:
+        return summary
+
+    if concurrency is None:
+        concurrency = getattr(settings, "PLANS_AUTORENEW_CONCURRENCY", 0)
+    if not is_concurrent(concurrency):
+        for user in iter_accounts_for_renewal(providers, batch_size, limit):
+            account_automatic_renewal.send(sender=None, user=user)
+            summary.submitted += 1
+            if callback is not None:
+                callback(user)
+        return summary
+
+    dispatcher = RenewalDispatcher(concurrency=concurrency)
+    with dispatcher:
+        for user in iter_accounts_for_renewal(providers, batch_size, limit):
+            dispatcher.submit(user)
+            summary.submitted += 1
+            if callback is not None:
+                callback(user)
+    summary.results = dispatcher.results
+    failed = len(summary.failed)
+    logger.info(
+        f"{summary.submitted - failed} accounts renewed, {failed} renewals failed."
     )
+    return summary
+
 
-    for user in expired_accounts.all():
-        user.userplan.expire_account()
+def expire_account(bulk=False, batch_size=500):
+    """
+    Expires accounts and sends reminders about accounts that will expire soon.
+
+    :param bulk: deactivate expired accounts in chunks by ``expire_accounts_bulk()``
+    :param batch_size: size of the chunk in bulk mode
+    """
+    logger.info("Started account expiration")
+
+    if bulk:
+        expire_accounts_bulk(batch_size)
+    else:
+        expired_accounts = get_active_plans().filter(
+            userplan__expire__lt=datetime.date.today()
+        )
+
+        for user in expired_accounts.all():
+            user.userplan.expire_account()
 
     notifications_days_before = getattr(settings, "PLANS_EXPIRATION_REMIND", [])
 
@@ -66,3 +193,333 @@ def expire_account():
             userplan__active=True, userplan__expire__in=days
         ):
             user.userplan.remind_expire_soon()
+
+
+def deactivate_expired_userplans(today, batch_size, using):
+    """
+    Deactivates at most ``batch_size`` expired user plans and marks their expiration
+    notification as pending, returns list of their ids.
+    Uses single ``UPDATE ... RETURNING`` query where database supports it.
+    Should be called inside transaction.
+    """
+    connection = connections[using]
+    if (
+        connection.vendor in ("postgresql", "sqlite")
+        and connection.features.can_return_columns_from_insert
+    ):
+        opts = UserPlan._meta
+        qn = connection.ops.quote_name
+        table = qn(opts.db_table)
+        pk = qn(opts.pk.column)
+        active = qn(opts.get_field("active").column)
+        pending = qn(opts.get_field("expiration_notification_pending").column)
+        expire = qn(opts.get_field("expire").column)
+        updated_at = qn(opts.get_field("updated_at").column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {active} = %s, {pending} = %s, {updated_at} = %s "
+                f"WHERE {pk} IN ("
+                f"SELECT {pk} FROM {table} "
+                f"WHERE {active} = %s AND {expire} < %s "
+                f"ORDER BY {pk} LIMIT %s"
+                f") RETURNING {pk}",
+                [
+                    False,
+                    True,
+                    connection.ops.adapt_datetimefield_value(now()),
+                    True,
+                    connection.ops.adapt_datefield_value(today),
+                    batch_size,
+                ],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    ids = list(
+        UserPlan.objects.using(using)
+        .select_for_update()
+        .filter(active=True, expire__lt=today)
+        .order_by("pk")
+        .values_list("pk", flat=True)[:batch_size]
+    )
+    UserPlan.objects.using(using).filter(pk__in=ids).update(
+        active=False, expiration_notification_pending=True, updated_at=now()
+    )
+    return ids
+
+
+def notify_expired_userplans(userplans, using=None):
+    """
+    Sends ``account_deactivated`` signal, expiration e-mail and ``account_expired`` signal
+    for user plans deactivated by bulk expiration, then clears their pending notification.
+    """
+    for userplan in userplans:
+        account_deactivated.send(sender=userplan, user=userplan.user)
+        userplan.notify_expired()
+        UserPlan.objects.using(using).filter(pk=userplan.pk).update(
+            expiration_notification_pending=False
+        )
+
+
+def get_pending_expired_userplans(using=None):
+    return (
+        UserPlan.objects.using(using)
+        .filter(expiration_notification_pending=True)
+        .select_related("user", "plan")
+        .order_by("pk")
+    )
+
+
+def expire_accounts_bulk(batch_size=500):
+    """
+    Expires accounts in chunks of ``batch_size``.
+
+    Every chunk is deactivated by one query in its own transaction, which also marks expiration
+    notification of its user plans as pending. Once the chunk is committed, ``account_deactivated``
+    signal, expiration e-mail and ``account_expired`` signal are sent for every user plan and its
+    pending mark is cleared, so no notification is sent for a chunk which is rolled back and no row
+    locks are held while sending e-mails.
+
+    If the process dies, the unfinished chunk is rolled back and processed again by the next run,
+    which first notifies user plans of committed chunks still marked as pending. A user plan
+    notified right before the process died can be notified once more.
+
+    :return: number of expired accounts
+    """
+    using = router.db_for_write(UserPlan)
+    today = datetime.date.today()
+    while True:
+        userplans = list(get_pending_expired_userplans(using)[:batch_size])
+        if not userplans:
+            break
+        notify_expired_userplans(userplans, using)
+
+    total = 0
+    while True:
+        with transaction.atomic(using=using):
+            ids = deactivate_expired_userplans(today, batch_size, using)
+            if not ids:
+                break
+            userplans = list(get_pending_expired_userplans(using).filter(pk__in=ids))
+            # User plans were updated without save(), remove their statuses explicitly
+            status_cache.delete_many(
+                [userplan.user_id for userplan in userplans], using=using
+            )
+        notify_expired_userplans(userplans, using)
+        total += len(ids)
+        logger.info(f"{total} accounts expired")
+    return total
+
+
+def get_outbox_retry_delay(attempts):
+    """
+    Returns delay before next attempt to send outbox e-mail which failed ``attempts`` times.
+    Delay doubles with every attempt, starting at ``PLANS_EMAIL_OUTBOX_RETRY_DELAY`` seconds.
+    """
+    delay = getattr(settings, "PLANS_EMAIL_OUTBOX_RETRY_DELAY", 60)
+    return datetime.timedelta(seconds=delay * 2 ** (attempts - 1))
+
+
+def flush_email_outbox(batch_size=100, max_attempts=None):
+    """
+    Sends pending e-mails from the outbox.
+
+    Every batch of e-mails is sent over one SMTP connection. E-mail which couldn't be sent is
+    retried later with exponential backoff and marked as failed after ``max_attempts``
+    (``PLANS_EMAIL_OUTBOX_MAX_ATTEMPTS``) attempts. Rows of the batch are locked while sending
+    (skipping rows locked by other workers where supported), so concurrent workers don't send
+    the same e-mail twice.
+
+    :return: tuple of numbers of sent and failed e-mails
+    """
+    if max_attempts is None:
+        max_attempts = getattr(settings, "PLANS_EMAIL_OUTBOX_MAX_ATTEMPTS", 5)
+    using = router.db_for_write(OutboxEmail)
+    skip_locked = connections[using].features.has_select_for_update_skip_locked
+    sent_count = failed_count = 0
+    while True:
+        with transaction.atomic(using=using):
+            messages = list(
+                OutboxEmail.objects.using(using)
+                .select_for_update(skip_locked=skip_locked)
+                .filter(status=OutboxEmail.STATUS.PENDING, next_attempt__lte=now())
+                .order_by("pk")[:batch_size]
+            )
+            if not messages:
+                break
+            sent, failed = send_outbox_batch(messages, max_attempts, using)
+        sent_count += sent
+        failed_count += failed
+        if len(messages) < batch_size:
+            break
+    if sent_count or failed_count:
+        logger.info(
+            f"{sent_count} outbox e-mails sent, {failed_count} e-mails failed to send"
+        )
+    return sent_count, failed_count
+
+
+def send_outbox_batch(messages, max_attempts, using):
+    """
+    Sends outbox e-mails over one connection and stores the results.
+    """
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # Mail server is not available, whole batch is retried later
+        errors = {message.pk: e for message in messages}
+    else:
+        errors = {}
+        try:
+            for message in messages:
+                try:
+                    connection.send_messages([message.get_message(connection)])
+                except Exception as e:
+                    errors[message.pk] = e
+        finally:
+            connection.close()
+
+    current = now()
+    for message in messages:
+        error = errors.get(message.pk)
+        message.attempts += 1
+        if error is None:
+            message.status = OutboxEmail.STATUS.SENT
+            message.sent = current
+            message.last_error = ""
+            sent += 1
+        else:
+            message.last_error = repr(error)
+            if message.attempts >= max_attempts:
+                message.status = OutboxEmail.STATUS.FAILED
+                logger.error(
+                    f"Outbox e-mail {message.pk} failed after {message.attempts} attempts: {error!r}"
+                )
+            else:
+                message.next_attempt = current + get_outbox_retry_delay(
+                    message.attempts
+                )
+            failed += 1
+    OutboxEmail.objects.using(using).bulk_update(
+        messages, ["status", "attempts", "sent", "next_attempt", "last_error"]
+    )
+    return sent, failed
+
+
+class RevalidationStats(object):
+    """
+    Progress of ``revalidate_tax_numbers``.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.rows = 0
+        self.checked = 0
+        self.valid = 0
+        self.invalid = 0
+        self.errors = 0
+        self.last_pk = None
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self):
+        """
+        VAT IDs checked per second.
+        """
+        elapsed = self.elapsed
+        return self.checked / elapsed if elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.rows} billing infos, {self.checked} VAT IDs checked "
+            f"({self.valid} valid, {self.invalid} invalid, {self.errors} errors) "
+            f"in {self.elapsed:.1f}s, {self.throughput:.1f} VAT IDs/s"
+        )
+
+
+def _check_tax_number(tax_id):
+    try:
+        return vies_cache.refresh(tax_id)
+    except VIES_ERRORS as e:
+        logger.warning(f"TAX_ID={tax_id} VIES check failed: {e!r}")
+        return None
+    finally:
+        # Cache backend may use database connection
+        connections.close_all()
+
+
+def revalidate_tax_numbers(
+    chunk_size=500, concurrency=2, start_after=None, progress=None
+):
+    """
+    Checks EU VAT IDs of all billing infos in VIES and stores results in the VIES cache.
+
+    Billing infos are streamed in chunks ordered by primary key and every VAT ID is checked once.
+    VIES calls run concurrently, at most ``concurrency`` calls per member state at once.
+    After every chunk is finished ``progress(stats)`` is called, ``stats.last_pk`` can be
+    stored as a checkpoint and passed as ``start_after`` to resume the revalidation.
+
+    :return: RevalidationStats
+    """
+    stats = RevalidationStats()
+    seen = set()
+    executors = {}
+    billing_infos = (
+        BillingInfo.objects.exclude(tax_number="")
+        .order_by("pk")
+        .values_list("pk", "tax_number", "country")
+    )
+    try:
+        while True:
+            chunk = billing_infos
+            if start_after is not None:
+                chunk = chunk.filter(pk__gt=start_after)
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                break
+
+            futures = []
+            for pk, tax_number, country in chunk:
+                if not EUTaxationPolicy.is_in_EU(country):
+                    continue
+                tax_id = normalize_tax_id(
+                    BillingInfo.get_full_tax_number(tax_number, country)
+                )
+                if tax_id in seen:
+                    continue
+                seen.add(tax_id)
+                member_state = tax_id[:2]
+                if member_state not in executors:
+                    executors[member_state] = ThreadPoolExecutor(
+                        max_workers=concurrency,
+                        thread_name_prefix=f"plans-vies-{member_state}",
+                    )
+                futures.append(
+                    executors[member_state].submit(_check_tax_number, tax_id)
+                )
+
+            wait(futures)
+            for future in futures:
+                result = future.result()
+                stats.checked += 1
+                if result is None:
+                    stats.errors += 1
+                elif result:
+                    stats.valid += 1
+                else:
+                    stats.invalid += 1
+            stats.rows += len(chunk)
+            start_after = stats.last_pk = chunk[-1][0]
+            if progress is not None:
+                progress(stats)
+            if len(chunk) < chunk_size:
+                break
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+    logger.info(f"VAT IDs revalidated: {stats}")
+    return stats
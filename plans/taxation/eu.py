@@ -1,17 +1,12 @@
 import logging
 from decimal import Decimal
-from urllib.error import URLError
-from xml.sax import SAXParseException
 
-import stdnum.eu.vat
 from django.contrib import messages
 from django.core.exceptions import ImproperlyConfigured
 from django.utils.html import format_html
-from requests.exceptions import ConnectionError
-from suds import WebFault
-from suds.transport import TransportError
 
 from plans.taxation import TaxationPolicy
+from plans.taxation.vies import VIES_ERRORS, vies_cache
 from plans.utils import country_code_transform
 
 logger = logging.getLogger("plans.taxation.eu.vies")
@@ -119,7 +114,7 @@ class EUTaxationPolicy(TaxationPolicy):
             if cls.is_in_EU(country_code):
                 # Company is from other EU country
                 try:
-                    vies_result = bool(stdnum.eu.vat.check_vies(tax_id)["valid"])
+                    vies_result = vies_cache.check(tax_id)
                     logger.info("TAX_ID=%s RESULT=%s" % (tax_id, vies_result))
                     if tax_id and vies_result:
                         # Company is registered in VIES
@@ -127,14 +122,7 @@ class EUTaxationPolicy(TaxationPolicy):
                         return None, True
                     else:
                         return cls.EU_COUNTRIES_VAT[country_code], True
-                except (
-                    WebFault,
-                    TransportError,
-                    stdnum.exceptions.InvalidComponent,
-                    ConnectionError,
-                    URLError,
-                    SAXParseException,
-                ) as e:
+                except VIES_ERRORS as e:
                     # If we could not connect to VIES or the VAT ID is incorrect
                     if request:
                         messages.warning(
@@ -0,0 +1,240 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from xml.sax import SAXParseException
+
+import stdnum.eu.vat
+import stdnum.exceptions
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+from requests.exceptions import ConnectionError
+from suds import WebFault
+from suds.transport import TransportError
+
+from plans.cache import get_cache
+from plans.importer import import_name
+
+logger = logging.getLogger("plans.taxation.eu.vies")
+
+#: Errors raised by ``check_vies`` when VIES can't be reached or VAT ID is malformed
+VIES_ERRORS = (
+    WebFault,
+    TransportError,
+    stdnum.exceptions.InvalidComponent,
+    ConnectionError,
+    URLError,
+    SAXParseException,
+)
+
+
+def check_vies(tax_id):
+    """
+    Default VIES checker, returns ``True`` if the VAT ID is registered in VIES.
+    """
+    return bool(stdnum.eu.vat.check_vies(tax_id)["valid"])
+
+
+class FakeVIES(object):
+    """
+    Local VIES replacement for tests and development. Use it as ``PLANS_VIES_CHECKER``
+    or assign it to ``vies_cache.checker``::
+
+        vies_cache.checker = FakeVIES(valid=["CZ48136450"])
+
+    VAT IDs not listed in ``valid`` are reported as not registered. When ``down`` is set,
+    every check fails as if VIES was not reachable.
+    """
+
+    def __init__(self, valid=(), down=False):
+        self.valid = {normalize_tax_id(tax_id) for tax_id in valid}
+        self.down = down
+        self.calls = []
+
+    def __call__(self, tax_id):
+        self.calls.append(tax_id)
+        if self.down:
+            raise URLError("VIES is not available")
+        return normalize_tax_id(tax_id) in self.valid
+
+
+def normalize_tax_id(tax_id):
+    try:
+        return stdnum.eu.vat.compact(tax_id)
+    except stdnum.exceptions.ValidationError:
+        return "".join(tax_id.split()).upper()
+
+
+class VIESCache(object):
+    """
+    Cache of VIES results stored in the Django cache and keyed by normalized VAT ID.
+
+    Positive and negative results have separate TTLs (``PLANS_VIES_CACHE_TTL`` and
+    ``PLANS_VIES_CACHE_NEGATIVE_TTL``). Expired results are kept for another
+    ``PLANS_VIES_CACHE_STALE_TTL`` seconds and returned when VIES can't be reached.
+    With ``PLANS_VIES_CACHE_STALE_WHILE_REVALIDATE`` the stale result is returned immediately
+    and VIES is queried in a background thread.
+
+    Caching is enabled by ``PLANS_VIES_CACHE`` setting, otherwise every check goes to VIES.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checker = None
+        self.executor = None
+        self.revalidating = {}
+        self.reset_stats()
+
+    @property
+    def enabled(self):
+        return getattr(settings, "PLANS_VIES_CACHE", False)
+
+    def get_checker(self):
+        if self.checker is None:
+            checker = getattr(settings, "PLANS_VIES_CHECKER", None)
+            self.checker = import_name(checker) if checker else check_vies
+        return self.checker
+
+    def make_key(self, tax_id):
+        return "plans_vies_%s" % tax_id
+
+    def get_ttl(self, valid):
+        if valid:
+            return getattr(settings, "PLANS_VIES_CACHE_TTL", 7 * 24 * 3600)
+        return getattr(settings, "PLANS_VIES_CACHE_NEGATIVE_TTL", 24 * 3600)
+
+    def get_stale_ttl(self):
+        return getattr(settings, "PLANS_VIES_CACHE_STALE_TTL", 30 * 24 * 3600)
+
+    def get(self, tax_id):
+        """
+        Returns cached entry ``{"valid": bool, "checked": timestamp}`` or ``None``.
+        """
+        return get_cache().get(self.make_key(normalize_tax_id(tax_id)))
+
+    def set(self, tax_id, valid, checked=None):
+        entry = {"valid": valid, "checked": time.time() if checked is None else checked}
+        get_cache().set(
+            self.make_key(normalize_tax_id(tax_id)),
+            entry,
+            self.get_ttl(valid) + self.get_stale_ttl(),
+        )
+        return entry
+
+    def check(self, tax_id):
+        """
+        Returns ``True`` if the VAT ID is registered in VIES.
+        Raises one of ``VIES_ERRORS`` if VIES can't be reached and there is no usable cached result.
+        """
+        if not self.enabled:
+            return self.get_checker()(tax_id)
+
+        entry = self.get(tax_id)
+        if entry is not None:
+            age = time.time() - entry["checked"]
+            if age < self.get_ttl(entry["valid"]):
+                self.count("hits")
+                return entry["valid"]
+            if getattr(settings, "PLANS_VIES_CACHE_STALE_WHILE_REVALIDATE", False):
+                self.count("stale_hits")
+                self.revalidate(tax_id)
+                return entry["valid"]
+
+        self.count("misses")
+        try:
+            return self.refresh(tax_id)
+        except VIES_ERRORS:
+            if entry is None:
+                raise
+            self.count("stale_hits")
+            logger.warning(
+                "TAX_ID=%s VIES not available, using result checked at %s"
+                % (tax_id, time.ctime(entry["checked"]))
+            )
+            return entry["valid"]
+
+    def refresh(self, tax_id):
+        """
+        Checks the VAT ID in VIES and stores the result.
+        """
+        started = time.perf_counter()
+        try:
+            valid = self.get_checker()(tax_id)
+        except VIES_ERRORS:
+            self.count("errors")
+            raise
+        finally:
+            with self.lock:
+                self.stats_data["vies_calls"] += 1
+                self.stats_data["vies_time"] += time.perf_counter() - started
+        self.set(tax_id, valid)
+        return valid
+
+    def revalidate(self, tax_id):
+        """
+        Refreshes the VAT ID in a background thread, at most one refresh per VAT ID runs at once.
+        """
+        key = normalize_tax_id(tax_id)
+        with self.lock:
+            if key in self.revalidating:
+                return self.revalidating[key]
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix="plans-vies"
+                )
+            future = self.executor.submit(self._revalidate, tax_id, key)
+            self.revalidating[key] = future
+        return future
+
+    def wait(self):
+        """
+        Waits until running background refreshes finish.
+        """
+        with self.lock:
+            futures = list(self.revalidating.values())
+        for future in futures:
+            future.result()
+
+    def _revalidate(self, tax_id, key):
+        try:
+            self.count("revalidations")
+            return self.refresh(tax_id)
+        except VIES_ERRORS:
+            logger.warning("TAX_ID=%s background VIES check failed" % tax_id)
+        finally:
+            with self.lock:
+                self.revalidating.pop(key, None)
+            # Cache backend may use database connection
+            connections.close_all()
+
+    def count(self, name):
+        with self.lock:
+            self.stats_data[name] += 1
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats_data = {
+                "hits": 0,
+                "misses": 0,
+                "stale_hits": 0,
+                "errors": 0,
+                "revalidations": 0,
+                "vies_calls": 0,
+                "vies_time": 0.0,
+            }
+
+    def stats(self):
+        with self.lock:
+            return dict(self.stats_data)
+
+
+vies_cache = VIESCache()
+
+
+@receiver(setting_changed)
+def reset_vies_checker(setting, **kwargs):
+    if setting == "PLANS_VIES_CHECKER":
+        vies_cache.checker = None
@@ -0,0 +1,202 @@
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.paginator import EmptyPage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+
+from plans.base.models import (
+    AbstractBillingInfo,
+    AbstractInvoice,
+    AbstractOrder,
+    AbstractPlan,
+    AbstractPricing,
+    AbstractQuota,
+    AbstractRecurringUserPlan,
+    AbstractUserPlan,
+    OutboxEmail,
+    UserPlanCancellationReason,
+)
+from plans.paginator import EstimatedCountPaginator, get_estimated_count
+
+User = get_user_model()
+BillingInfo = AbstractBillingInfo.get_concrete_model()
+Invoice = AbstractInvoice.get_concrete_model()
+Order = AbstractOrder.get_concrete_model()
+Plan = AbstractPlan.get_concrete_model()
+Pricing = AbstractPricing.get_concrete_model()
+Quota = AbstractQuota.get_concrete_model()
+RecurringUserPlan = AbstractRecurringUserPlan.get_concrete_model()
+UserPlan = AbstractUserPlan.get_concrete_model()
+
+ROWS = 100
+
+
+class AdminChangelistQueriesTests(TestCase):
+    """
+    Number of queries of admin changelists must not depend on number of displayed rows.
+    Expected numbers include session, user, counts, list filters and user plan of the logged in admin.
+    """
+
+    def setUp(self):
+        self.admin = baker.make(User, is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+
+    def get_changelist(self, model, expected_rows, num_queries):
+        url = reverse(
+            "admin:%s_%s_changelist" % (model._meta.app_label, model._meta.model_name)
+        )
+        with self.assertNumQueries(num_queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["cl"].result_list), expected_rows)
+        return response
+
+    def make_users(self):
+        return baker.make(User, _quantity=ROWS)
+
+    def test_plan(self):
+        plans = baker.make(Plan, customized=self.admin, _quantity=ROWS)
+        pricing = baker.make(Pricing)
+        for plan in plans:
+            baker.make("PlanPricing", plan=plan, pricing=pricing)
+        self.get_changelist(Plan, ROWS, 8)
+
+    def test_userplan(self):
+        pricing = baker.make(Pricing)
+        plan = baker.make(Plan)
+        for user in self.make_users():
+            userplan = baker.make(UserPlan, user=user, plan=plan)
+            baker.make(RecurringUserPlan, user_plan=userplan, pricing=pricing)
+        self.get_changelist(UserPlan, ROWS, 9)
+
+    def test_userplan_without_recurring(self):
+        plan = baker.make(Plan)
+        for user in self.make_users():
+            baker.make(UserPlan, user=user, plan=plan)
+        self.get_changelist(UserPlan, ROWS, 9)
+
+    def test_order(self):
+        plan = baker.make(Plan)
+        pricing = baker.make(Pricing)
+        for user in self.make_users():
+            baker.make(Order, user=user, plan=plan, pricing=pricing, amount=10)
+        self.get_changelist(Order, ROWS, 8)
+
+    def test_invoice(self):
+        order = baker.make(Order, user=self.admin, amount=10)
+        for user in self.make_users():
+            baker.make(Invoice, user=user, order=order, total_net=10, _fill_optional=[])
+        self.get_changelist(Invoice, ROWS, 8)
+
+    def test_billing_info(self):
+        for user in self.make_users():
+            baker.make(BillingInfo, user=user, country="PL")
+        self.get_changelist(BillingInfo, ROWS, 6)
+
+    def test_pricing(self):
+        baker.make(Pricing, _quantity=ROWS)
+        self.get_changelist(Pricing, ROWS, 6)
+
+    def test_quota(self):
+        baker.make(Quota, _quantity=ROWS)
+        self.get_changelist(Quota, ROWS, 8)
+
+    def test_cancellation_reason(self):
+        baker.make(UserPlanCancellationReason, _quantity=ROWS)
+        self.get_changelist(UserPlanCancellationReason, ROWS, 6)
+
+    def test_outbox_email(self):
+        baker.make(OutboxEmail, _quantity=ROWS)
+        self.get_changelist(OutboxEmail, ROWS, 6)
+
+
+class EstimatedCountTests(TestCase):
+    """
+    Estimates depend on the database, admin tests use a mocked estimate.
+    """
+
+    def setUp(self):
+        self.client.force_login(baker.make(User, is_staff=True, is_superuser=True))
+        baker.make(Order, amount=10, status=Order.STATUS.NEW, _quantity=20)
+
+    def get_count_queries(self, data=None, estimate=20):
+        with mock.patch(
+            "plans.paginator.get_estimated_count", return_value=estimate
+        ), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("admin:plans_order_changelist"), data)
+        self.assertEqual(response.status_code, 200)
+        return response, [q["sql"] for q in queries if "COUNT(" in q["sql"]]
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite estimate")
+    def test_get_estimated_count_sqlite(self):
+        self.assertEqual(
+            get_estimated_count(Order.objects.all()), Order.objects.count()
+        )
+        self.assertIsNone(get_estimated_count(Order.objects.filter(amount=10)))
+
+    @skipUnless(connection.vendor == "postgresql", "PostgreSQL estimate")
+    def test_get_estimated_count_postgresql(self):
+        self.assertIsInstance(get_estimated_count(Order.objects.all()), int)
+        self.assertIsInstance(get_estimated_count(Order.objects.filter(amount=10)), int)
+
+    def test_paginator(self):
+        queryset = Order.objects.order_by("pk")
+        with mock.patch("plans.paginator.get_estimated_count", return_value=1000):
+            paginator = EstimatedCountPaginator(queryset, 10, threshold=100)
+            self.assertEqual(paginator.count, 1000)
+            self.assertTrue(paginator.estimated)
+            # Pages past the real rows are empty
+            self.assertEqual(len(paginator.page(2).object_list), 10)
+            self.assertEqual(len(paginator.page(3).object_list), 0)
+
+        # Estimate lower than the real count, rows past it are counted exactly
+        with mock.patch("plans.paginator.get_estimated_count", return_value=15):
+            paginator = EstimatedCountPaginator(queryset, 5, threshold=10)
+            self.assertEqual(paginator.num_pages, 3)
+            self.assertEqual(len(paginator.page(4).object_list), 5)
+            self.assertFalse(paginator.estimated)
+            self.assertEqual(paginator.count, 20)
+            with self.assertRaises(EmptyPage):
+                paginator.page(5)
+
+        for estimate in (None, 50):
+            with mock.patch(
+                "plans.paginator.get_estimated_count", return_value=estimate
+            ):
+                paginator = EstimatedCountPaginator(queryset, 10, threshold=100)
+                self.assertEqual(paginator.count, 20)
+                self.assertFalse(paginator.estimated)
+
+    @override_settings(PLANS_ADMIN_ESTIMATED_COUNT_THRESHOLD=10)
+    def test_estimated(self):
+        response, count_queries = self.get_count_queries()
+        self.assertEqual(count_queries, [])
+        self.assertTrue(response.context["cl"].paginator.estimated)
+        self.assertContains(response, "about 20 Orders")
+
+    @override_settings(PLANS_ADMIN_ESTIMATED_COUNT_THRESHOLD=100)
+    def test_below_threshold(self):
+        response, count_queries = self.get_count_queries()
+        self.assertEqual(len(count_queries), 1)
+        self.assertFalse(response.context["cl"].paginator.estimated)
+        self.assertNotContains(response, "about 20")
+
+    @override_settings(PLANS_ADMIN_ESTIMATED_COUNT_THRESHOLD=10)
+    def test_filtered(self):
+        # Filtered queryset without estimate is counted, but full result count is skipped
+        response, count_queries = self.get_count_queries(
+            {"status__exact": "1"}, estimate=None
+        )
+        self.assertEqual(len(count_queries), 1)
+        self.assertFalse(response.context["cl"].show_full_result_count)
+
+    def test_disabled(self):
+        response, count_queries = self.get_count_queries({"status__exact": "1"})
+        self.assertEqual(len(count_queries), 2)
+        self.assertNotIsInstance(
+            response.context["cl"].paginator, EstimatedCountPaginator
+        )
@@ -1,12 +1,23 @@
 import datetime
+import threading
+import time
 from decimal import Decimal
 from io import StringIO
+from unittest import mock
 
 from django.core.management import call_command
 from django.test import TestCase
 from model_bakery import baker
 
+from plans import tasks
 from plans.models import AbstractRecurringUserPlan
+from plans.renewal import (
+    ProviderPool,
+    RateLimiter,
+    RenewalDispatcher,
+    is_concurrent,
+)
+from plans.signals import account_automatic_renewal
 
 
 class ManagementCommandTests(TestCase):
@@ -59,14 +70,300 @@ class ManagementCommandTests(TestCase):
         call_command("autorenew_accounts", providers="foo", stdout=out)
         self.assertEqual(out.getvalue(), "Starting renewal\nNo accounts autorenewed\n")
 
+    def test_renewal_batch_size_limit(self):
+        for i in range(3):
+            _make_user(
+                userplan__expire=datetime.date(2020, 1, 2),
+                userplan__recurring__renewal_triggered_by=AbstractRecurringUserPlan.RENEWAL_TRIGGERED_BY.TASK,
+                userplan__recurring__token_verified=True,
+                username=f"testuser{i}",
+            )
+        out = StringIO()
+        call_command("autorenew_accounts", batch_size=1, limit=2, stdout=out)
+        self.assertEqual(
+            out.getvalue().strip(),
+            "Starting renewal\nAccounts submitted to renewal:\n"
+            "\tinternal-payment-recurring\t\ttestuser0\n"
+            "\tinternal-payment-recurring\t\ttestuser1",
+        )
+
+
+class AutorenewAccountTaskTests(TestCase):
+    def setUp(self):
+        self.users = [
+            _make_user(
+                userplan__expire=datetime.date(2020, 1, 2),
+                userplan__recurring__renewal_triggered_by=AbstractRecurringUserPlan.RENEWAL_TRIGGERED_BY.TASK,
+                userplan__recurring__token_verified=True,
+                username=f"testuser{i}",
+            )
+            for i in range(5)
+        ]
+
+    def test_summary(self):
+        renewed = []
+
+        def receiver(sender, user, **kwargs):
+            renewed.append(user)
+            # Accessing the recurring plan of the streamed user doesn't hit the database
+            self.assertEqual(
+                user.userplan.recurring.payment_provider,
+                "internal-payment-recurring",
+            )
+
+        account_automatic_renewal.connect(receiver)
+        try:
+            # count query + 3 pages (2, 2 and 1 accounts)
+            with self.assertNumQueries(4):
+                summary = tasks.autorenew_account(batch_size=2)
+        finally:
+            account_automatic_renewal.disconnect(receiver)
+
+        self.assertEqual(renewed, self.users)
+        self.assertEqual(summary.count, 5)
+        self.assertEqual(summary.submitted, 5)
+        self.assertTrue(summary)
+
+    def test_keyset_pagination(self):
+        def receiver(sender, user, **kwargs):
+            # Renewal extends the plan, so the account doesn't match the criteria anymore
+            user.userplan.expire = datetime.date.today() + datetime.timedelta(days=30)
+            user.userplan.save()
+
+        account_automatic_renewal.connect(receiver)
+        try:
+            summary = tasks.autorenew_account(batch_size=2)
+        finally:
+            account_automatic_renewal.disconnect(receiver)
+        self.assertEqual(summary.submitted, 5)
+
+    def test_limit(self):
+        summary = tasks.autorenew_account(batch_size=2, limit=3)
+        self.assertEqual(summary.count, 3)
+        self.assertEqual(summary.submitted, 3)
+
+    def test_no_accounts(self):
+        with self.assertNumQueries(1):
+            summary = tasks.autorenew_account(providers=["foo"])
+        self.assertFalse(summary)
+
+
+class FakeProvider(object):
+    """
+    Renewal receiver simulating slow payment provider calls.
+    """
+
+    def __init__(self, delay=0.02, fail_users=()):
+        self.delay = delay
+        self.fail_users = fail_users
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = {}
+        self.renewed = []
+
+    def renew(self, sender, user, **kwargs):
+        provider = user.userplan.recurring.payment_provider
+        with self.lock:
+            self.running[provider] = self.running.get(provider, 0) + 1
+            self.max_running[provider] = max(
+                self.max_running.get(provider, 0), self.running[provider]
+            )
+        try:
+            time.sleep(self.delay)
+            if user.username in self.fail_users:
+                raise ValueError("Card declined")
+            with self.lock:
+                self.renewed.append(user.username)
+        finally:
+            with self.lock:
+                self.running[provider] -= 1
+
+
+class ConcurrentRenewalTests(TestCase):
+    def setUp(self):
+        self.users = [
+            _make_user(
+                userplan__expire=datetime.date(2020, 1, 2),
+                userplan__recurring__renewal_triggered_by=AbstractRecurringUserPlan.RENEWAL_TRIGGERED_BY.TASK,
+                userplan__recurring__token_verified=True,
+                userplan__recurring__payment_provider=provider,
+                username=f"{provider}{i}",
+            )
+            for provider in ("slow", "fast")
+            for i in range(6)
+        ]
+        self.provider = FakeProvider(fail_users=("slow1", "fast4"))
+        account_automatic_renewal.connect(self.provider.renew)
+
+    def tearDown(self):
+        account_automatic_renewal.disconnect(self.provider.renew)
+
+    def test_concurrent_renewal(self):
+        with self.settings(PLANS_AUTORENEW_CONCURRENCY={"slow": 2, "default": 3}):
+            with self.assertLogs("plans.renewal", "WARNING") as logs:
+                summary = tasks.autorenew_account(batch_size=4)
+        self.assertEqual(len(logs.records), 2)
+
+        self.assertEqual(summary.submitted, 12)
+        self.assertEqual(
+            [result.user for result in summary.results], self.users
+        )  # results keep submission order
+        self.assertEqual(
+            sorted(self.provider.renewed),
+            sorted(
+                user.username
+                for user in self.users
+                if user.username not in ("slow1", "fast4")
+            ),
+        )
+        self.assertEqual(len(summary.succeeded), 10)
+        self.assertEqual(
+            [(r.user.username, r.provider) for r in summary.failed],
+            [("slow1", "slow"), ("fast4", "fast")],
+        )
+        self.assertIsInstance(summary.failed[0].error, ValueError)
+        self.assertLessEqual(self.provider.max_running["slow"], 2)
+        self.assertLessEqual(self.provider.max_running["fast"], 3)
+        self.assertGreater(self.provider.max_running["slow"], 1)
+
+    def test_concurrency_argument(self):
+        with self.assertLogs("plans.renewal", "WARNING"):
+            summary = tasks.autorenew_account(concurrency=1, providers=["fast"])
+        self.assertEqual(summary.submitted, 6)
+        self.assertEqual(len(summary.failed), 1)
+        self.assertEqual(self.provider.max_running, {"fast": 1})
+
+    def test_sequential_by_default(self):
+        with self.assertRaises(ValueError):
+            tasks.autorenew_account()
+
+    def test_sequential_with_zero_concurrency(self):
+        with self.settings(PLANS_AUTORENEW_CONCURRENCY={"slow": 0, "default": 0}):
+            with self.assertRaises(ValueError):
+                tasks.autorenew_account()
+
+    def test_slow_provider_does_not_block_others(self):
+        release = threading.Event()
+        fast_renewed = threading.Event()
+
+        def renew(sender, user, **kwargs):
+            if user.userplan.recurring.payment_provider == "slow":
+                release.wait(5)
+            else:
+                fast_renewed.set()
+
+        account_automatic_renewal.disconnect(self.provider.renew)
+        account_automatic_renewal.connect(renew)
+        try:
+            with RenewalDispatcher(concurrency=1) as dispatcher:
+                # All slow accounts are submitted without waiting for the busy worker
+                for user in self.users:
+                    dispatcher.submit(user)
+                self.assertTrue(fast_renewed.wait(5))
+                release.set()
+        finally:
+            release.set()
+            account_automatic_renewal.disconnect(renew)
+        self.assertEqual([r.user for r in dispatcher.results], self.users)
+
+    def test_max_pending_per_provider(self):
+        release = threading.Event()
+        slow_done = threading.Event()
+        fast_after_slow = []
+
+        def renew(sender, user, **kwargs):
+            if user.userplan.recurring.payment_provider == "slow":
+                release.wait(5)
+                slow_done.set()
+            else:
+                fast_after_slow.append(slow_done.is_set())
+
+        account_automatic_renewal.disconnect(self.provider.renew)
+        account_automatic_renewal.connect(renew)
+        try:
+            with RenewalDispatcher(concurrency=1, max_pending=1) as dispatcher:
+                # Busy slow provider has reached its limit, fast accounts are still submitted
+                dispatcher.submit(self.users[0])
+                for user in self.users[6:]:
+                    dispatcher.submit(user)
+                dispatcher.pools["fast"].shutdown()
+                release.set()
+        finally:
+            release.set()
+            account_automatic_renewal.disconnect(renew)
+        self.assertEqual(fast_after_slow, [False] * 6)
+        self.assertEqual(len(dispatcher.results), 7)
+
+    def test_command_output(self):
+        out = StringIO()
+        with self.assertLogs("plans.renewal", "WARNING"):
+            call_command(
+                "autorenew_accounts", providers=["slow"], concurrency=2, stdout=out
+            )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 9)
+        self.assertEqual(
+            lines[-1], "Renewal failed:\tslow\tslow1\tValueError('Card declined')"
+        )
+
+
+class RenewalDispatcherTests(TestCase):
+    def test_rate_limiter(self):
+        clock = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(round(seconds, 3))
+
+        limiter = RateLimiter(rate=4, clock=lambda: clock[0], sleep=sleep)
+        for i in range(3):
+            limiter.wait()
+        self.assertEqual(sleeps, [0.25, 0.5])
+        clock[0] = 101.0
+        limiter.wait()
+        self.assertEqual(sleeps, [0.25, 0.5])
+
+    def test_no_rate_limit(self):
+        limiter = RateLimiter(sleep=lambda seconds: self.fail("Should not sleep"))
+        limiter.wait()
+        limiter.wait()
+
+    def test_rate_limit_setting(self):
+        with self.settings(
+            PLANS_AUTORENEW_CONCURRENCY=2,
+            PLANS_AUTORENEW_RATE_LIMIT={"slow": 5},
+        ):
+            dispatcher = RenewalDispatcher()
+        slow_pool = dispatcher.get_pool("slow")
+        fast_pool = dispatcher.get_pool("fast")
+        self.assertEqual(slow_pool.rate_limiter.interval, 0.2)
+        self.assertEqual(fast_pool.rate_limiter.interval, 0)
+        self.assertEqual(len(slow_pool.threads), 2)
+        dispatcher.wait()
+
+    def test_is_concurrent(self):
+        self.assertFalse(is_concurrent(0))
+        self.assertFalse(is_concurrent({"slow": 0, "default": 0}))
+        self.assertTrue(is_concurrent({"slow": 2, "default": 0}))
+        self.assertTrue(is_concurrent(1))
+
+    def test_connections_closed_once_per_worker(self):
+        with mock.patch("plans.renewal.connections") as connections:
+            pool = ProviderPool("fast", 3)
+            futures = [pool.submit(mock.Mock(pk=i)) for i in range(10)]
+            pool.shutdown()
+        self.assertTrue(all(future.result().success for future in futures))
+        self.assertEqual(connections.close_all.call_count, 3)
+
 
 def _make_user(
     userplan__expire,
     userplan__recurring__renewal_triggered_by,
     userplan__recurring__token_verified,
     userplan__recurring__payment_provider="internal-payment-recurring",
+    username="testuser",
 ):
-    user = baker.make("User", username="testuser")
+    user = baker.make("User", username=username)
     plan_pricing = baker.make("PlanPricing", plan=baker.make("Plan", name="Foo plan"))
     baker.make(
         "UserPlan",
@@ -80,3 +377,4 @@ def _make_user(
         recurring__token_verified=userplan__recurring__token_verified,
         expire=userplan__expire,
     )
+    return user
@@ -1,24 +1,38 @@
+import json
+import os
 import random
 import re
+import smtplib
+import tempfile
 import warnings
-from datetime import date, datetime, time, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone
 from decimal import Decimal
 from io import StringIO
 from unittest import mock
 from unittest.mock import patch
+from urllib.error import URLError
 
 import requests
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.contrib.messages.storage.fallback import FallbackStorage
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.core import mail
+from django.core.mail.backends import locmem
+from django.contrib.sites.models import Site
 from django.core.exceptions import ImproperlyConfigured, ValidationError
-from django.core.management import call_command
-from django.db import transaction
-from django.db.models import Exists, OuterRef, Q
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q, Sum
+from django.template import Context, Template, loader
+from django.test.utils import CaptureQueriesContext
 from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import translation
+from django.utils.functional import SimpleLazyObject
+from django.utils.timezone import now
 from django_concurrent_tests.helpers import call_concurrently
 from freezegun import freeze_time
 from internet_sabotage import no_connection
@@ -31,15 +45,59 @@ from plans.base.models import (
     AbstractOrder,
     AbstractPlan,
     AbstractPlanPricing,
+    AbstractPlanQuota,
     AbstractPricing,
+    AbstractQuota,
     AbstractRecurringUserPlan,
     AbstractUserPlan,
+    OutboxEmail,
+)
+from plans.cache import (
+    catalog_cache,
+    default_plan_cache,
+    get_cache,
+    plan_table_cache,
+    quota_cache,
+)
+from plans.context_processors import account_status
+from plans.contrib import email_renderer, send_template_email
+from plans.middleware import (
+    UserPlanSnapshot,
+    get_account_urls,
+    get_userplan_snapshot,
+)
+from plans.numbering import (
+    DEFAULT_INVOICE_NUMBER_FORMAT,
+    InvoiceNumberFormatter,
+    clear_sequence_cache,
+    get_invoice_number_formatter,
+)
+from plans.plan_table import build_plan_table, get_plan_table
+from plans.plan_change import (
+    PlanChangePolicy,
+    StandardPlanChangePolicy,
+    get_change_price,
+    get_change_prices,
 )
-from plans.plan_change import PlanChangePolicy, StandardPlanChangePolicy
 from plans.quota import get_user_quota
+from plans.signals import account_deactivated, account_expired
+from plans.simulation import (
+    CSV_HEADER,
+    PriceChangeSimulation,
+    iter_simulation_csv,
+)
+from plans.status import get_user_plan_status, status_cache
 from plans.taxation.eu import EUTaxationPolicy
-from plans.validators import ModelCountValidator
-from plans.views import CreateOrderView
+from plans.taxation.vies import FakeVIES, vies_cache
+from plans.utils import geoip_reader, get_country_code
+from plans.validators import (
+    ModelCountValidator,
+    get_batched_counts,
+    get_validators,
+    plan_validation,
+    plan_validation_bulk,
+)
+from plans.views import CreateOrderView, PricingView
 
 User = get_user_model()
 BillingInfo = AbstractBillingInfo.get_concrete_model()
@@ -49,6 +107,9 @@ Order = AbstractOrder.get_concrete_model()
 Plan = AbstractPlan.get_concrete_model()
 UserPlan = AbstractUserPlan.get_concrete_model()
 Pricing = AbstractPricing.get_concrete_model()
+PlanQuota = AbstractPlanQuota.get_concrete_model()
+Quota = AbstractQuota.get_concrete_model()
+RecurringUserPlan = AbstractRecurringUserPlan.get_concrete_model()
 
 
 class PlansTestCase(TestCase):
@@ -325,6 +386,582 @@ class PlansTestCase(TestCase):
         self.assertEqual(u.userplan.active, True)
 
 
+@override_settings(PLANS_QUOTA_CACHE=True)
+class QuotaCacheTestCase(TestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def setUp(self):
+        quota_cache.bump_version()
+        quota_cache.clear()
+
+    def test_get_user_quota_cached(self):
+        u = User.objects.get(username="test1")
+        plan = u.userplan.plan
+        expected = {
+            "CUSTOM_WATERMARK": 1,
+            "MAX_GALLERIES_COUNT": 3,
+            "MAX_PHOTOS_PER_GALLERY": None,
+        }
+        self.assertEqual(plan.get_quota_dict(), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_quota(u), expected)
+            self.assertEqual(plan.get_quota_dict(), expected)
+        self.assertEqual(quota_cache.stats()["misses"], 1)
+        self.assertEqual(quota_cache.stats()["hits"], 2)
+
+    def test_shared_cache_hit(self):
+        plan = User.objects.get(username="test1").userplan.plan
+        plan.get_quota_dict()
+        # Simulate another process with empty local memory
+        quota_cache.local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(plan.get_quota_dict()["MAX_GALLERIES_COUNT"], 3)
+
+    def test_invalidate_on_plan_quota_change(self):
+        plan = User.objects.get(username="test1").userplan.plan
+        self.assertEqual(plan.get_quota_dict()["MAX_GALLERIES_COUNT"], 3)
+        plan_quota = PlanQuota.objects.get(
+            plan=plan, quota__codename="MAX_GALLERIES_COUNT"
+        )
+        plan_quota.value = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            plan_quota.save()
+        self.assertEqual(plan.get_quota_dict()["MAX_GALLERIES_COUNT"], 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            plan_quota.delete()
+        self.assertNotIn("MAX_GALLERIES_COUNT", plan.get_quota_dict())
+
+    def test_invalidated_after_commit(self):
+        plan = User.objects.get(username="test1").userplan.plan
+        plan.get_quota_dict()
+        plan_quota = PlanQuota.objects.get(
+            plan=plan, quota__codename="MAX_GALLERIES_COUNT"
+        )
+        plan_quota.value = 5
+        with self.captureOnCommitCallbacks() as callbacks:
+            plan_quota.save()
+            # Not committed yet, other processes could cache uncommitted data
+            self.assertEqual(plan.get_quota_dict()["MAX_GALLERIES_COUNT"], 3)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(plan.get_quota_dict()["MAX_GALLERIES_COUNT"], 5)
+
+    def test_evicted_version_does_not_restore_stale_values(self):
+        plan = User.objects.get(username="test1").userplan.plan
+        plan.get_quota_dict()
+        old_version = quota_cache.get_version()
+        get_cache().delete(quota_cache.version_key)
+        self.assertNotEqual(quota_cache.get_version(), old_version)
+        quota_cache.bump_version()
+        self.assertNotEqual(quota_cache.get_version(), old_version)
+
+    def test_cached_dict_is_not_shared(self):
+        plan = User.objects.get(username="test1").userplan.plan
+        plan.get_quota_dict()["MAX_GALLERIES_COUNT"] = 100
+        self.assertEqual(plan.get_quota_dict()["MAX_GALLERIES_COUNT"], 3)
+
+    @override_settings(PLANS_QUOTA_CACHE=False)
+    def test_cache_disabled(self):
+        plan = User.objects.get(username="test1").userplan.plan
+        plan.get_quota_dict()
+        with self.assertNumQueries(1):
+            plan.get_quota_dict()
+
+
+class PlanTableTestCase(TestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def setUp(self):
+        plan_table_cache.bump_version()
+        plan_table_cache.clear()
+
+    def expected_table(self, plans):
+        quotas = Quota.objects.filter(planquota__plan__in=plans).distinct()
+        return [
+            [
+                quota,
+                [
+                    PlanQuota.objects.filter(plan=plan, quota=quota).first()
+                    for plan in plans
+                ],
+            ]
+            for quota in quotas
+        ]
+
+    def test_build_plan_table(self):
+        plans = list(Plan.objects.all())
+        expected = self.expected_table(plans)
+        with self.assertNumQueries(1):
+            table = build_plan_table(plans)
+        self.assertEqual(table, expected)
+        self.assertIn(None, [plan_quota for row in table for plan_quota in row[1]])
+
+    def test_build_plan_table_empty(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(build_plan_table([]), [])
+
+    @override_settings(PLANS_PLAN_TABLE_CACHE=True)
+    def test_get_plan_table_cached(self):
+        plans = list(Plan.objects.all())
+        table = get_plan_table(plans)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_plan_table(plans), table)
+        # Other set of plans has its own entry
+        with self.assertNumQueries(1):
+            get_plan_table(plans[:1])
+        with translation.override("pl"):
+            with self.assertNumQueries(1):
+                get_plan_table(plans)
+        self.assertEqual(plan_table_cache.stats()["hits"], 1)
+
+    @override_settings(PLANS_PLAN_TABLE_CACHE=True)
+    def test_get_plan_table_invalidation(self):
+        plans = list(Plan.objects.all())
+        get_plan_table(plans)
+        plan_quota = PlanQuota.objects.filter(plan=plans[0]).first()
+        plan_quota.value = 1234
+        with self.captureOnCommitCallbacks(execute=True):
+            plan_quota.save()
+        values = [pq.value for row in get_plan_table(plans) for pq in row[1] if pq]
+        self.assertIn(1234, values)
+        with self.captureOnCommitCallbacks(execute=True):
+            plan_quota.quota.delete()
+        self.assertEqual(get_plan_table(plans), self.expected_table(plans))
+
+    def test_pricing_view(self):
+        response = self.client.get(reverse("pricing"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context["plan_table"],
+            self.expected_table(list(response.context["plan_list"])),
+        )
+
+
+@override_settings(PLANS_CATALOG_CACHE=True)
+class CatalogCacheTestCase(TestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def setUp(self):
+        catalog_cache.bump_version()
+        catalog_cache.clear()
+
+    def test_pricing_anonymous_cached(self):
+        response = self.client.get(reverse("pricing"))
+        self.assertEqual(response.status_code, 200)
+        content = response.content
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("pricing"))
+        self.assertEqual(response.content, content)
+        self.assertContains(response, 'class="plan_table"', count=1)
+
+        with translation.override("pl"), self.assertNumQueries(1):
+            # Plan table is rendered again for other language, plans are cached
+            self.client.get(reverse("pricing"))
+
+    def test_pricing_invalidated_on_catalog_change(self):
+        self.client.get(reverse("pricing"))
+        plan_pricing = PlanPricing.objects.filter(
+            plan__visible=True, plan__available=True, visible=True
+        ).first()
+        plan_pricing.price = Decimal("1234.56")
+        with self.captureOnCommitCallbacks(execute=True):
+            plan_pricing.save()
+        self.assertContains(self.client.get(reverse("pricing")), "1234.56")
+
+        pricing = plan_pricing.pricing
+        pricing.name = "Special period"
+        with self.captureOnCommitCallbacks(execute=True):
+            pricing.save()
+        self.assertContains(self.client.get(reverse("pricing")), "Special period")
+
+    def test_upgrade_customized_plan(self):
+        user = User.objects.get(username="test1")
+        self.client.force_login(user)
+        customized = baker.make(
+            "Plan", available=True, visible=True, customized=user, order=3
+        )
+        catalog_plans = list(
+            Plan.objects.filter(available=True, visible=True, customized__isnull=True)
+        )
+        self.client.get(reverse("upgrade_plan"))
+        # Customized plans are not part of the cached catalog
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                catalog_cache.get("UpgradePlanView:plans", list), catalog_plans
+            )
+
+        response = self.client.get(reverse("upgrade_plan"))
+        self.assertEqual(
+            list(response.context["plan_list"]),
+            list(
+                Plan.objects.filter(available=True, visible=True).filter(
+                    Q(customized=user) | Q(customized__isnull=True)
+                )
+            ),
+        )
+        self.assertIn(customized, response.context["plan_list"])
+        self.assertNotIn("plan_table_html", response.context)
+
+    def test_subclass_with_other_queryset(self):
+        class FreePlansView(PricingView):
+            def get_queryset(self):
+                return super(FreePlansView, self).get_queryset().filter(pricing_count=0)
+
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        all_plans = PricingView(request=request).get_plan_list()
+        free_plans = FreePlansView(request=request).get_plan_list()
+        self.assertEqual(free_plans, [plan for plan in all_plans if plan.is_free()])
+        self.assertNotEqual(free_plans, all_plans)
+
+    @override_settings(PLANS_CATALOG_CACHE=False)
+    def test_cache_disabled(self):
+        self.client.get(reverse("pricing"))
+        response = self.client.get(reverse("pricing"))
+        self.assertNotIn("plan_table_html", response.context)
+        self.assertEqual(catalog_cache.stats()["misses"], 0)
+
+
+@override_settings(PLANS_DEFAULT_PLAN_CACHE=True)
+class DefaultPlanCacheTestCase(TestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def setUp(self):
+        default_plan_cache.bump_version()
+        default_plan_cache.clear()
+
+    def test_get_default_plan_cached(self):
+        plan = Plan.get_default_plan()
+        self.assertEqual(plan.pk, 1)
+        quota_dict = plan._get_quota_dict()
+        with self.assertNumQueries(0):
+            cached_plan = Plan.get_default_plan()
+            self.assertFalse(cached_plan.is_free())
+            self.assertEqual(cached_plan.get_quota_dict(), quota_dict)
+        self.assertIsNot(cached_plan, plan)
+        cached_plan.get_quota_dict()["NEW"] = 1
+        self.assertNotIn("NEW", Plan.get_default_plan().get_quota_dict())
+
+    def test_create_for_user(self):
+        Plan.get_default_plan()
+        # INSERT of user, SELECT of user plan by the listener and INSERT of user plan
+        with self.assertNumQueries(2):
+            user = User.objects.create(username="default_plan_user")
+        self.assertEqual(user.userplan.plan_id, 1)
+
+    def test_invalidated_on_plan_change(self):
+        Plan.get_default_plan()
+        with self.captureOnCommitCallbacks(execute=True):
+            PlanPricing.objects.filter(plan_id=1).delete()
+        self.assertTrue(Plan.get_default_plan().is_free())
+        with self.assertNumQueries(0):
+            self.assertEqual(Plan.get_current_plan(AnonymousUser()).pk, 1)
+
+        plan = Plan.objects.get(pk=1)
+        plan.default = None
+        with self.captureOnCommitCallbacks(execute=True):
+            plan.save()
+        self.assertIsNone(Plan.get_default_plan())
+        plan = Plan.objects.get(pk=2)
+        plan.default = True
+        with self.captureOnCommitCallbacks(execute=True):
+            plan.save()
+        self.assertEqual(Plan.get_default_plan().pk, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Plan.objects.get(pk=2).delete()
+        self.assertIsNone(Plan.get_default_plan())
+
+    @override_settings(PLANS_DEFAULT_PLAN_CACHE=False)
+    def test_cache_disabled(self):
+        Plan.get_default_plan()
+        with self.assertNumQueries(1):
+            self.assertFalse(Plan.get_default_plan().is_free())
+
+
+class PlanPricingSummaryTestCase(TestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def assertSummaryConsistent(self, plan):
+        plan.refresh_from_db()
+        pricings = list(plan.planpricing_set.all())
+        self.assertEqual(plan.pricing_count, len(pricings))
+        self.assertEqual(plan.is_free(), not pricings)
+        if pricings:
+            self.assertEqual(plan.min_price, min(p.price for p in pricings))
+            self.assertEqual(plan.pricing(), pricings[0])
+            self.assertEqual(plan.price(), pricings[0].price)
+        else:
+            self.assertIsNone(plan.min_price)
+            self.assertIsNone(plan.pricing())
+            self.assertEqual(plan.price(), 0)
+
+    def test_fixtures_consistent(self):
+        for plan in Plan.objects.all():
+            self.assertSummaryConsistent(plan)
+        self.assertEqual(Plan.update_pricing_summaries(), [])
+
+    def test_no_queries(self):
+        plans = list(Plan.objects.all())
+        with self.assertNumQueries(0):
+            for plan in plans:
+                plan.is_free()
+                plan.price()
+
+    def test_maintained_by_signals(self):
+        plan = Plan.objects.get(pk=3)
+        pricing = baker.make(
+            "PlanPricing",
+            plan=plan,
+            pricing=Pricing.objects.first(),
+            price=Decimal("0.5"),
+            order=-1,
+        )
+        # Plan instance of the pricing is updated as well
+        self.assertEqual(plan.min_price, Decimal("0.5"))
+        self.assertEqual(plan.first_plan_pricing_id, pricing.pk)
+        self.assertSummaryConsistent(plan)
+
+        pricing.price = Decimal("2")
+        pricing.save()
+        self.assertSummaryConsistent(plan)
+
+        plan.planpricing_set.all().delete()
+        self.assertSummaryConsistent(plan)
+        self.assertTrue(plan.is_free())
+
+    def test_moved_to_other_plan(self):
+        pricing = PlanPricing.objects.filter(plan_id=3).first()
+        pricing.plan = Plan.objects.get(pk=2)
+        pricing.save()
+        self.assertSummaryConsistent(Plan.objects.get(pk=3))
+        self.assertSummaryConsistent(pricing.plan)
+
+    def test_pricing_period_changed(self):
+        plan = Plan.objects.get(pk=3)
+        plan.planpricing_set.update(order=0)
+        Plan.update_pricing_summaries([plan.pk])
+        pricing = plan.planpricing_set.order_by("-pricing__period")[0].pricing
+        pricing.period = 1
+        pricing.save()
+        self.assertSummaryConsistent(plan)
+        self.assertEqual(plan.pricing().pricing, pricing)
+
+    def test_save_stale_plan(self):
+        plan = Plan.objects.get(pk=3)
+        PlanPricing.objects.filter(plan=plan).delete()
+        plan.name = "Renamed"
+        plan.save()
+        plan.refresh_from_db()
+        self.assertEqual(plan.name, "Renamed")
+        self.assertTrue(plan.is_free())
+
+    def test_command(self):
+        Plan.objects.filter(pk=3).update(pricing_count=0)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("update_plan_pricing_summaries", "--check", stdout=out)
+        self.assertIn("\t3\t3\t", out.getvalue())
+
+        call_command("update_plan_pricing_summaries", stdout=out)
+        self.assertIn("1 plans updated", out.getvalue())
+        call_command("update_plan_pricing_summaries", "--check", stdout=out)
+        self.assertSummaryConsistent(Plan.objects.get(pk=3))
+
+
+class UserPlanSnapshotTestCase(TestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def get_request(self, user):
+        request = RequestFactory().get("/")
+        request.user = user
+        return request
+
+    def test_account_status(self):
+        user = User.objects.get(username="test1")
+        user.userplan.expire = date.today() + timedelta(days=5)
+        user.userplan.active = False
+        user.userplan.save()
+        request = self.get_request(User.objects.get(pk=user.pk))
+        get_account_urls()
+        plan = user.userplan.plan
+        with self.assertNumQueries(1):
+            context = account_status(request)
+            account_status(request)
+            self.assertEqual(request.user.userplan.plan, plan)
+        # User plan is reused, only quotas are queried
+        with self.assertNumQueries(1):
+            get_user_quota(request.user)
+        self.assertEqual(
+            context,
+            {
+                "ACCOUNT_EXPIRED": False,
+                "ACCOUNT_NOT_ACTIVE": True,
+                "EXPIRE_IN_DAYS": 5,
+                "EXTEND_URL": reverse("current_plan"),
+                "ACTIVATE_URL": reverse("account_activation"),
+            },
+        )
+
+    def test_snapshot_expired(self):
+        user = User.objects.get(username="test1")
+        user.userplan.expire = date.today() - timedelta(days=2)
+        user.userplan.save()
+        snapshot = UserPlanSnapshot.load(user)
+        self.assertTrue(snapshot.is_expired)
+        self.assertEqual(snapshot.days_left, -2)
+        with self.assertRaises(AttributeError):
+            snapshot.is_expired = False
+        self.assertTrue(account_status(self.get_request(user))["ACCOUNT_EXPIRED"])
+
+    def test_anonymous_and_without_plan(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(account_status(self.get_request(AnonymousUser())), {})
+        user = User.objects.get(username="test1")
+        user.userplan.delete()
+        request = self.get_request(User.objects.get(pk=user.pk))
+        self.assertEqual(account_status(request), {})
+        self.assertIsNone(get_userplan_snapshot(request).userplan)
+
+    def test_middleware(self):
+        self.client.force_login(User.objects.get(username="test1"))
+        response = self.client.get(reverse("upgrade_plan"))
+        self.assertIsInstance(response.wsgi_request.userplan_snapshot, SimpleLazyObject)
+        self.assertEqual(
+            response.context["userplan"],
+            response.wsgi_request.userplan_snapshot.userplan,
+        )
+
+
+@override_settings(PLANS_STATUS_CACHE=True)
+class UserPlanStatusCacheTestCase(TestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def setUp(self):
+        get_cache().delete_many(
+            [
+                status_cache.make_key(pk)
+                for pk in User.objects.values_list("pk", flat=True)
+            ]
+        )
+        self.user = User.objects.get(username="test1")
+
+    def test_read_through(self):
+        with self.assertNumQueries(1):
+            status = get_user_plan_status(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_plan_status(self.user.pk), status)
+        self.assertEqual(status.plan_id, self.user.userplan.plan_id)
+        self.assertEqual(status.active, self.user.userplan.active)
+        self.assertEqual(status.is_expired(), self.user.userplan.is_expired())
+        self.assertIsNone(status.payment_provider)
+        self.assertFalse(status.has_automatic_renewal())
+
+    def test_invalidated_on_change(self):
+        get_user_plan_status(self.user)
+        userplan = self.user.userplan
+        with self.captureOnCommitCallbacks(execute=True):
+            userplan.deactivate()
+        self.assertFalse(get_user_plan_status(self.user).is_active())
+        with self.assertNumQueries(0):
+            self.assertFalse(get_user_plan_status(self.user).is_active())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            userplan.extend_account(userplan.plan, Pricing.objects.get(pk=1))
+        status = get_user_plan_status(self.user)
+        self.assertEqual(status.expire, userplan.expire)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RecurringUserPlan.objects.create(
+                user_plan=userplan,
+                payment_provider="paypal",
+                renewal_triggered_by=RecurringUserPlan.RENEWAL_TRIGGERED_BY.TASK,
+                token_verified=True,
+                currency="EUR",
+            )
+        self.assertTrue(get_user_plan_status(self.user).has_automatic_renewal())
+        with self.captureOnCommitCallbacks(execute=True):
+            userplan.recurring.delete()
+        self.assertIsNone(get_user_plan_status(self.user).payment_provider)
+
+    def test_rolled_back_change_is_not_cached(self):
+        status = get_user_plan_status(self.user)
+        userplan = self.user.userplan
+        with self.captureOnCommitCallbacks(execute=False):
+            userplan.deactivate()
+        self.assertEqual(get_user_plan_status(self.user), status)
+
+    def test_read_before_commit_not_cached(self):
+        userplan = self.user.userplan
+        userplan.active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            userplan.save()
+        stale = status_cache.load([self.user.pk])
+        userplan.active = False
+        with self.captureOnCommitCallbacks() as callbacks:
+            userplan.save()
+
+        def load_then_commit(*args, **kwargs):
+            # Status is read before the concurrent transaction commits
+            for callback in callbacks:
+                callback()
+            return stale
+
+        with mock.patch.object(status_cache, "load", side_effect=load_then_commit):
+            self.assertTrue(get_user_plan_status(self.user).is_active())
+        self.assertFalse(get_user_plan_status(self.user).is_active())
+        self.assertEqual(status_cache.audit(), [])
+
+    def test_bulk_expire(self):
+        userplan = self.user.userplan
+        userplan.expire = date.today() - timedelta(days=1)
+        userplan.active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            userplan.save()
+        self.assertTrue(get_user_plan_status(self.user).is_active())
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.expire_account(bulk=True)
+        self.assertFalse(get_user_plan_status(self.user).is_active())
+
+    def test_commit_callbacks_out_of_order(self):
+        userplan = self.user.userplan
+        userplan.active = False
+        with self.captureOnCommitCallbacks() as first:
+            userplan.save()
+        get_user_plan_status(self.user)
+        userplan.active = True
+        with self.captureOnCommitCallbacks() as second:
+            userplan.save()
+        # Callback of older change runs last
+        for callback in second + first:
+            callback()
+        self.assertTrue(get_user_plan_status(self.user).is_active())
+
+    def test_warm_and_audit(self):
+        out = StringIO()
+        call_command("warm_userplan_status_cache", stdout=out)
+        count = UserPlan.objects.count()
+        self.assertIn(f"{count} statuses cached", out.getvalue())
+        with self.assertNumQueries(0):
+            get_user_plan_status(self.user)
+
+        UserPlan.objects.filter(pk=self.user.userplan.pk).update(
+            active=not self.user.userplan.active
+        )
+        with self.assertRaises(CommandError):
+            call_command("warm_userplan_status_cache", "--audit", stdout=out)
+        self.assertEqual(len(status_cache.audit()), 1)
+        call_command("warm_userplan_status_cache", stdout=out)
+        call_command("warm_userplan_status_cache", "--audit", stdout=out)
+        self.assertIn("All cached statuses are up to date", out.getvalue())
+
+    @override_settings(PLANS_STATUS_CACHE=False)
+    def test_cache_disabled(self):
+        get_user_plan_status(self.user)
+        with self.assertNumQueries(1):
+            get_user_plan_status(self.user)
+
+
 class TestInvoice(TestCase):
     fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
 
@@ -365,6 +1002,55 @@ class TestInvoice(TestCase):
         i.issued = date(2010, 5, 30)
         self.assertEqual(i.get_full_number(), "2010.123.05")
 
+    def test_invoice_number_formatter_matches_template(self):
+        i = Invoice(
+            number=1234,
+            issued=date(2010, 5, 30),
+            buyer_name="Foo & Bar",
+            type=Invoice.INVOICE_TYPES.PROFORMA,
+        )
+        for format in [
+            DEFAULT_INVOICE_NUMBER_FORMAT,
+            "{{ invoice.issued|date:'Y' }}.{{invoice.number}}.{{ invoice.issued|date:\"m\" }}",
+            "{{ invoice.buyer_name }}/{{ invoice.get_type_display }}/{{ invoice.nonexistent }}",
+            "FV-{{ invoice.number }}-{% if invoice.type == invoice.INVOICE_TYPES.PROFORMA %}PF{% else %}FV{% endif %}",
+            "{{ invoice.issued|date:'N j, Y' }}",
+        ]:
+            with self.subTest(format=format):
+                formatter = InvoiceNumberFormatter(format)
+                self.assertTrue(formatter.is_fast)
+                self.assertEqual(
+                    formatter(i),
+                    Template(format).render(Context({"invoice": i})),
+                )
+
+    def test_invoice_number_formatter_fallback(self):
+        i = Invoice(number=123, issued=date(2010, 5, 30))
+        for format in [
+            "{{ invoice.number|add:1000 }}",
+            "{% if invoice.number > 100 %}B{% endif %}{{ invoice.number }}",
+            "{# comment #}{{ invoice.number }}",
+            "{{ invoice.save }}",
+        ]:
+            with self.subTest(format=format):
+                formatter = InvoiceNumberFormatter(format)
+                self.assertEqual(formatter.is_fast, format == "{{ invoice.save }}")
+                self.assertEqual(
+                    formatter(i),
+                    Template(format).render(Context({"invoice": i})),
+                )
+
+    def test_invoice_number_formatter_cached(self):
+        with self.settings(PLANS_INVOICE_NUMBER_FORMAT="{{ invoice.number }}/A"):
+            formatter = get_invoice_number_formatter()
+            self.assertIs(get_invoice_number_formatter(), formatter)
+            self.assertTrue(formatter.is_fast)
+            with self.settings(PLANS_INVOICE_NUMBER_FAST_FORMAT=False):
+                self.assertFalse(get_invoice_number_formatter().is_fast)
+                self.assertEqual(Invoice(number=5).get_full_number(), "5/A")
+        with self.settings(PLANS_INVOICE_NUMBER_FORMAT="{{ invoice.number }}/B"):
+            self.assertEqual(Invoice(number=5).get_full_number(), "5/B")
+
     def test_set_issuer_invoice_data_raise(self):
         issdata = settings.PLANS_INVOICE_ISSUER
         del settings.PLANS_INVOICE_ISSUER
@@ -424,6 +1110,214 @@ class TestInvoice(TestCase):
         self.assertEqual(i.number, 1)
         self.assertEqual(i.full_number, "1/FV/05/2010")
 
+    @override_settings(PLANS_INVOICE_NUMBER_FORMAT=DEFAULT_INVOICE_NUMBER_FORMAT)
+    def test_invoice_save_single_write(self):
+        o = Order.objects.all()[0]
+        day = date(2010, 5, 3)
+        i = Invoice(issued=day, selling_date=day, payment_date=day)
+        i.copy_from_order(o)
+        i.set_issuer_invoice_data()
+        i.set_buyer_invoice_data(o.user.billinginfo)
+        i.clean()
+        with CaptureQueriesContext(connection) as queries:
+            i.save()
+        invoice_queries = [
+            query["sql"] for query in queries if "plans_invoice" in query["sql"]
+        ]
+        self.assertEqual(len(invoice_queries), 1)
+        self.assertTrue(invoice_queries[0].startswith("INSERT"))
+        i.refresh_from_db()
+        self.assertEqual(i.full_number, "1/FV/05/2010")
+
+    def make_invoice(self, order, day=date(2010, 5, 3)):
+        i = Invoice(issued=day, selling_date=day, payment_date=day)
+        i.copy_from_order(order)
+        i.set_issuer_invoice_data()
+        i.set_buyer_invoice_data(order.user.billinginfo)
+        return i
+
+    def test_initial_number_not_computed_for_existing_sequence(self):
+        clear_sequence_cache()
+        self.addCleanup(clear_sequence_cache)
+        o = Order.objects.all()[0]
+        with CaptureQueriesContext(connection) as queries:
+            i = self.make_invoice(o)
+            i.clean()
+        # New sequence, initial number is computed from older invoices
+        self.assertTrue(
+            [q for q in queries if q["sql"].startswith('SELECT "plans_invoice"')]
+        )
+        i.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            i = self.make_invoice(o)
+            i.clean()
+        self.assertEqual(len(queries), 1)
+        self.assertIn("sequences_sequence", queries[0]["sql"])
+        i.save()
+        self.assertEqual(i.number, 2)
+
+    def test_existing_sequence_cached(self):
+        clear_sequence_cache()
+        self.addCleanup(clear_sequence_cache)
+        o = Order.objects.all()[0]
+        i = self.make_invoice(o)
+        i.clean()
+        with self.captureOnCommitCallbacks(execute=True):
+            i.save()
+        with self.assertNumQueries(0):
+            i = self.make_invoice(o)
+            i.clean()
+        i.save()
+        self.assertEqual(i.number, 2)
+
+        # Sequence of the next month is not known yet
+        with self.assertNumQueries(2):
+            self.make_invoice(o, date(2010, 6, 1)).clean()
+
+    def test_rolled_back_sequence_not_cached(self):
+        clear_sequence_cache()
+        self.addCleanup(clear_sequence_cache)
+        o = Order.objects.all()[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                i = self.make_invoice(o)
+                i.clean()
+                i.save()
+                transaction.set_rollback(True)
+        with self.assertNumQueries(2):
+            self.make_invoice(o).clean()
+
+    @override_settings(PLANS_INVOICE_NUMBER_FORMAT=DEFAULT_INVOICE_NUMBER_FORMAT)
+    def test_invoice_full_number_from_datetime(self):
+        o = Order.objects.all()[0]
+        day = datetime(2010, 5, 31, 23, 0, tzinfo=timezone.utc)
+        i = Invoice(issued=day, selling_date=day, payment_date=day)
+        i.copy_from_order(o)
+        i.set_issuer_invoice_data()
+        i.set_buyer_invoice_data(o.user.billinginfo)
+        i.clean()
+        i.save()
+        self.assertEqual(i.issued, date(2010, 5, 31))
+        self.assertEqual(i.full_number, "1/FV/05/2010")
+
+    @freeze_time("2010-05-03")
+    @override_settings(PLANS_INVOICE_NUMBER_FORMAT=DEFAULT_INVOICE_NUMBER_FORMAT)
+    def test_bulk_create_invoices(self):
+        billing_infos = baker.make(BillingInfo, user__email="foo@bar.cz", _quantity=4)
+        orders = [
+            baker.make(
+                Order,
+                user=billing_info.user,
+                amount=10,
+                completed=datetime(2010, 5, 2, tzinfo=timezone.utc),
+            )
+            for billing_info in billing_infos
+        ]
+        # user without billing info is skipped
+        orders.append(
+            baker.make(
+                Order,
+                user__email="bar@bar.cz",
+                amount=10,
+                completed=datetime(2010, 5, 2, tzinfo=timezone.utc),
+            )
+        )
+        Invoice.create(orders[0], Invoice.INVOICE_TYPES.INVOICE)
+        mail.outbox = []
+
+        with CaptureQueriesContext(connection) as queries:
+            invoices = Invoice.bulk_create_invoices(
+                Order.objects.filter(pk__in=[o.pk for o in orders[1:]]).order_by("pk"),
+                Invoice.INVOICE_TYPES.INVOICE,
+            )
+        self.assertEqual(
+            len(
+                [
+                    q
+                    for q in queries
+                    if q["sql"].startswith('INSERT INTO "plans_invoice"')
+                ]
+            ),
+            1,
+        )
+        # existence check and reservation of the block of numbers
+        self.assertEqual(
+            len([q for q in queries if "sequences_sequence" in q["sql"]]),
+            2 if connection.vendor == "postgresql" else 3,
+        )
+        # older invoices are not scanned, sequence exists already
+        self.assertFalse(
+            [q for q in queries if q["sql"].startswith('SELECT "plans_invoice"')]
+        )
+        self.assertEqual([invoice.order for invoice in invoices], orders[1:4])
+        self.assertEqual([invoice.number for invoice in invoices], [2, 3, 4])
+        self.assertEqual(
+            [invoice.full_number for invoice in invoices],
+            ["2/FV/05/2010", "3/FV/05/2010", "4/FV/05/2010"],
+        )
+        self.assertEqual(
+            list(
+                Invoice.invoices.filter(pk__in=[i.pk for i in invoices]).values_list(
+                    "full_number", flat=True
+                )
+            ),
+            ["2/FV/05/2010", "3/FV/05/2010", "4/FV/05/2010"],
+        )
+        self.assertEqual(len(mail.outbox), 3)
+
+        # Sequence continues after bulk created numbers
+        Invoice.create(orders[0], Invoice.INVOICE_TYPES.INVOICE)
+        self.assertEqual(
+            Invoice.invoices.order_by("number").last().full_number, "5/FV/05/2010"
+        )
+
+    @freeze_time("2010-05-03")
+    @override_settings(
+        PLANS_INVOICE_NUMBER_FORMAT="{{ invoice.number }}/{{ invoice.id }}/{{ invoice.created|date:'Y' }}"
+    )
+    def test_invoice_full_number_with_id(self):
+        o = Order.objects.all()[0]
+        i = self.make_invoice(o)
+        i.clean()
+        i.save()
+        self.assertEqual(i.full_number, "1/%s/2010" % i.pk)
+        i.refresh_from_db()
+        self.assertEqual(i.full_number, "1/%s/2010" % i.pk)
+
+        Order.objects.filter(pk=o.pk).update(
+            completed=datetime(2010, 5, 2, tzinfo=timezone.utc)
+        )
+        mail.outbox = []
+        invoices = Invoice.bulk_create_invoices(
+            Order.objects.filter(pk=o.pk), Invoice.INVOICE_TYPES.INVOICE
+        )
+        self.assertEqual(
+            Invoice.invoices.get(pk=invoices[0].pk).full_number,
+            "2/%s/2010" % invoices[0].pk,
+        )
+        self.assertEqual(len(mail.outbox), 1)
+
+    @freeze_time("2010-05-03 23:30")
+    @override_settings(
+        PLANS_INVOICE_NUMBER_FORMAT="{{ invoice.number }}/{{ invoice.created|date:'d/m/Y' }}",
+        TIME_ZONE="Europe/Prague",
+    )
+    def test_invoice_full_number_created(self):
+        o = Order.objects.all()[0]
+        i = self.make_invoice(o)
+        i.clean()
+        with CaptureQueriesContext(connection) as queries:
+            i.save()
+        self.assertEqual(len([q for q in queries if "plans_invoice" in q["sql"]]), 1)
+        self.assertEqual(i.full_number, "1/04/05/2010")
+        formatter = InvoiceNumberFormatter(settings.PLANS_INVOICE_NUMBER_FORMAT)
+        self.assertTrue(formatter.is_fast)
+        self.assertEqual(
+            formatter(i),
+            InvoiceNumberFormatter(settings.PLANS_INVOICE_NUMBER_FORMAT, fast=False)(i),
+        )
+
     def test_invoice_number_daily(self):
         settings.PLANS_INVOICE_NUMBER_FORMAT = (
             "{{ invoice.number }}/{% if "
@@ -1108,6 +2002,106 @@ class OrderTestCase(TestCase):
         self.assertEqual(o.total(), Decimal("151.29"))
 
 
+class OrderTotalsTestCase(TestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def setUp(self):
+        self.user = User.objects.get(username="test1")
+        self.plan = Plan.objects.get(pk=3)
+        self.plan.price_per_student = Decimal("0.50")
+        self.plan.save()
+        pricing = Pricing.objects.get(pk=1)
+        self.orders = [
+            Order.objects.create(
+                user=self.user, plan=self.plan, pricing=pricing, amount=Decimal("10")
+            ),
+            Order.objects.create(
+                user=self.user,
+                plan=self.plan,
+                pricing=pricing,
+                amount=Decimal("10.50"),
+                tax=Decimal("23"),
+                branches_number=3,
+                students_number=7,
+                first_time_fees=Decimal("5.25"),
+            ),
+            Order.objects.create(
+                user=self.user,
+                plan=self.plan,
+                amount=Decimal("12.34"),
+                tax=Decimal("8"),
+                branches_number=2,
+            ),
+            Order.objects.create(
+                user=self.user,
+                plan=self.plan,
+                pricing=pricing,
+                amount=Decimal("1"),
+                tax=Decimal("0"),
+                branches_number=0,
+                students_number=0,
+            ),
+        ]
+
+    def test_with_totals(self):
+        with self.assertNumQueries(1):
+            orders = {order.pk: order for order in Order.objects.with_totals()}
+        for order in orders.values():
+            self.assertEqual(order.gross_amount, order.total())
+            self.assertEqual(order.tax_amount, order.tax_total())
+        order = orders[self.orders[1].pk]
+        self.assertEqual(order.net_amount, Decimal("40.25"))
+        self.assertEqual(order.gross_amount, Decimal("49.51"))
+
+    def test_total_gross_saved(self):
+        for order in self.orders:
+            order.refresh_from_db()
+            self.assertEqual(order.total_gross, order.total())
+        order = self.orders[0]
+        order.amount = Decimal("20")
+        order.save(update_fields=["amount"])
+        order.refresh_from_db()
+        self.assertEqual(order.total_gross, Decimal("20.00"))
+        self.assertEqual(
+            Order.objects.filter(pk__in=[order.pk for order in self.orders]).aggregate(
+                total=Sum("total_gross")
+            )["total"],
+            sum(order.total() for order in self.orders),
+        )
+
+    def test_update_total_gross(self):
+        orders = Order.objects.filter(pk__in=[order.pk for order in self.orders])
+        orders.update(total_gross=None)
+        self.assertEqual(orders.update_total_gross(), len(self.orders))
+        for order in self.orders:
+            order.refresh_from_db()
+            self.assertEqual(order.total_gross, order.total())
+
+    def test_total_gross_price_per_student_changed(self):
+        plan = Plan.objects.get(pk=self.plan.pk)
+        plan.price_per_student = Decimal("2.00")
+        plan.save()
+        for order in self.orders:
+            order.refresh_from_db()
+            self.assertEqual(order.total_gross, order.total())
+        self.assertEqual(self.orders[1].total_gross, Decimal("62.42"))
+
+        plan.name = "Renamed"
+        with CaptureQueriesContext(connection) as queries:
+            plan.save()
+        self.assertFalse([q for q in queries if Order._meta.db_table in q["sql"]])
+
+    def test_admin_sorting(self):
+        # Fixtures are loaded without save()
+        Order.objects.update_total_gross()
+        self.client.force_login(self.user)
+        # Ordering by "Total Amount" column
+        response = self.client.get(reverse("admin:plans_order_changelist"), {"o": "9"})
+        totals = [order.total() for order in response.context["cl"].result_list]
+        self.assertEqual(totals, sorted(totals))
+        self.assertEqual(len(totals), Order.objects.count())
+
+
 class PlanChangePolicyTestCase(TestCase):
     fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
 
@@ -1116,25 +2110,196 @@ class PlanChangePolicyTestCase(TestCase):
 
     def test_calculate_day_cost(self):
         plan = Plan.objects.get(pk=5)
-        self.assertEqual(self.policy._calculate_day_cost(plan, 13), Decimal("6.67"))
+        self.assertEqual(
+            self.policy._calculate_day_cost(None, plan, 13), Decimal("6.67")
+        )
 
     def test_get_change_price(self):
         p1 = Plan.objects.get(pk=3)
         p2 = Plan.objects.get(pk=4)
-        self.assertEqual(self.policy.get_change_price(p1, p2, 23), Decimal("7.82"))
-        self.assertEqual(self.policy.get_change_price(p2, p1, 23), None)
+        self.assertEqual(
+            self.policy.get_change_price(None, p1, p2, 23), Decimal("7.82")
+        )
+        self.assertEqual(self.policy.get_change_price(None, p2, p1, 23), None)
 
     def test_get_change_price1(self):
         p1 = Plan.objects.get(pk=3)
         p2 = Plan.objects.get(pk=4)
-        self.assertEqual(self.policy.get_change_price(p1, p2, 53), Decimal("18.02"))
-        self.assertEqual(self.policy.get_change_price(p2, p1, 53), None)
+        self.assertEqual(
+            self.policy.get_change_price(None, p1, p2, 53), Decimal("18.02")
+        )
+        self.assertEqual(self.policy.get_change_price(None, p2, p1, 53), None)
 
     def test_get_change_price2(self):
         p1 = Plan.objects.get(pk=3)
         p2 = Plan.objects.get(pk=4)
-        self.assertEqual(self.policy.get_change_price(p1, p2, -53), None)
-        self.assertEqual(self.policy.get_change_price(p1, p2, 0), None)
+        self.assertEqual(self.policy.get_change_price(None, p1, p2, -53), None)
+        self.assertEqual(self.policy.get_change_price(None, p1, p2, 0), None)
+
+
+class ChangePricesTestCase(TestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def setUp(self):
+        self.policy = PlanChangePolicy()
+        self.user = User.objects.get(username="test1")
+        self.userplan = UserPlan.objects.select_related("plan").get(user=self.user)
+        self.userplan.plan = Plan.objects.get(pk=3)
+        self.userplan.branches = 2
+
+    def test_get_change_prices(self):
+        plans = list(Plan.objects.all())
+        with self.assertNumQueries(1):
+            prices = self.policy.get_change_prices(self.userplan, plans, 23)
+        for plan in plans:
+            self.assertEqual(
+                prices[plan.pk],
+                self.policy.get_change_price(
+                    self.userplan, self.userplan.plan, plan, 23
+                ),
+            )
+        self.assertEqual(prices[4], Decimal("15.18"))
+        self.assertIsNone(prices[3])
+
+    def test_no_period(self):
+        plans = list(Plan.objects.all())
+        with self.assertNumQueries(0):
+            prices = self.policy.get_change_prices(self.userplan, plans, 0)
+        self.assertEqual(set(prices.values()), {None})
+
+    def test_upgrade_view(self):
+        self.userplan.expire = date.today() + timedelta(days=20)
+        self.userplan.save()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("upgrade_plan"))
+        plan_list = list(response.context["plan_list"])
+        change_prices = response.context["plan_change_prices"]
+        self.assertEqual([plan for plan, price in change_prices], plan_list)
+        prices = get_change_prices(self.userplan, plan_list)
+        self.assertEqual(
+            dict(change_prices), {plan: prices[plan.pk] for plan in plan_list}
+        )
+        self.assertContains(response, 'class="change_price"')
+
+    def test_custom_get_change_price(self):
+        class FlatChangePolicy(PlanChangePolicy):
+            def get_change_price(self, userplan, plan_old, plan_new, period):
+                return Decimal("5.00") if plan_new.pk == 4 else None
+
+        prices = FlatChangePolicy().get_change_prices(
+            self.userplan, Plan.objects.all(), 23
+        )
+        self.assertEqual(prices[4], Decimal("5.00"))
+        self.assertIsNone(prices[3])
+        with mock.patch(
+            "plans.plan_change.get_policy", return_value=FlatChangePolicy()
+        ):
+            self.assertEqual(
+                get_change_price(self.userplan, Plan.objects.get(pk=4)),
+                Decimal("5.00"),
+            )
+
+
+class PriceChangeSimulationTestCase(TestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def setUp(self):
+        self.today = date(2024, 1, 1)
+        self.plan = Plan.objects.get(pk=3)
+        self.userplans = UserPlan.objects.filter(user__username__in=["test1", "test2"])
+        self.userplans.update(
+            plan=self.plan,
+            expire=self.today + timedelta(days=23),
+            active=True,
+            branches=2,
+        )
+        self.userplan = UserPlan.objects.get(user__username="test1")
+        # Grandfathered amount below catalog price 10.00
+        self.recurring = baker.make(
+            RecurringUserPlan,
+            user_plan=self.userplan,
+            pricing_id=1,
+            amount=Decimal("9.00"),
+            tax=Decimal("23"),
+            branches_number=2,
+            students_number=0,
+        )
+
+    def simulate(self, **kwargs):
+        return list(
+            PriceChangeSimulation(today=self.today, userplans=self.userplans, **kwargs)
+        )
+
+    def test_impact(self):
+        with self.assertNumQueries(3):
+            (impact,) = self.simulate(pricing_prices={1: "12.00"})
+        self.assertEqual(impact.plan, self.plan)
+        self.assertEqual(impact.subscriptions, 2)
+        self.assertEqual(impact.expiring_subscriptions, 2)
+        self.assertEqual(impact.recurring_subscriptions, 1)
+        # Renewal order of 2 branches with 23 % tax
+        self.assertEqual(impact.renewal_old, Decimal("22.14"))
+        self.assertEqual(impact.renewal_new, Decimal("29.52"))
+        self.assertEqual(impact.renewal_diff, Decimal("7.38"))
+        self.assertEqual(
+            impact.renewal_old,
+            Order(
+                plan=self.plan,
+                pricing_id=1,
+                amount=self.recurring.amount,
+                tax=self.recurring.tax,
+                branches_number=self.recurring.branches_number,
+                students_number=self.recurring.students_number,
+            ).total(),
+        )
+        # Same rounding as plan change price
+        day_cost = PlanChangePolicy()._calculate_day_cost(self.userplan, self.plan, 23)
+        self.assertEqual(impact.remaining_old, 2 * 23 * day_cost)
+        self.assertEqual(impact.remaining_new, 2 * 23 * Decimal("0.80"))
+
+    def test_price_per_student(self):
+        Plan.objects.filter(pk=3).update(plan_for="schools", price_per_student=1)
+        self.userplans.update(students=10)
+        RecurringUserPlan.objects.filter(pk=self.recurring.pk).update(
+            students_number=10
+        )
+        (impact,) = self.simulate(prices_per_student={3: "2"})
+        self.assertEqual(impact.renewal_old, Decimal("34.44"))
+        self.assertEqual(impact.renewal_new, Decimal("46.74"))
+
+    def test_unchanged_price(self):
+        (impact,) = self.simulate(pricing_prices={2: "60"})
+        self.assertEqual(impact.renewal_old, Decimal("22.14"))
+        self.assertEqual(impact.renewal_diff, Decimal("0"))
+
+    def test_inactive_and_expired(self):
+        self.userplans.exclude(pk=self.userplan.pk).update(active=False)
+        UserPlan.objects.filter(pk=self.userplan.pk).update(
+            expire=self.today - timedelta(days=1)
+        )
+        self.assertEqual(self.simulate(pricing_prices={1: "12.00"}), [])
+
+    def test_csv(self):
+        simulation = PriceChangeSimulation(
+            {1: "12.00"}, today=self.today, userplans=self.userplans
+        )
+        lines = list(iter_simulation_csv(simulation))
+        self.assertEqual(lines[0], ",".join(CSV_HEADER) + "\r\n")
+        self.assertEqual(
+            lines[1:],
+            ["3,Standard,2,2,1,22.14,29.52,7.38,30.82,36.80,5.98\r\n"],
+        )
+
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            "simulate_price_change", "--pricing", "1=12.00", "2=60", stdout=out
+        )
+        self.assertTrue(out.getvalue().startswith(",".join(CSV_HEADER)))
+        with self.assertRaises(CommandError):
+            call_command("simulate_price_change", "--pricing", "1", stdout=out)
+        with self.assertRaises(CommandError):
+            call_command("simulate_price_change", "--pricing", "1=abc", stdout=out)
 
 
 class StandardPlanChangePolicyTestCase(TestCase):
@@ -1146,8 +2311,11 @@ class StandardPlanChangePolicyTestCase(TestCase):
     def test_get_change_price(self):
         p1 = Plan.objects.get(pk=3)
         p2 = Plan.objects.get(pk=4)
-        self.assertEqual(self.policy.get_change_price(p1, p2, 23), Decimal("8.60"))
-        self.assertEqual(self.policy.get_change_price(p2, p1, 23), None)
+        # UPGRADE_PERCENT_RATE and UPGRADE_CHARGE are not applied in this fork
+        self.assertEqual(
+            self.policy.get_change_price(None, p1, p2, 23), Decimal("7.82")
+        )
+        self.assertEqual(self.policy.get_change_price(None, p2, p1, 23), None)
 
 
 class EUTaxationPolicyTestCase(TestCase):
@@ -1217,6 +2385,167 @@ class EUTaxationPolicyTestCase(TestCase):
             )
 
 
+@override_settings(PLANS_VIES_CACHE=True)
+class VIESCacheTestCase(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        vies_cache.reset_stats()
+        self.vies = FakeVIES(valid=["CZ48136450"])
+        vies_cache.checker = self.vies
+        self.addCleanup(setattr, vies_cache, "checker", None)
+        self.addCleanup(get_cache().clear)
+
+    def test_cached(self):
+        self.assertTrue(vies_cache.check("CZ48136450"))
+        self.assertTrue(vies_cache.check("cz 4813 6450"))
+        self.assertFalse(vies_cache.check("CZ12345678"))
+        self.assertFalse(vies_cache.check("CZ12345678"))
+        self.assertEqual(self.vies.calls, ["CZ48136450", "CZ12345678"])
+        stats = vies_cache.stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["vies_calls"], 2)
+
+    @override_settings(PLANS_VIES_CACHE=False)
+    def test_disabled(self):
+        vies_cache.check("CZ48136450")
+        vies_cache.check("CZ48136450")
+        self.assertEqual(len(self.vies.calls), 2)
+        self.assertIsNone(vies_cache.get("CZ48136450"))
+
+    def test_ttl(self):
+        with freeze_time("2024-01-01"):
+            vies_cache.check("CZ48136450")
+            vies_cache.check("CZ12345678")
+        with freeze_time("2024-01-03"):
+            # Negative result expires after a day, positive after a week
+            vies_cache.check("CZ48136450")
+            vies_cache.check("CZ12345678")
+            self.assertEqual(
+                self.vies.calls, ["CZ48136450", "CZ12345678", "CZ12345678"]
+            )
+        with freeze_time("2024-01-09"):
+            vies_cache.check("CZ48136450")
+            self.assertEqual(len(self.vies.calls), 4)
+
+    def test_stale_if_error(self):
+        with freeze_time("2024-01-01"):
+            vies_cache.check("CZ48136450")
+        self.vies.down = True
+        with freeze_time("2024-01-10"):
+            with self.assertLogs("plans.taxation.eu.vies", "WARNING"):
+                self.assertTrue(vies_cache.check("CZ48136450"))
+        with freeze_time("2024-03-01"):
+            with self.assertRaises(URLError):
+                vies_cache.check("CZ48136450")
+        with self.assertRaises(URLError):
+            vies_cache.check("CZ12345678")
+        stats = vies_cache.stats()
+        self.assertEqual(stats["stale_hits"], 1)
+        self.assertEqual(stats["errors"], 3)
+
+    @override_settings(PLANS_VIES_CACHE_STALE_WHILE_REVALIDATE=True)
+    def test_stale_while_revalidate(self):
+        with freeze_time("2024-01-01"):
+            vies_cache.check("CZ48136450")
+        self.vies.valid = set()
+        with freeze_time("2024-01-10"):
+            self.assertTrue(vies_cache.check("CZ48136450"))
+            vies_cache.wait()
+            self.assertFalse(vies_cache.get("CZ48136450")["valid"])
+            self.assertFalse(vies_cache.check("CZ48136450"))
+        self.assertEqual(len(self.vies.calls), 2)
+        self.assertEqual(vies_cache.stats()["revalidations"], 1)
+
+    def test_tax_rate(self):
+        policy = EUTaxationPolicy()
+        with self.settings(PLANS_TAX=Decimal("23.0"), PLANS_TAX_COUNTRY="PL"):
+            self.assertEqual(policy.get_tax_rate("CZ48136450", "CZ"), (None, True))
+            self.assertEqual(policy.get_tax_rate("CZ48136450", "CZ"), (None, True))
+            self.assertEqual(len(self.vies.calls), 1)
+
+            self.vies.down = True
+            with self.assertLogs("plans.taxation.eu.vies", "ERROR"):
+                self.assertEqual(
+                    policy.get_tax_rate("CZ12345678", "CZ"), (Decimal("21"), False)
+                )
+            self.assertEqual(policy.get_tax_rate("CZ48136450", "CZ"), (None, True))
+
+    @override_settings(PLANS_VIES_CHECKER="plans.tests.tests.always_valid_vies")
+    def test_checker_setting(self):
+        self.addCleanup(setattr, vies_cache, "checker", None)
+        vies_cache.checker = None
+        self.assertTrue(vies_cache.check("CZ12345678"))
+
+
+class RevalidateTaxNumbersTestCase(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.vies = FakeVIES(valid=["CZ48136450", "EL090145420"])
+        vies_cache.checker = self.vies
+        self.addCleanup(setattr, vies_cache, "checker", None)
+        self.addCleanup(get_cache().clear)
+        self.billing_infos = [
+            baker.make(BillingInfo, tax_number=tax_number, country=country)
+            for tax_number, country in [
+                ("CZ48136450", "CZ"),
+                ("", "CZ"),
+                ("DE136695976", "DE"),
+                ("48136450", "CZ"),  # duplicate
+                ("123456", "US"),  # not in EU
+                ("090145420", "GR"),
+            ]
+        ]
+
+    def test_revalidate(self):
+        progress = []
+        stats = tasks.revalidate_tax_numbers(
+            chunk_size=2, progress=lambda stats: progress.append(stats.last_pk)
+        )
+        self.assertEqual(
+            sorted(self.vies.calls), ["CZ48136450", "DE136695976", "EL090145420"]
+        )
+        self.assertEqual(stats.rows, 5)
+        self.assertEqual(stats.checked, 3)
+        self.assertEqual(stats.valid, 2)
+        self.assertEqual(stats.invalid, 1)
+        self.assertEqual(
+            progress,
+            [
+                self.billing_infos[2].pk,
+                self.billing_infos[4].pk,
+                self.billing_infos[5].pk,
+            ],
+        )
+        self.assertTrue(vies_cache.get("CZ48136450")["valid"])
+        self.assertFalse(vies_cache.get("DE136695976")["valid"])
+
+    def test_revalidate_errors(self):
+        self.vies.down = True
+        with self.assertLogs("plans.tasks", "WARNING"):
+            stats = tasks.revalidate_tax_numbers()
+        self.assertEqual(stats.errors, 3)
+        self.assertIsNone(vies_cache.get("CZ48136450"))
+
+    def test_command_resume(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        checkpoint = os.path.join(directory.name, "checkpoint.json")
+        with open(checkpoint, "w") as f:
+            json.dump({"last_pk": self.billing_infos[3].pk}, f)
+        out = StringIO()
+        call_command("revalidate_vat_numbers", checkpoint=checkpoint, stdout=out)
+        self.assertEqual(self.vies.calls, ["EL090145420"])
+        self.assertFalse(os.path.exists(checkpoint))
+        output = out.getvalue()
+        self.assertIn(f"Resuming after billing info {self.billing_infos[3].pk}", output)
+        self.assertIn("Finished: 2 billing infos, 1 VAT IDs checked (1 valid", output)
+
+
+def always_valid_vies(tax_id):
+    return True
+
+
 class BillingInfoTestCase(TestCase):
     def test_clean_tax_number(self):
         with self.assertRaises(ValidationError):
@@ -1350,6 +2679,177 @@ class ValidatorsTestCase(TestCase):
         #     self.assertEqual(validator_object(user=None, quota_dict={'QUOTA_NAME': 365}), None)
 
 
+class StaffUsersCountValidator(ModelCountValidator):
+    code = "MAX_GALLERIES_COUNT"
+    model = User
+
+    def get_queryset(self, user):
+        return super().get_queryset(user).filter(is_staff=True)
+
+    def get_count_filter(self, user):
+        return Q(is_staff=True)
+
+
+class UsersCountValidator(ModelCountValidator):
+    code = "MAX_PHOTOS_PER_GALLERY"
+    model = User
+    required_to_activate = False
+
+    def get_count_filter(self, user):
+        return Q()
+
+
+staff_users_count_validator = StaffUsersCountValidator()
+users_count_validator = UsersCountValidator()
+
+
+@override_settings(
+    PLANS_VALIDATORS={
+        "MAX_GALLERIES_COUNT": "plans.tests.tests.staff_users_count_validator",
+        "MAX_PHOTOS_PER_GALLERY": "plans.tests.tests.users_count_validator",
+    }
+)
+class PlanValidationTestCase(TestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def setUp(self):
+        self.user = User.objects.get(username="test1")
+        self.plan = Plan.objects.get(pk=6)
+
+    def test_get_validators(self):
+        validators = get_validators()
+        self.assertIs(validators["MAX_GALLERIES_COUNT"], staff_users_count_validator)
+        self.assertIs(get_validators(), validators)
+
+    def test_batched_counts(self):
+        # One query for quota dict, one aggregate query for both validators
+        with self.assertNumQueries(2):
+            errors = plan_validation(self.user, self.plan)
+        self.assertEqual(
+            errors,
+            {
+                "required_to_activate": [
+                    "Limit of users exceeded. The limit is 1 items."
+                ],
+                "other": [],
+            },
+        )
+
+    def test_batched_counts_filtered(self):
+        validators = {"MAX_GALLERIES_COUNT": staff_users_count_validator}
+        with CaptureQueriesContext(connection) as queries:
+            counts = get_batched_counts(
+                self.user, validators, {"MAX_GALLERIES_COUNT": 1}
+            )
+        self.assertEqual(
+            counts,
+            {
+                "MAX_GALLERIES_COUNT": {
+                    "count": User.objects.filter(is_staff=True).count()
+                }
+            },
+        )
+        self.assertIn("WHERE", queries[0]["sql"])
+
+    def test_on_activation_error_not_caught(self):
+        with mock.patch.object(
+            staff_users_count_validator,
+            "on_activation",
+            side_effect=ValidationError("Not allowed"),
+        ):
+            with self.assertRaises(ValidationError):
+                plan_validation(self.user, self.plan, on_activation=True)
+
+    def test_unlimited_quota_not_counted(self):
+        # Plan 3 has MAX_PHOTOS_PER_GALLERY unlimited, MAX_GALLERIES_COUNT = 3
+        plan = Plan.objects.get(pk=3)
+        with self.assertNumQueries(2):
+            errors = plan_validation(self.user, plan)
+        self.assertEqual(errors, {"required_to_activate": [], "other": []})
+
+    def test_threads(self):
+        User.objects.update(is_staff=False)
+        User.objects.create(username="test3")
+        errors = plan_validation(self.user, self.plan, threads=2)
+        self.assertEqual(
+            errors,
+            {
+                "required_to_activate": [],
+                "other": ["Limit of users exceeded. The limit is 2 items."],
+            },
+        )
+
+    def test_threads_not_used_in_transaction(self):
+        with mock.patch("plans.validators.ThreadPoolExecutor") as executor:
+            plan_validation(self.user, self.plan, threads=2)
+            plan_validation(self.user, self.plan, on_activation=True, threads=2)
+        executor.assert_not_called()
+
+
+@override_settings(
+    PLANS_VALIDATORS={
+        "MAX_GALLERIES_COUNT": "plans.tests.tests.staff_users_count_validator",
+        "MAX_PHOTOS_PER_GALLERY": "plans.tests.tests.users_count_validator",
+    }
+)
+class PlanValidationThreadsTestCase(TransactionTestCase):
+    fixtures = ["initial_plan", "test_django-plans_auth", "test_django-plans_plans"]
+
+    def test_threads(self):
+        user = User.objects.get(username="test1")
+        plan = Plan.objects.get(pk=6)
+        with mock.patch(
+            "plans.validators.ThreadPoolExecutor", wraps=ThreadPoolExecutor
+        ) as executor:
+            errors = plan_validation(user, plan, threads=2)
+            # on_activation() is never run on worker threads
+            plan_validation(user, plan, on_activation=True, threads=2)
+        executor.assert_called_once_with(max_workers=2)
+        self.assertEqual(errors, plan_validation(user, plan, threads=0))
+
+
+class PlanValidationBulkTestCase(TestCase):
+    def setUp(self):
+        self.plan = baker.make("Plan")
+        quota = baker.make("Quota", codename="MAX_FOO_COUNT")
+        baker.make("PlanQuota", plan=self.plan, quota=quota, value=1)
+        self.users = baker.make("User", _quantity=3)
+        for user in self.users:
+            baker.make("UserPlan", user=user, plan=self.plan)
+        baker.make("foo.Foo", user=self.users[0], _quantity=2)
+        baker.make("foo.Foo", user=self.users[1])
+
+    def test_plan_validation_bulk(self):
+        # users, quota dict of the plan, grouped count of foos for each of two chunks
+        with self.assertNumQueries(4):
+            results = list(plan_validation_bulk(User.objects.all(), chunk_size=2))
+        self.assertEqual([user for user, errors in results], self.users)
+        self.assertEqual(
+            [errors["required_to_activate"] for user, errors in results],
+            [["Limit of foos exceeded. The limit is 1 items."], [], []],
+        )
+        for user in self.users:
+            self.assertEqual(
+                plan_validation(user),
+                dict(results)[user],
+            )
+
+    def test_plan_validation_bulk_list(self):
+        results = plan_validation_bulk(self.users)
+        self.assertEqual(next(results)[0], self.users[0])
+        self.assertEqual(len(list(results)), 2)
+
+    def test_validate_userplans_command(self):
+        out = StringIO()
+        call_command("validate_userplans", stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            f"\t{self.users[0].pk}\t{self.users[0]}\t"
+            "Limit of foos exceeded. The limit is 1 items.\n"
+            "3 accounts validated, 1 exceeding quotas\n",
+        )
+
+
 class BillingInfoViewTestCase(TestCase):
     fixtures = ["test_django-plans_auth"]
 
@@ -1417,6 +2917,36 @@ class BillingInfoViewTestCase(TestCase):
             response, '<option value="DE" selected>Germany</option>', html=True
         )
 
+    @override_settings(PLANS_GET_COUNTRY_FROM_IP=True)
+    def test_default_country_by_ip_cached(self):
+        """
+        Test, that GeoLite2 database is opened once and lookups are cached
+        """
+        geoip_reader.reset()
+        request = RequestFactory().get("/", REMOTE_ADDR="85.214.132.117")
+        with mock.patch.object(
+            geoip_reader, "lookup", wraps=geoip_reader.lookup
+        ) as lookup:
+            self.assertEqual(get_country_code(request), "DE")
+            reader = geoip_reader.reader
+            self.assertEqual(get_country_code(request), "DE")
+            self.assertEqual(lookup.call_count, 1)
+        self.assertIs(geoip_reader.get_reader(), reader)
+
+        # Forked process opens its own reader
+        with mock.patch("plans.utils.os.getpid", return_value=geoip_reader.pid + 1):
+            self.assertIsNot(geoip_reader.get_reader(), reader)
+
+    @override_settings(PLANS_GET_COUNTRY_FROM_IP=True, PLANS_DEFAULT_COUNTRY="PL")
+    def test_default_country_by_ip_invalid(self):
+        """
+        Test, that default country is used for invalid or unknown IP
+        """
+        request = RequestFactory().get("/", REMOTE_ADDR="invalid")
+        self.assertEqual(get_country_code(request), "PL")
+        request = RequestFactory().get("/", REMOTE_ADDR="127.0.0.1")
+        self.assertEqual(get_country_code(request), "PL")
+
     def test_default_country_by_ip_no_settings(self):
         """
         Test, that default country is not determined
@@ -1796,6 +3326,133 @@ class TasksTestCase(TestCase):
             mail.outbox[0].subject, "Your account foo bar has just expired"
         )
 
+    def test_expire_account_task_bulk(self):
+        today = date.today()
+        expired = [
+            baker.make(
+                "UserPlan",
+                user__email=f"foo{i}@bar.cz",
+                expire=today - timedelta(days=1),
+                active=True,
+            )
+            for i in range(5)
+        ]
+        not_expired = baker.make("UserPlan", user=self.user, expire=today, active=True)
+        deactivated = []
+        expired_signals = []
+
+        def on_deactivated(sender, user, **kwargs):
+            deactivated.append(user)
+
+        def on_expired(sender, user, **kwargs):
+            expired_signals.append(user)
+
+        account_deactivated.connect(on_deactivated)
+        account_expired.connect(on_expired)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(tasks.expire_accounts_bulk(batch_size=2), 5)
+        finally:
+            account_deactivated.disconnect(on_deactivated)
+            account_expired.disconnect(on_expired)
+
+        self.assertFalse(
+            UserPlan.objects.filter(pk__in=[u.pk for u in expired], active=True)
+        )
+        not_expired.refresh_from_db()
+        self.assertTrue(not_expired.active)
+        self.assertEqual(deactivated, [u.user for u in expired])
+        self.assertEqual(expired_signals, [u.user for u in expired])
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].to, ["foo0@bar.cz"])
+
+        # Running again does not expire nor notify anybody twice
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(tasks.expire_accounts_bulk(batch_size=2), 0)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_expire_account_task_bulk_rollback(self):
+        userplans = [
+            baker.make(
+                "UserPlan",
+                user__email=f"foo{i}@bar.cz",
+                expire=date.today() - timedelta(days=1),
+                active=True,
+            )
+            for i in range(3)
+        ]
+        deactivate = tasks.deactivate_expired_userplans
+
+        def deactivate_and_die(*args):
+            ids = deactivate(*args)
+            if userplans[2].pk in ids:
+                raise RuntimeError("Process died")
+            return ids
+
+        with mock.patch.object(
+            tasks, "deactivate_expired_userplans", side_effect=deactivate_and_die
+        ):
+            with self.assertRaises(RuntimeError):
+                with self.captureOnCommitCallbacks(execute=True):
+                    tasks.expire_accounts_bulk(batch_size=2)
+
+        # The first chunk is committed and notified, the unfinished one is rolled back
+        self.assertEqual(
+            list(UserPlan.objects.filter(active=True)),
+            [userplans[2]],
+        )
+        self.assertEqual(len(mail.outbox), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(tasks.expire_accounts_bulk(batch_size=2), 1)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_expire_account_task_bulk_died_before_notification(self):
+        userplans = [
+            baker.make(
+                "UserPlan",
+                user__email=f"foo{i}@bar.cz",
+                expire=date.today() - timedelta(days=1),
+                active=True,
+            )
+            for i in range(3)
+        ]
+        notify = tasks.notify_expired_userplans
+
+        def notify_and_die(userplans, using=None):
+            notify(userplans[:1], using)
+            raise RuntimeError("Process died")
+
+        with mock.patch.object(
+            tasks, "notify_expired_userplans", side_effect=notify_and_die
+        ):
+            with self.assertRaises(RuntimeError):
+                tasks.expire_accounts_bulk(batch_size=2)
+
+        # The first chunk is committed, but only one of its user plans was notified
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(list(tasks.get_pending_expired_userplans()), [userplans[1]])
+        self.assertEqual(tasks.expire_accounts_bulk(batch_size=2), 1)
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [["foo0@bar.cz"], ["foo1@bar.cz"], ["foo2@bar.cz"]],
+        )
+        self.assertFalse(tasks.get_pending_expired_userplans().exists())
+
+    def test_expire_account_task_bulk_no_returning(self):
+        userplan = baker.make(
+            "UserPlan",
+            user=self.user,
+            expire=date.today() - timedelta(days=1),
+            active=True,
+        )
+        with mock.patch.object(
+            connection.features, "can_return_columns_from_insert", False
+        ), self.captureOnCommitCallbacks(execute=True):
+            tasks.expire_account(bulk=True)
+        userplan.refresh_from_db()
+        self.assertFalse(userplan.active)
+        self.assertEqual(len(mail.outbox), 1)
+
     @override_settings(PLANS_EXPIRATION_REMIND=[3])
     def test_expire_account_task_notify(self):
         order = baker.make("Order", amount=10)
@@ -1820,3 +3477,198 @@ class TasksTestCase(TestCase):
             mail.outbox[0].subject,
             "Your account foo bar will expire in 3 days",
         )
+
+
+class TemplateEmailRendererTestCase(TestCase):
+    def setUp(self):
+        email_renderer.clear()
+        self.addCleanup(email_renderer.clear)
+
+    def send(self, **context):
+        send_template_email(
+            ["foo@bar.cz"],
+            "mail/expired_account_title.txt",
+            "mail/expired_account_body.txt",
+            {"user": "foo", "userplan": "bar", **context},
+            None,
+        )
+
+    def test_templates_cached(self):
+        with patch(
+            "plans.contrib.loader.get_template", wraps=loader.get_template
+        ) as get_template:
+            self.send()
+            self.send()
+        # title, body and probe for HTML body, only for the first e-mail
+        self.assertEqual(get_template.call_count, 3)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[1].subject, "Your account foo has just expired")
+        self.assertEqual(email_renderer.stats()["renders"], 2)
+        self.assertEqual(email_renderer.stats()["cached_templates"], 1)
+
+    def test_html_template_cached(self):
+        with patch(
+            "plans.contrib.loader.get_template", wraps=loader.get_template
+        ) as get_template:
+            title, body, html_body = email_renderer.render(
+                "mail/expired_account_title.txt",
+                "mail/expired_account_body.txt",
+                {"user": "foo", "userplan": "bar"},
+            )
+            self.assertIsNone(html_body)
+            email_renderer.get_templates(
+                "mail/expired_account_title.txt", "mail/expired_account_body.txt"
+            )
+        self.assertEqual(get_template.call_count, 3)
+
+    def test_site_cached(self):
+        self.send()
+        with self.assertNumQueries(0):
+            self.send()
+        self.assertIn("example.com", mail.outbox[1].body)
+
+    def test_site_change_clears_cache(self):
+        self.send()
+        Site.objects.filter(pk=settings.SITE_ID).update(domain="foo.example.com")
+        Site.objects.clear_cache()
+        Site.objects.get(pk=settings.SITE_ID).save()
+        self.send()
+        self.assertIn("foo.example.com", mail.outbox[1].body)
+
+    @override_settings(SITE_URL="https://plans.example.com", SITE_NAME="Plans")
+    def test_site_url(self):
+        with self.assertNumQueries(0):
+            self.send()
+        self.assertIn("https://plans.example.com", mail.outbox[0].body)
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    """
+    In-memory backend failing to send messages with given subject.
+    """
+
+    def __init__(self, fail_subject=None, fail_open=False, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_subject = fail_subject
+        self.fail_open = fail_open
+        self.opened = 0
+
+    def open(self):
+        if self.fail_open:
+            raise ConnectionRefusedError("Mail server down")
+        self.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.subject == self.fail_subject:
+                raise smtplib.SMTPRecipientsRefused({})
+        return super().send_messages(messages)
+
+
+@override_settings(PLANS_EMAIL_OUTBOX=True)
+class EmailOutboxTestCase(TestCase):
+    def setUp(self):
+        self.users = [
+            baker.make("User", email=f"foo{i}@bar.cz", username=f"foo{i}")
+            for i in range(3)
+        ]
+        for user in self.users:
+            baker.make("UserPlan", user=user, plan__name="Foo plan")
+
+    def queue_emails(self):
+        for user in self.users:
+            user.userplan.notify_expired()
+
+    def test_send_template_email_queues(self):
+        self.queue_emails()
+        self.assertEqual(len(mail.outbox), 0)
+        messages = OutboxEmail.objects.all()
+        self.assertEqual(len(messages), 3)
+        self.assertEqual(messages[0].recipients, ["foo0@bar.cz"])
+        self.assertEqual(messages[0].subject, "Your account foo0 has just expired")
+        self.assertEqual(messages[0].status, OutboxEmail.STATUS.PENDING)
+
+    def test_queued_email_rolled_back(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.queue_emails()
+                raise ValueError()
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_flush(self):
+        self.queue_emails()
+        backend = FlakyEmailBackend()
+        with patch("plans.tasks.get_connection", return_value=backend):
+            # select and bulk update of the batch, empty select, savepoints of both batches
+            with self.assertNumQueries(7):
+                self.assertEqual(tasks.flush_email_outbox(batch_size=3), (3, 0))
+        self.assertEqual(backend.opened, 1)
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [["foo0@bar.cz"], ["foo1@bar.cz"], ["foo2@bar.cz"]],
+        )
+        self.assertEqual(mail.outbox[0].subject, "Your account foo0 has just expired")
+        self.assertFalse(
+            OutboxEmail.objects.exclude(status=OutboxEmail.STATUS.SENT).exists()
+        )
+        self.assertEqual(tasks.flush_email_outbox(), (0, 0))
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_flush_in_batches(self):
+        self.queue_emails()
+        backend = FlakyEmailBackend()
+        with patch("plans.tasks.get_connection", return_value=backend):
+            self.assertEqual(tasks.flush_email_outbox(batch_size=2), (3, 0))
+        self.assertEqual(backend.opened, 2)
+        self.assertEqual(len(mail.outbox), 3)
+
+    @freeze_time("2024-01-01 12:00")
+    def test_retry_backoff(self):
+        self.queue_emails()
+        backend = FlakyEmailBackend(fail_subject="Your account foo1 has just expired")
+        with patch("plans.tasks.get_connection", return_value=backend):
+            self.assertEqual(tasks.flush_email_outbox(max_attempts=3), (2, 1))
+            failed = OutboxEmail.objects.get(status=OutboxEmail.STATUS.PENDING)
+            self.assertEqual(failed.recipients, ["foo1@bar.cz"])
+            self.assertEqual(failed.attempts, 1)
+            self.assertIn("SMTPRecipientsRefused", failed.last_error)
+            self.assertEqual(failed.next_attempt, now() + timedelta(seconds=60))
+
+            # Not retried before the delay passes
+            self.assertEqual(tasks.flush_email_outbox(max_attempts=3), (0, 0))
+
+            with freeze_time("2024-01-01 12:01"):
+                self.assertEqual(tasks.flush_email_outbox(max_attempts=3), (0, 1))
+            failed.refresh_from_db()
+            self.assertEqual(failed.attempts, 2)
+            self.assertEqual(
+                failed.next_attempt,
+                datetime(2024, 1, 1, 12, 3, tzinfo=timezone.utc),
+            )
+
+            with freeze_time("2024-01-01 12:03"):
+                with self.assertLogs("plans.tasks", "ERROR"):
+                    self.assertEqual(tasks.flush_email_outbox(max_attempts=3), (0, 1))
+            failed.refresh_from_db()
+            self.assertEqual(failed.status, OutboxEmail.STATUS.FAILED)
+            self.assertEqual(failed.attempts, 3)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_connection_failure(self):
+        self.queue_emails()
+        backend = FlakyEmailBackend(fail_open=True)
+        with patch("plans.tasks.get_connection", return_value=backend):
+            self.assertEqual(tasks.flush_email_outbox(), (0, 3))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            set(OutboxEmail.objects.values_list("status", "attempts")),
+            {(OutboxEmail.STATUS.PENDING, 1)},
+        )
+
+    def test_command(self):
+        self.queue_emails()
+        out = StringIO()
+        call_command("flush_email_outbox", stdout=out)
+        self.assertEqual(out.getvalue(), "3 e-mails sent, 0 e-mails failed\n")
+        self.assertEqual(len(mail.outbox), 3)
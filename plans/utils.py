@@ -1,3 +1,7 @@
+import functools
+import os
+import threading
+
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
@@ -11,19 +15,79 @@ def get_client_ip(request):
     return ip
 
 
+class GeoIPReader(object):
+    """
+    Process wide, lazily opened reader of the GeoLite2 database.
+
+    The database is memory mapped once per process. A process forked from a process with open
+    reader (e.g. a pre-forking web server worker) opens its own reader on first use.
+    Countries of looked up IP addresses are kept in LRU cache of ``PLANS_GEOIP_CACHE_SIZE`` entries.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reader = None
+        self.pid = None
+        self.cached_lookup = None
+
+    def get_reader(self):
+        if self.reader is None or self.pid != os.getpid():
+            with self.lock:
+                if self.reader is None or self.pid != os.getpid():
+                    import maxminddb
+                    from _maxminddb_geolite2 import geolite2_database
+
+                    self.reader = maxminddb.open_database(
+                        geolite2_database(), maxminddb.MODE_AUTO
+                    )
+                    self.pid = os.getpid()
+        return self.reader
+
+    def lookup(self, ip_address):
+        """
+        Returns ISO country code of the IP address or ``None``.
+        """
+        try:
+            ip_info = self.get_reader().get(ip_address)
+        except ValueError:
+            # Not a valid IP address
+            return None
+        if ip_info and "country" in ip_info:
+            return ip_info["country"]["iso_code"]
+        return None
+
+    def get_country_code(self, ip_address):
+        if self.cached_lookup is None:
+            self.cached_lookup = functools.lru_cache(
+                maxsize=getattr(settings, "PLANS_GEOIP_CACHE_SIZE", 10000)
+            )(self.lookup)
+        return self.cached_lookup(ip_address)
+
+    def reset(self):
+        """
+        Drops the reader (without closing it, it can be still used by parent process) and cached lookups.
+        """
+        self.lock = threading.Lock()
+        self.reader = None
+        self.pid = None
+        self.cached_lookup = None
+
+
+geoip_reader = GeoIPReader()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=geoip_reader.reset)
+
+
 def get_country_code(request):
     if getattr(settings, "PLANS_GET_COUNTRY_FROM_IP", False):
+        ip_address = get_client_ip(request)
         try:
-            from geolite2 import geolite2
-
-            reader = geolite2.reader()
-            ip_address = get_client_ip(request)
-            ip_info = reader.get(ip_address)
+            country_code = geoip_reader.get_country_code(ip_address)
         except ModuleNotFoundError:
-            ip_info = None
+            country_code = None
 
-        if ip_info and "country" in ip_info:
-            country_code = ip_info["country"]["iso_code"]
+        if country_code:
             return country_code
     return getattr(settings, "PLANS_DEFAULT_COUNTRY", None)
 
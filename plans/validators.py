@@ -1,6 +1,15 @@
+import operator
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from itertools import islice
+
 import six
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.signals import setting_changed
+from django.db import connections
+from django.db.models import Count, QuerySet
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
 from plans.importer import import_name
@@ -58,6 +67,11 @@ class ModelCountValidator(QuotaValidator):
     Validator that checks if there is no more than quota number of objects given model
     """
 
+    #: Name of the ``model`` field pointing to the user. When set, ``get_queryset(user)`` is expected
+    #: to be ``get_bulk_queryset().filter(<user_field>=user)`` and counts for many users can be
+    #: computed by single ``GROUP BY`` query in ``plan_validation_bulk``.
+    user_field = None
+
     @property
     def model(self):
         raise ImproperlyConfigured("ModelCountValidator requires model name")
@@ -65,6 +79,34 @@ class ModelCountValidator(QuotaValidator):
     def get_queryset(self, user):
         return self.model.objects.all()
 
+    def get_count_filter(self, user):
+        """
+        Returns ``Q`` object that selects the same objects as ``get_queryset(user)`` or ``None``.
+
+        Counts of validators returning ``Q`` are computed by ``plan_validation`` in one aggregate
+        query together with other validators of the same model.
+        """
+        return None
+
+    def get_bulk_queryset(self):
+        return self.model.objects.all()
+
+    def get_user_counts(self, user_ids):
+        """
+        Returns dict of user id -> number of objects for given users computed by single ``GROUP BY`` query
+        or ``None`` if ``user_field`` is not set.
+        """
+        if self.user_field is None:
+            return None
+        rows = (
+            self.get_bulk_queryset()
+            .filter(**{"%s__in" % self.user_field: user_ids})
+            .order_by()
+            .values(self.user_field)
+            .annotate(count=Count("pk"))
+        )
+        return {row[self.user_field]: row["count"] for row in rows}
+
     def get_error_message(self, quota_value, **kwargs):
         return _(
             "Limit of %(model_name_plural)s exceeded. The limit is %(quota)s items."
@@ -80,8 +122,14 @@ class ModelCountValidator(QuotaValidator):
 
     def __call__(self, user, quota_dict=None, **kwargs):
         quota = self.get_quota_value(user, quota_dict)
-        total_count = self.get_queryset(user).count() + kwargs.get("add", 0)
-        if quota is not None and total_count > quota:
+        if quota is None:
+            return
+        if kwargs.get("count") is not None:
+            total_count = kwargs["count"]
+        else:
+            total_count = self.get_queryset(user).count()
+        total_count += kwargs.get("add", 0)
+        if total_count > quota:
             raise ValidationError(
                 message=self.get_error_message(quota),
                 params=self.get_error_params(quota, total_count),
@@ -141,35 +189,239 @@ class ModelAttributeValidator(ModelCountValidator):
             )
 
 
-def plan_validation(user, plan=None, on_activation=False):
+_validators = None
+
+
+def get_validators():
+    """
+    Returns dict of quota codename -> validator object defined by ``settings.PLANS_VALIDATORS``.
+    Validators are imported only once (at app ready), the registry is rebuilt when the setting changes.
+    """
+    global _validators
+    if _validators is None:
+        validators = import_name(getattr(settings, "PLANS_VALIDATORS", {}))
+        _validators = {
+            quota: import_name(validator) for quota, validator in validators.items()
+        }
+    return _validators
+
+
+@receiver(setting_changed)
+def reset_validators(setting, **kwargs):
+    global _validators
+    if setting == "PLANS_VALIDATORS":
+        _validators = None
+
+
+def is_batchable(validator):
+    return isinstance(validator, ModelCountValidator) and not isinstance(
+        validator, ModelAttributeValidator
+    )
+
+
+def get_batched_counts(user, validators, quota_dict):
+    """
+    Computes counts of ``ModelCountValidator``s that provide ``get_count_filter()``.
+    Counts of validators with the same model are computed by single aggregate query.
+
+    :return: dict of quota codename -> validator kwargs (``{"count": <int>}``)
+    """
+    filters_by_model = {}
+    for quota, validator in validators.items():
+        if not is_batchable(validator):
+            continue
+        if validator.get_quota_value(user, quota_dict) is None:
+            continue
+        count_filter = validator.get_count_filter(user)
+        if count_filter is not None:
+            filters_by_model.setdefault(validator.model, {})[quota] = count_filter
+
+    counts = {}
+    for model, filters in filters_by_model.items():
+        aliases = {"count_%d" % i: quota for i, quota in enumerate(filters)}
+        queryset = model.objects.all()
+        if all(filters.values()):
+            # Restrict the scan to rows counted by any validator (empty Q counts all rows)
+            queryset = queryset.filter(reduce(operator.or_, filters.values()))
+        result = queryset.aggregate(
+            **{
+                alias: Count("pk", filter=filters[quota])
+                for alias, quota in aliases.items()
+            }
+        )
+        for alias, quota in aliases.items():
+            counts[quota] = {"count": result[alias]}
+    return counts
+
+
+def run_validator(validator, user, quota_dict, on_activation=False, **kwargs):
+    """
+    Runs single validator, returns list of error messages.
+    ``ValidationError`` raised by ``on_activation()`` is not caught.
+    """
+    if on_activation:
+        validator.on_activation(user, quota_dict)
+        return []
+    try:
+        validator(user, quota_dict, **kwargs)
+    except ValidationError as e:
+        return e.messages
+    return []
+
+
+def _run_validator_in_thread(*args, **kwargs):
+    try:
+        return run_validator(*args, **kwargs)
+    finally:
+        # Worker threads open their own database connections
+        connections.close_all()
+
+
+def in_atomic_block():
+    return any(connection.in_atomic_block for connection in connections.all())
+
+
+def plan_validation(user, plan=None, on_activation=False, threads=None):
     """
     Validates validator that represents quotas in a given system
     :param user:
     :param plan:
+    :param threads: number of threads running validators concurrently,
+        defaults to ``settings.PLANS_VALIDATION_THREADS``; validators run in the calling
+        thread on activation and inside transaction, where worker threads with their own
+        connections wouldn't see uncommitted rows
     :return:
     """
     if plan is None:
         # if plan is not given, the default is to use current plan of the user
         plan = user.userplan.plan
     quota_dict = plan.get_quota_dict()
-    validators = getattr(settings, "PLANS_VALIDATORS", {})
-    validators = import_name(validators)
+    validators = get_validators()
     errors = {
         "required_to_activate": [],
         "other": [],
     }
 
-    for quota in validators:
-        validator = import_name(validators[quota])
+    if on_activation:
+        counts = {}
+    else:
+        counts = get_batched_counts(user, validators, quota_dict)
+
+    if threads is None:
+        threads = getattr(settings, "PLANS_VALIDATION_THREADS", 0)
 
-        if on_activation:
-            validator.on_activation(user, quota_dict)
+    if threads and len(validators) > 1 and not on_activation and not in_atomic_block():
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [
+                executor.submit(
+                    _run_validator_in_thread,
+                    validators[quota],
+                    user,
+                    quota_dict,
+                    on_activation,
+                    **counts.get(quota, {})
+                )
+                for quota in validators
+            ]
+            results = [future.result() for future in futures]
+    else:
+        results = [
+            run_validator(
+                validators[quota],
+                user,
+                quota_dict,
+                on_activation,
+                **counts.get(quota, {})
+            )
+            for quota in validators
+        ]
+
+    for quota, messages in zip(validators, results):
+        if validators[quota].required_to_activate:
+            errors["required_to_activate"].extend(messages)
         else:
-            try:
-                validator(user, quota_dict)
-            except ValidationError as e:
+            errors["other"].extend(messages)
+    return errors
+
+
+def get_grouped_counts(user_ids, validators, quotas):
+    """
+    Computes counts of batchable validators of given ``quotas`` for many users.
+
+    :return: dict of quota codename -> dict of user id -> count
+    """
+    counts = {}
+    for quota in quotas:
+        validator = validators[quota]
+        if is_batchable(validator):
+            user_counts = validator.get_user_counts(user_ids)
+            if user_counts is not None:
+                counts[quota] = user_counts
+    return counts
+
+
+def plan_validation_bulk(users, chunk_size=1000):
+    """
+    Validates quotas of many users, e.g. after the plan was edited.
+
+    Users are processed in chunks: quota dict of every plan is fetched once and counts of validators
+    that support it (see ``ModelCountValidator.user_field``) are computed for the whole chunk
+    by single ``GROUP BY`` query. Results are streamed, so memory usage does not grow with number of users.
+
+    :param users: queryset or iterable of users
+    :param chunk_size: number of users processed at once
+    :return: generator of ``(user, errors)`` tuples, ``errors`` are in the same format as ``plan_validation`` returns
+    """
+    if isinstance(users, QuerySet):
+        users = (
+            users.filter(userplan__isnull=False)
+            .select_related("userplan__plan")
+            .order_by("pk")
+            .iterator(chunk_size=chunk_size)
+        )
+    users = iter(users)
+    validators = get_validators()
+    quota_dicts = {}
+
+    while True:
+        chunk = list(islice(users, chunk_size))
+        if not chunk:
+            break
+        chunk = [user for user in chunk if hasattr(user, "userplan")]
+
+        plans = {}
+        for user in chunk:
+            plan = user.userplan.plan
+            plans[user.pk] = plan
+            if plan.pk not in quota_dicts:
+                quota_dicts[plan.pk] = plan.get_quota_dict()
+
+        # Count only quotas that are limited in any of the chunk's plans
+        quotas = [
+            quota
+            for quota in validators
+            if any(
+                quota_dicts[plan.pk].get(quota, validators[quota].default_quota_value)
+                is not None
+                for plan in plans.values()
+            )
+        ]
+        counts = get_grouped_counts(list(plans), validators, quotas)
+
+        for user in chunk:
+            quota_dict = quota_dicts[plans[user.pk].pk]
+            errors = {
+                "required_to_activate": [],
+                "other": [],
+            }
+            for quota, validator in validators.items():
+                if quota in counts:
+                    kwargs = {"count": counts[quota].get(user.pk, 0)}
+                else:
+                    kwargs = {}
+                messages = run_validator(validator, user, quota_dict, **kwargs)
                 if validator.required_to_activate:
-                    errors["required_to_activate"].extend(e.messages)
+                    errors["required_to_activate"].extend(messages)
                 else:
-                    errors["other"].extend(e.messages)
-    return errors
+                    errors["other"].extend(messages)
+            yield user, errors
@@ -8,7 +8,11 @@ from django.core.exceptions import ImproperlyConfigured
 from django.db.models import Q
 from django.http import Http404, HttpResponseForbidden, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
+from django.utils.functional import SimpleLazyObject
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import CreateView, RedirectView, TemplateView, View
 from django.views.generic.detail import (
@@ -34,13 +38,16 @@ from plans.base.models import (
     AbstractQuota,
     AbstractUserPlan,
 )
+from plans.cache import catalog_cache
 from plans.forms import BillingInfoForm, CreateOrderForm, FakePaymentsForm
 from plans.importer import import_name
+from plans.middleware import get_userplan_snapshot
 from plans.mixins import LoginRequired
+from plans.plan_table import get_plan_table
 from plans.signals import order_started
 from plans.utils import get_currency
 from plans.validators import plan_validation
-from plans.plan_change import get_change_price
+from plans.plan_change import get_change_price, get_change_prices
 
 UserPlan = AbstractUserPlan.get_concrete_model()
 PlanPricing = AbstractPlanPricing.get_concrete_model()
@@ -83,10 +90,10 @@ class PlanTableMixin(object):
         """
         This method return a list in following order:
         [
-            ( Quota1, [ Plan1Quota1, Plan2Quota1, ... , PlanNQuota1] ),
-            ( Quota2, [ Plan1Quota2, Plan2Quota2, ... , PlanNQuota2] ),
+            [ Quota1, [ Plan1Quota1, Plan2Quota1, ... , PlanNQuota1] ],
+            [ Quota2, [ Plan1Quota2, Plan2Quota2, ... , PlanNQuota2] ],
             ...
-            ( QuotaM, [ Plan1QuotaM, Plan2QuotaM, ... , PlanNQuotaM] ),
+            [ QuotaM, [ Plan1QuotaM, Plan2QuotaM, ... , PlanNQuotaM] ],
         ]
 
         This can be very easily printed as an HTML table element with quotas by row.
@@ -95,40 +102,36 @@ class PlanTableMixin(object):
         used by given plans. If any ``Plan`` does not have any of ``PlanQuota`` then value ``None``
         will be propagated to the data structure.
 
+        The table is built by ``plans.plan_table.get_plan_table()`` from a single query
+        and cached when ``PLANS_PLAN_TABLE_CACHE`` is enabled.
         """
+        return get_plan_table(plan_list)
 
-        # Retrieve all quotas that are used by any ``Plan`` in ``plan_list``
-        quota_list = (
-            Quota.objects.all().filter(planquota__plan__in=plan_list).distinct()
-        )
 
-        # Create random access dict that for every ``Plan`` map ``Quota`` -> ``PlanQuota``
-        plan_quotas_dic = {}
-        for plan in plan_list:
-            plan_quotas_dic[plan] = {}
-            for plan_quota in plan.planquota_set.all():
-                plan_quotas_dic[plan][plan_quota.quota] = plan_quota
-
-        # Generate data structure described in method docstring, propagate ``None`` whenever
-        # ``PlanQuota`` is not available for given ``Plan`` and ``Quota``
-        return map(
-            lambda quota: (
-                quota,
-                map(lambda plan: plan_quotas_dic[plan].get(quota, None), plan_list),
-            ),
-            quota_list,
-        )
+class PlanTableViewBase(PlanTableMixin, ListView):
+    """
+    Lists plans available to the user with plan table.
 
+    With ``PLANS_CATALOG_CACHE`` enabled, plans available to everyone are cached until the catalog
+    (plans, pricings or quotas) changes and only plans customized for the user are queried. Plan table
+    rendered for anonymous users is cached per language as ``plan_table_html``.
+    """
 
-class PlanTableViewBase(PlanTableMixin, ListView):
     model = Plan
     context_object_name = "plan_list"
+    #: Set to ``False`` in subclasses listing other plans than the catalog
+    use_catalog_cache = True
+
+    def get(self, request, *args, **kwargs):
+        self.object_list = self.get_plan_list()
+        context = self.get_context_data()
+        return self.render_to_response(context)
 
     def get_queryset(self):
         queryset = (
             super(PlanTableViewBase, self)
             .get_queryset()
-            .prefetch_related("planpricing_set__pricing", "planquota_set__quota")
+            .prefetch_related("planpricing_set__pricing")
         )
         if self.request.user.is_authenticated:
             queryset = queryset.filter(
@@ -141,16 +144,47 @@ class PlanTableViewBase(PlanTableMixin, ListView):
             )
         return queryset
 
+    def is_catalog_cached(self):
+        return self.use_catalog_cache and catalog_cache.enabled
+
+    def get_catalog_cache_key(self, name):
+        """
+        Returns key of ``name`` in catalog cache, subclasses with other queryset don't share entries.
+        """
+        return "%s:%s" % (self.__class__.__qualname__, name)
+
+    def get_plan_list(self):
+        if not self.is_catalog_cached():
+            return list(self.get_queryset())
+
+        plan_list = catalog_cache.get(
+            self.get_catalog_cache_key("plans"),
+            lambda: list(self.get_queryset().filter(customized__isnull=True)),
+        )
+        if self.request.user.is_authenticated:
+            customized = list(self.get_queryset().filter(customized=self.request.user))
+            if customized:
+                plan_list = sorted(
+                    plan_list + customized, key=lambda plan: (plan.order, plan.pk)
+                )
+        return plan_list
+
+    def get_plan_change_prices(self):
+        """
+        Returns list of ``(plan, price of change to the plan)`` for every listed plan.
+        Price is ``None`` if no payment is required or the plan can't be changed.
+        """
+        plan_list = list(self.object_list)
+        if self.userplan is None or self.userplan.is_expired():
+            return [(plan, None) for plan in plan_list]
+        prices = get_change_prices(self.userplan, plan_list)
+        return [(plan, prices[plan.pk]) for plan in plan_list]
+
     def get_context_data(self, **kwargs):
         context = super(PlanTableViewBase, self).get_context_data(**kwargs)
 
         if self.request.user.is_authenticated:
-            try:
-                self.userplan = UserPlan.objects.select_related("plan").get(
-                    user=self.request.user
-                )
-            except UserPlan.DoesNotExist:
-                self.userplan = None
+            self.userplan = get_userplan_snapshot(self.request).userplan
 
             context["userplan"] = self.userplan
 
@@ -161,18 +195,36 @@ class PlanTableViewBase(PlanTableMixin, ListView):
             except (ValueError, AttributeError):
                 pass
 
-        context["plan_table"] = self.get_plan_table(self.object_list)
+            context["plan_change_prices"] = self.get_plan_change_prices()
+
         context["CURRENCY"] = settings.PLANS_CURRENCY
 
+        if self.is_catalog_cached() and not self.request.user.is_authenticated:
+            # Plan table is the same for all anonymous users, it is built only for rendering
+            context["plan_table"] = SimpleLazyObject(
+                lambda: self.get_plan_table(self.object_list)
+            )
+            context["plan_table_html"] = mark_safe(
+                catalog_cache.get(
+                    self.get_catalog_cache_key("plan_table_html_%s" % get_language()),
+                    lambda: render_to_string(
+                        "plans/plan_table.html", context, request=self.request
+                    ),
+                )
+            )
+        else:
+            context["plan_table"] = self.get_plan_table(self.object_list)
+
         return context
 
 
 class CurrentPlanView(LoginRequired, PlanTableViewBase):
     template_name = "plans/current.html"
+    use_catalog_cache = False
 
     def get_queryset(self):
         return Plan.objects.filter(userplan__user=self.request.user).prefetch_related(
-            "planpricing_set__pricing", "planquota_set__quota"
+            "planpricing_set__pricing"
         )
 
 
@@ -216,7 +268,9 @@ class ChangePlanView(LoginRequired, View):
             )()
 
             period = request.user.userplan.days_left()
-            price = policy.get_change_price(request.user.userplan.plan, plan, period)
+            price = policy.get_change_price(
+                request.user.userplan, request.user.userplan.plan, plan, period
+            )
 
             if price is None:
                 request.user.userplan.extend_account(plan, None)
@@ -34,7 +34,7 @@ setup(
         "python-stdnum",
         "django-next-url-mixin>=0.1.0",
         "suds",
-        "django-sequences",
+        "django-sequences>=2.9",
         "swapper~=1.3.0",
         "six",
     ],